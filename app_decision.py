@@ -1,13 +1,20 @@
 from qdrant_client import QdrantClient
 from sentence_transformers import SentenceTransformer
 import numpy as np
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from src.embedding_cache import EmbeddingCache
 
 # --- CONFIGURATION ---
 SEUIL_ANOMALIE = 0.25  # Si la similarité est sous 0.25, c'est louche (Anomaly)
 
 print("1️⃣ Chargement du cerveau et de la mémoire...")
-model = SentenceTransformer('all-MiniLM-L6-v2')
+NOM_MODELE = 'all-MiniLM-L6-v2'
+model = SentenceTransformer(NOM_MODELE)
 client = QdrantClient(path="./ma_memoire_qdrant")
+cache_embeddings = EmbeddingCache()
 
 # --- SIMULATION D'UN NOUVEAU CLIENT ---
 # Tu pourras changer ce texte pour tester d'autres profils !
@@ -16,7 +23,9 @@ nouveau_dossier = "Client de 22 ans, femme. Demande 5000 DM pour une voiture. Pa
 print(f"\n📄 Analyse du dossier : \"{nouveau_dossier}\"")
 
 # 2. Vectorisation du nouveau client
-vecteur_client = model.encode(nouveau_dossier)
+vecteur_client = cache_embeddings.encode(model, nouveau_dossier, NOM_MODELE)
+stats_cache = cache_embeddings.stats()
+print(f"   (Cache embeddings : {stats_cache['hits']} hit(s), {stats_cache['misses']} miss, {stats_cache['entries']} entrées)")
 
 # 3. Recherche dans la mémoire (Qdrant)
 print("🔍 Recherche de cas similaires dans le passé...")
@@ -1,8 +1,20 @@
+import os
+import time
 import streamlit as st
 from qdrant_client import QdrantClient
 from sentence_transformers import SentenceTransformer
 import pandas as pd
 from qdrant_client import models  # <--- Ajouté comme demandé
+from src.embedding_cache import EmbeddingCache
+from src.encode_scheduler import EncodeScheduler
+from src.metrics import Metrics
+
+NOM_MODELE = 'all-MiniLM-L6-v2'
+# Largeur de recherche HNSW (ef) ; vide = défaut Qdrant. Choisie avec benchmarks/bench_hnsw.py
+HNSW_EF = int(os.environ.get('CREDITIQ_HNSW_EF') or 0) or None
+
+# Durée de chaque exécution du script (Streamlit relance tout à chaque interaction)
+debut_rendu = time.perf_counter()
 
 # --- CONFIGURATION PAGE ---
 st.set_page_config(page_title="IA Crédit Assistant", page_icon="🏦", layout="wide")
@@ -13,12 +25,20 @@ st.markdown("Ce système compare le nouveau dossier à la **mémoire vectorielle
 # --- CHARGEMENT ---
 @st.cache_resource
 def load_resources():
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+    model = SentenceTransformer(NOM_MODELE)
     client = QdrantClient(path="./ma_memoire_qdrant")
-    return model, client
+    # Cache disque partagé (description -> vecteur) : un dossier déjà vu ne repasse pas par le modèle
+    cache = EmbeddingCache()
+    # Un seul ordonnanceur pour toutes les sessions : les textes simultanés passent en un seul encode()
+    encodeur = EncodeScheduler(model, max_batch=32, max_wait_ms=10)
+    # Latences par étape (encodage, recherche), partagées par toutes les sessions
+    metriques = Metrics()
+    metriques.add_collector("cache_embeddings", cache.stats)
+    metriques.add_collector("encodeur", encodeur.stats)
+    return model, client, cache, encodeur, metriques
 
 try:
-    model, client = load_resources()
+    model, client, cache_embeddings, encodeur, metriques = load_resources()
     # st.success("✅ Cerveau et Mémoire chargés.") 
 except Exception as e:
     st.error(f"Erreur de chargement : {e}")
@@ -45,33 +65,39 @@ with st.sidebar:
         st.session_state.analyse_active = True
         st.session_state.messages = [{"role": "assistant", "content": "Analyse terminée. Je suis prêt à répondre à vos questions sur ce dossier."}]
 
-# --- LOGIQUE D'ANALYSE (S'active si le bouton a été cliqué) ---
-if st.session_state.analyse_active:
+    emplacement_latence = st.empty()
+
+def afficher_latence(detail=""):
+    duree_ms = (time.perf_counter() - debut_rendu) * 1000.0
+    metriques.observe("rendu", duree_ms)
+    emplacement_latence.caption(f"⏱️ Rendu : {duree_ms:.0f} ms{detail}")
+
+# --- ANALYSE (encodage + recherche + vote), mémorisée par session ---
+def analyser(age, sexe, job, montant, duree, but):
     # 1. Reconstruire la phrase (Ton code)
     description = (
         f"Client de {age} ans, sexe {sexe}. "
         f"Demande de prêt de {montant} DT pour {but}. "
         f"Durée: {duree} mois. Job niveau {job}."
     )
-    
-    st.info(f"**Profil généré :** {description}")
-    
-    # 2. Vectorisation (Ton code)
-    vecteur = model.encode(description).tolist()
+
+    # 2. Vectorisation (Ton code), via le cache d'embeddings
+    with metriques.timer("encodage"):
+        vecteur = cache_embeddings.encode(encodeur, description, NOM_MODELE).tolist()
 
     # Recherche compatible (ANN HNSW)
-    try:
-        reponse = client.search(
-            collection_name="dossiers_clients",
-            query_vector=vecteur,
-            limit=5
-        )
-        resultats = reponse 
-    except:
+    with metriques.timer("recherche"):
+        metriques.inc("appels_qdrant")
         reponse = client.query_points(
             collection_name="dossiers_clients",
-            query=vecteur, 
-            limit=5
+            query=vecteur,
+            limit=5,
+            # hnsw_ef réglable ; collection quantifiée (--quantization) : candidats re-notés
+            # sur les vecteurs originaux
+            search_params=models.SearchParams(
+                hnsw_ef=HNSW_EF,
+                quantization=models.QuantizationSearchParams(rescore=True, oversampling=2.0)
+            ),
         )
         resultats = reponse.points
 
@@ -79,32 +105,22 @@ if st.session_state.analyse_active:
     puissance_bad = 0.0
     puissance_good = 0.0
     scores = [] 
+    voisins = []
 
-    col1, col2 = st.columns(2)
+    for hit in resultats:
+        score = hit.score
+        try:
+            risque = hit.payload.get('Risk', hit.payload.get('risk_label', 'inconnu'))
+        except:
+            risque = "inconnu"
 
-    with col1:
-        st.subheader("🔍 Analyse des Voisins")
-        
-        if not resultats:
-            st.warning("⚠️ Aucun profil similaire trouvé.")
-        
-        for hit in resultats:
-            score = hit.score
-            try:
-                risque = hit.payload.get('Risk', hit.payload.get('risk_label', 'inconnu'))
-            except:
-                risque = "inconnu"
-
-            scores.append(score)
-            
-            if risque == "bad":
-                puissance_bad += score
-                st.error(f"BAD (Similitude: {score:.1%})")
-            else:
-                puissance_good += score
-                st.success(f"GOOD (Similitude: {score:.1%})")
-                
-            st.caption(f"ID Voisin: {hit.id}")
+        scores.append(score)
+        voisins.append({"id": hit.id, "score": score, "risque": risque})
+
+        if risque == "bad":
+            puissance_bad += score
+        else:
+            puissance_good += score
 
     # --- CALCULS AVANT AFFICHAGE (Ton code) ---
     if len(scores) > 0:
@@ -139,6 +155,69 @@ if st.session_state.analyse_active:
     else:
         decision_finale = "ACCORD"
 
+    return {
+        "description": description, "voisins": voisins, "moyenne_sim": moyenne_sim,
+        "anomalie_ia": anomalie_ia, "anomalie_montant": anomalie_montant, "is_anomalie": is_anomalie,
+        "risque_pourcent": risque_pourcent, "seuil_refus": seuil_refus, "decision_finale": decision_finale,
+    }
+
+# --- LOGIQUE D'ANALYSE (S'active si le bouton a été cliqué) ---
+if st.session_state.analyse_active:
+    # Chaque message du chat relance le script : on ne recalcule que si le formulaire a changé
+    cle_analyse = (age, sexe, job, montant, duree, but)
+    memo = st.session_state.get("analyse")
+    if memo is None or memo["cle"] != cle_analyse:
+        memo = {"cle": cle_analyse, **analyser(age, sexe, job, montant, duree, but)}
+        st.session_state.analyse = memo
+        metriques.inc("analyses_calculees")
+        analyse_reutilisee = False
+    else:
+        metriques.inc("analyses_reutilisees")
+        analyse_reutilisee = True
+
+    description = memo["description"]
+    moyenne_sim = memo["moyenne_sim"]
+    anomalie_ia, anomalie_montant, is_anomalie = memo["anomalie_ia"], memo["anomalie_montant"], memo["is_anomalie"]
+    risque_pourcent, seuil_refus, decision_finale = memo["risque_pourcent"], memo["seuil_refus"], memo["decision_finale"]
+
+    st.info(f"**Profil généré :** {description}")
+
+    stats_cache = cache_embeddings.stats()
+    st.sidebar.caption(
+        f"Cache embeddings : {stats_cache['hit_rate']:.0%} de hits "
+        f"({stats_cache['hits']}/{stats_cache['hits'] + stats_cache['misses']}, {stats_cache['entries']} entrées)"
+    )
+    stats_encodeur = encodeur.stats()
+    st.sidebar.caption(
+        f"Encodage groupé : {stats_encodeur['texts']} textes en {stats_encodeur['batches']} lots "
+        f"(moy. {stats_encodeur['avg_batch_size']:.1f}, en attente : {stats_encodeur['pending']})"
+    )
+    with st.sidebar.expander("Histogrammes de l'encodeur"):
+        st.json({
+            "taille des lots": stats_encodeur['batch_size_histogram'],
+            "profondeur de file": stats_encodeur['queue_depth_histogram'],
+        })
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.subheader("🔍 Analyse des Voisins")
+        
+        if not memo["voisins"]:
+            st.warning("⚠️ Aucun profil similaire trouvé.")
+        
+        for voisin in memo["voisins"]:
+            if voisin["risque"] == "bad":
+                st.error(f"BAD (Similitude: {voisin['score']:.1%})")
+            else:
+                st.success(f"GOOD (Similitude: {voisin['score']:.1%})")
+                
+            st.caption(f"ID Voisin: {voisin['id']}")
+
+    with st.sidebar.expander("Métriques (latences par étape)"):
+        st.code("\n".join(metriques.summary_lines()))
+        st.download_button("Export Prometheus", metriques.to_prometheus(), file_name="metrics.prom")
+
 
     # 4. COLONNE DE DROITE : MODIFICATION POUR ONGLETS ET CHATBOT
     with col2:
@@ -228,8 +307,13 @@ if st.session_state.analyse_active:
                 # Ajouter réponse IA
                 st.session_state.messages.append({"role": "assistant", "content": reponse_ia})
                 st.chat_message("assistant").write(reponse_ia)
+                afficher_latence(" (analyse réutilisée)" if analyse_reutilisee else " (analyse recalculée)")
                 st.rerun() # Force l'actualisation pour afficher la réponse
 
+    afficher_latence(" (analyse réutilisée)" if analyse_reutilisee else " (analyse recalculée)")
+else:
+    afficher_latence()
+
 
 
 
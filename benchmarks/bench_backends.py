@@ -0,0 +1,50 @@
+import sys
+import os
+import time
+import numpy as np
+
+# Add root to path
+sys.path.append(os.getcwd())
+
+from src.memory import BACKENDS
+from src.similarity import SimilarityEngine
+
+def make_cases(n, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.random((n, SimilarityEngine.VECTOR_SIZE), dtype=np.float32)
+    payloads = [
+        {'id': i, 'decision': 'approve' if i % 2 else 'decline', 'labels': ['fraud'] if i % 20 == 0 else [],
+         'profile': {'income': int(v[0] * 20000)}}
+        for i, v in enumerate(vectors)
+    ]
+    return list(range(n)), vectors, payloads
+
+def main(sizes=(1_000, 10_000, 100_000), queries=200, k=5):
+    print(f"{'backend':>8} | {'cases':>7} | {'ingest (cases/s)':>16} | {'search p50 (ms)':>15} | {'batch (q/s)':>11}")
+    rng = np.random.default_rng(1)
+    query_vectors = rng.random((queries, SimilarityEngine.VECTOR_SIZE), dtype=np.float32)
+
+    for n in sizes:
+        ids, vectors, payloads = make_cases(n)
+        for name, backend_cls in BACKENDS.items():
+            backend = backend_cls()
+
+            start = time.perf_counter()
+            for lo in range(0, n, 4096):
+                backend.add_batch(ids[lo:lo + 4096], vectors[lo:lo + 4096], payloads[lo:lo + 4096])
+            ingest = n / (time.perf_counter() - start)
+
+            latencies = []
+            for q in query_vectors[:50]:
+                start = time.perf_counter()
+                backend.search(q, k=k)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            backend.search_batch(query_vectors, k=k)
+            batch = queries / (time.perf_counter() - start)
+
+            print(f"{name:>8} | {n:>7} | {ingest:>16,.0f} | {np.percentile(latencies, 50):>15.3f} | {batch:>11,.0f}")
+
+if __name__ == "__main__":
+    main()
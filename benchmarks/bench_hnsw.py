@@ -0,0 +1,280 @@
+"""
+HNSW recall vs latency sweep, emitted as JSON, for either collection:
+
+  credit_memory (default): the engine's 9-dim case memory, on a generated history.
+  dossiers_clients: app_visuelle's 384-dim description embeddings (mes_vecteurs.emb and
+  base_de_connaissance.csv from data/vectoriser.py, found in --data-dir).
+
+    python benchmarks/bench_hnsw.py --url http://localhost:6333 --cases 200000
+    python benchmarks/bench_hnsw.py --url http://localhost:6333 --m 8 16 32 --ef-construct 64 128 --ef 16 32 64
+    python benchmarks/bench_hnsw.py --url http://localhost:6333 --collection dossiers_clients --data-dir data
+
+Ground truth is brute force: NumpyMemoryBackend for credit_memory, a NumPy cosine top-k over
+the stored embeddings for dossiers_clients (each query is a stored dossier, left out of its
+own neighbors, as in data/rapport_quantification.py).
+For every (m, ef_construct) a collection is built and indexed; build time covers ingestion
+plus waiting for the optimizer to finish the graph. For every search-time ef we report
+recall@k, the share of final decisions that differ from the exact search (flip rate: the
+engine's recommendation, or app_visuelle's REFUS/ACCORD vote) and single-query search latency.
+The cheapest setting with no flips is picked at the end.
+
+Without --url the local client is used: it accepts HNSW settings but searches exactly,
+so recall is 1.0 everywhere. Use a Qdrant server for meaningful numbers.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+# Add root (and data/, for the app_visuelle scripts) to path
+sys.path.append(os.getcwd())
+sys.path.append(os.path.join(os.getcwd(), 'data'))
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import (OptimizersConfigDiff, Distance, VectorParams, HnswConfigDiff, Batch,
+                                  SearchParams)
+from src.decision_engine import DecisionEngine
+from src.qdrant_manager import QdrantManager
+from benchmarks.bench_pipeline import percentiles, sample_profiles, git_commit
+from data.history_generator import generate
+
+def wait_indexed(client, collection_name, timeout=600):
+    """Blocks until the server reports the collection green with all vectors indexed."""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        info = client.get_collection(collection_name)
+        indexed = info.indexed_vectors_count or 0
+        if str(info.status).lower().endswith('green') and indexed >= (info.points_count or 0):
+            return True
+        time.sleep(0.2)
+    return False
+
+def build(history, m, ef_construct, url):
+    manager = QdrantManager(collection_name=f"credit_memory_hnsw_m{m}_efc{ef_construct}", url=url,
+                            hnsw_m=m, hnsw_ef_construct=ef_construct)
+    if url:
+        # Start from an empty collection, and index small ones too (the default threshold
+        # leaves anything below ~10 MB of vectors as a plain full scan).
+        manager.client.delete_collection(manager.collection_name)
+        manager._init_collection()
+        manager.client.update_collection(manager.collection_name,
+                                         optimizers_config=OptimizersConfigDiff(indexing_threshold=1))
+
+    start = time.perf_counter()
+    engine = DecisionEngine(memory_backend=manager)
+    engine.load_history(history)
+    indexed = wait_indexed(manager.client, manager.collection_name) if url else True
+    return engine, {'seconds': time.perf_counter() - start, 'indexed': indexed}
+
+def recall_at_k(approx, exact, k):
+    """
+    Share of the exact top-k found, counted on scores so that equally close cases
+    (duplicated profiles are common) are interchangeable.
+    """
+    found = []
+    for hits, truth in zip(approx, exact):
+        if not truth:
+            continue
+        kth = truth[min(k, len(truth)) - 1][1]
+        found.append(sum(1 for _, score in hits[:k] if score >= kth - 1e-6) / min(k, len(truth)))
+    return float(np.mean(found)) if found else 1.0
+
+def measure(engine, exact, vectors, profiles, exact_decisions, k):
+    backend = engine.memory.backend
+    approx = backend.search_batch(vectors, k=k)
+
+    latencies = []
+    for vector in vectors:
+        start = time.perf_counter()
+        backend.search(vector, k=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    decisions = [r['recommendation'] for r in engine.evaluate_batch(profiles, k=k)]
+    flips = sum(a != b for a, b in zip(decisions, exact_decisions))
+    result = {'recall_at_k': recall_at_k(approx, exact, k), 'flip_rate': flips / len(profiles), 'flips': flips}
+    result.update(percentiles(latencies))
+    return result
+
+def load_dossiers(data_dir):
+    """(unit-norm embeddings, risk labels) of dossiers_clients, row i = point i (as the app indexes them)."""
+    import pandas as pd
+    from embedding_store import EmbeddingStore
+    vectors = EmbeddingStore(os.path.join(data_dir, 'mes_vecteurs.emb')).chunk(0, None)
+    risks = pd.read_csv(os.path.join(data_dir, 'base_de_connaissance.csv'), usecols=['Risk'])['Risk'].to_numpy()
+    # Cosine distance: Qdrant normalizes vectors on insert
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    return vectors.astype(np.float32), risks
+
+def exact_dossiers(vectors, queries, risks, k, chunk=256):
+    """Brute-force top-k (the query itself left out) and REFUS flags of app_visuelle's vote."""
+    from rapport_quantification import top_k, sans_soi_meme, vote
+    exact, refus = [], []
+    for start in range(0, len(queries), chunk):
+        batch = queries[start:start + chunk]
+        scores = sans_soi_meme(vectors[batch] @ vectors.T, batch)
+        idx = top_k(scores, k)
+        top_scores = np.take_along_axis(scores, idx, axis=1)
+        exact.extend([list(zip(row, row_scores)) for row, row_scores in zip(idx.tolist(), top_scores.tolist())])
+        refus.append(vote(idx, top_scores, risks))
+    return exact, np.concatenate(refus)
+
+def build_dossiers(vectors, risks, m, ef_construct, url, batch_size=1024):
+    client = QdrantClient(url=url) if url else QdrantClient(":memory:")
+    name = f"dossiers_clients_hnsw_m{m}_efc{ef_construct}"
+    if client.collection_exists(name):
+        client.delete_collection(name)
+    client.create_collection(
+        collection_name=name,
+        vectors_config=VectorParams(size=vectors.shape[1], distance=Distance.COSINE),
+        hnsw_config=HnswConfigDiff(m=m, ef_construct=ef_construct),
+        # Index whatever the size (see build())
+        optimizers_config=OptimizersConfigDiff(indexing_threshold=1) if url else None,
+    )
+
+    start = time.perf_counter()
+    for first in range(0, len(vectors), batch_size):
+        last = min(first + batch_size, len(vectors))
+        client.upsert(collection_name=name, points=Batch(
+            ids=list(range(first, last)), vectors=vectors[first:last].tolist(),
+            payloads=[{'risk_label': risk} for risk in risks[first:last].tolist()]))
+    indexed = wait_indexed(client, name) if url else True
+    return client, name, {'seconds': time.perf_counter() - start, 'indexed': indexed}
+
+def measure_dossiers(client, name, vectors, queries, risks, exact, exact_refus, ef, k):
+    """Same search as app_visuelle (query_points with hnsw_ef), then its REFUS/ACCORD vote."""
+    from rapport_quantification import vote
+    latencies, approx = [], []
+    for query in queries.tolist():
+        start = time.perf_counter()
+        points = client.query_points(collection_name=name, query=vectors[query].tolist(), limit=k + 1,
+                                     search_params=SearchParams(hnsw_ef=ef), with_payload=False).points
+        latencies.append((time.perf_counter() - start) * 1000)
+        approx.append([(p.id, p.score) for p in points if p.id != query][:k])
+
+    # Queries with fewer than k hits (tiny collections) vote on what came back, like the app
+    idx = np.array([[i for i, _ in hits] + [0] * (k - len(hits)) for hits in approx])
+    scores = np.array([[score for _, score in hits] + [0.0] * (k - len(hits)) for hits in approx])
+    flips = int((vote(idx, scores, risks) != exact_refus).sum())
+    result = {'recall_at_k': recall_at_k(approx, exact, k), 'flip_rate': flips / len(queries), 'flips': flips}
+    result.update(percentiles(latencies))
+    return result
+
+def sweep_credit_memory(args, report):
+    profiles = sample_profiles(args.queries, seed=args.seed + 1)
+    report['meta']['cases'] = args.cases
+
+    with tempfile.TemporaryDirectory() as tmp:
+        history = os.path.join(tmp, "history.jsonl")
+        generate(history, args.cases, seed=args.seed, fmt='jsonl')
+
+        print("Exact ground truth...", file=sys.stderr)
+        exact_engine = DecisionEngine(memory_backend='numpy')
+        exact_engine.load_history(history)
+        vectors = exact_engine.similarity.vectorize_many(profiles)
+        exact = exact_engine.memory.backend.search_batch(vectors, k=args.k)
+        exact_decisions = [r['recommendation'] for r in exact_engine.evaluate_batch(profiles, k=args.k)]
+        del exact_engine
+
+        for m, ef_construct in itertools.product(args.m, args.ef_construct):
+            print(f"m={m} ef_construct={ef_construct}: building...", file=sys.stderr)
+            engine, build_stats = build(history, m, ef_construct, args.url)
+            for ef in args.ef:
+                engine.memory.backend.hnsw_ef = ef
+                run = {'m': m, 'ef_construct': ef_construct, 'ef': ef, 'build': build_stats}
+                run.update(measure(engine, exact, vectors, profiles, exact_decisions, args.k))
+                report['runs'].append(run)
+                print_run(run, args.k)
+            if args.url:
+                engine.memory.backend.client.delete_collection(engine.memory.backend.collection_name)
+            del engine
+
+def sweep_dossiers(args, report):
+    vectors, risks = load_dossiers(args.data_dir)
+    rng = np.random.default_rng(args.seed)
+    queries = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    report['meta']['cases'] = len(vectors)
+    report['meta']['dim'] = int(vectors.shape[1])
+
+    print(f"Exact ground truth ({len(vectors)} dossiers, {vectors.shape[1]} dims)...", file=sys.stderr)
+    exact, exact_refus = exact_dossiers(vectors, queries, risks, args.k)
+    report['meta']['exact_refus_rate'] = float(exact_refus.mean())
+
+    for m, ef_construct in itertools.product(args.m, args.ef_construct):
+        print(f"m={m} ef_construct={ef_construct}: building...", file=sys.stderr)
+        client, name, build_stats = build_dossiers(vectors, risks, m, ef_construct, args.url)
+        for ef in args.ef:
+            run = {'m': m, 'ef_construct': ef_construct, 'ef': ef, 'build': build_stats}
+            run.update(measure_dossiers(client, name, vectors, queries, risks, exact, exact_refus, ef, args.k))
+            report['runs'].append(run)
+            print_run(run, args.k)
+        client.delete_collection(name)
+        client.close()
+
+def print_run(run, k):
+    print(f"  ef={run['ef']:<4} recall@{k}={run['recall_at_k']:.4f} flips={run['flip_rate']:.2%} "
+          f"p99={run['p99_ms']:.3f}ms build={run['build']['seconds']:.1f}s", file=sys.stderr)
+
+def cheapest(runs, max_flip_rate):
+    """Lowest p99 among the settings that change no more than max_flip_rate of the decisions."""
+    ok = [r for r in runs if r['flip_rate'] <= max_flip_rate]
+    return min(ok, key=lambda r: (r['p99_ms'], r['build']['seconds'])) if ok else None
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweeps HNSW m / ef_construct / ef: recall@k, decision flips, latency.")
+    parser.add_argument('--url', default=os.environ.get('CREDITIQ_QDRANT_URL'), help="Qdrant server")
+    parser.add_argument('--collection', choices=('credit_memory', 'dossiers_clients'), default='credit_memory')
+    parser.add_argument('--cases', type=int, default=100_000, help="Generated history size (credit_memory)")
+    parser.add_argument('--data-dir', default='.',
+                        help="Folder with mes_vecteurs.emb and base_de_connaissance.csv (dossiers_clients)")
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--m', type=int, nargs='+', default=[4, 8, 16, 32])
+    parser.add_argument('--ef-construct', type=int, nargs='+', default=[32, 100, 200])
+    parser.add_argument('--ef', type=int, nargs='+', default=[8, 16, 32, 64, 128])
+    parser.add_argument('--max-flip-rate', type=float, default=0.0, help="Flips tolerated when picking a setting")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help="JSON file (default: stdout only)")
+    args = parser.parse_args()
+
+    if not args.url:
+        print("No --url: the local client searches exactly, every setting will show recall 1.0.", file=sys.stderr)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'server': bool(args.url),
+            'collection': args.collection,
+            'queries': args.queries,
+            'k': args.k,
+        },
+        'runs': [],
+    }
+    if args.collection == 'dossiers_clients':
+        sweep_dossiers(args, report)
+    else:
+        sweep_credit_memory(args, report)
+
+    best = cheapest(report['runs'], args.max_flip_rate)
+    report['recommended'] = {k: best[k] for k in ('m', 'ef_construct', 'ef', 'p99_ms', 'recall_at_k', 'flip_rate')} \
+        if best else None
+    if best and args.collection == 'dossiers_clients':
+        print(f"Cheapest without decision changes: construire_memoire_qdrant.py --hnsw-m {best['m']} "
+              f"--hnsw-ef-construct {best['ef_construct']}, CREDITIQ_HNSW_EF={best['ef']}", file=sys.stderr)
+    elif best:
+        print(f"Cheapest without decision changes: CREDITIQ_HNSW_M={best['m']} "
+              f"CREDITIQ_HNSW_EF_CONSTRUCT={best['ef_construct']} CREDITIQ_HNSW_EF={best['ef']}", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+        print(f"Results written to {args.output}", file=sys.stderr)
+    print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Decision pipeline benchmark across data scales, emitted as JSON.
+
+    python benchmarks/bench_pipeline.py                       # 1k, 10k, 100k, 1M cases
+    python benchmarks/bench_pipeline.py --sizes 1000 10000 --backend numpy --output run.json
+
+For each size: a synthetic history is written (JSON Lines), then we measure
+load_from_file ingestion, evaluate_application latency (p50/p95/p99), evaluate_batch
+throughput and vectorize throughput. Text pipeline: dossiers_clients k-NN search latency
+(always) and SentenceTransformer encode latency (when the model is available).
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+# Add root to path
+sys.path.append(os.getcwd())
+
+from src.decision_engine import DecisionEngine
+from src.similarity import SimilarityEngine
+from data.history_generator import generate, generate_block, PROFILE_FIELDS
+
+NOM_MODELE = 'all-MiniLM-L6-v2'
+TEXT_COLLECTION = "dossiers_clients"
+TEXT_DIM = 384  # all-MiniLM-L6-v2
+
+def percentiles(samples_ms):
+    samples = np.asarray(samples_ms)
+    return {
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p95_ms': float(np.percentile(samples, 95)),
+        'p99_ms': float(np.percentile(samples, 99)),
+        'mean_ms': float(samples.mean()),
+        'samples': len(samples),
+    }
+
+def write_history(path, n, seed=0):
+    generate(path, n, seed=seed, fmt='jsonl')
+
+def sample_profiles(n, seed=1):
+    cols = generate_block(np.random.default_rng(seed), 0, n)
+    return [
+        {f: (cols[f][i] if f == 'credit_history' else int(cols[f][i])) for f in PROFILE_FIELDS}
+        for i in range(n)
+    ]
+
+def bench_ingest(engine, history_path):
+    stats = engine.load_history(history_path)
+    return {'cases': stats['cases'], 'seconds': stats['seconds'], 'cases_per_sec': stats['cases_per_sec']}
+
+def bench_evaluate(engine, profiles):
+    latencies = []
+    for profile in profiles:
+        start = time.perf_counter()
+        engine.evaluate_application(profile)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    engine.evaluate_batch(profiles)
+    batch_seconds = time.perf_counter() - start
+
+    result = percentiles(latencies)
+    result['batch_per_sec'] = len(profiles) / batch_seconds
+    return result
+
+def bench_vectorize(n):
+    profiles = sample_profiles(min(n, 100_000), seed=2)
+    engine = SimilarityEngine(cache_size=0)  # measure the vectorizer, not the cache
+
+    start = time.perf_counter()
+    for p in profiles:
+        engine.vectorize(p)
+    per_row = len(profiles) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    engine.vectorize_many(profiles)
+    many = len(profiles) / (time.perf_counter() - start)
+    return {'rows': len(profiles), 'per_row_per_sec': per_row, 'vectorize_many_per_sec': many}
+
+def load_model():
+    try:
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(NOM_MODELE), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+def bench_encode(model, queries):
+    texts = [
+        f"Client de {20 + i % 50} ans, sexe male. Demande de prêt de {1000 + 37 * i} DT pour car. "
+        f"Durée: {12 + i % 48} mois. Job niveau {i % 4}."
+        for i in range(queries)
+    ]
+    latencies = []
+    for text in texts:
+        start = time.perf_counter()
+        model.encode(text)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    model.encode(texts, batch_size=32)
+    result = percentiles(latencies)
+    result['batch_per_sec'] = len(texts) / (time.perf_counter() - start)
+    return result
+
+def bench_text_search(n, dim, queries, k=5, seed=3):
+    """k-NN latency on a dossiers_clients-shaped collection (n random unit vectors of the model's dim)."""
+    from qdrant_client import QdrantClient
+    from qdrant_client.models import Distance, VectorParams, Batch
+
+    rng = np.random.default_rng(seed)
+    client = QdrantClient(":memory:")
+    client.create_collection(TEXT_COLLECTION, vectors_config=VectorParams(size=dim, distance=Distance.COSINE))
+    for lo in range(0, n, 4096):
+        hi = min(n, lo + 4096)
+        vectors = rng.standard_normal((hi - lo, dim), dtype=np.float32)
+        client.upsert(TEXT_COLLECTION, points=Batch(
+            ids=list(range(lo, hi)), vectors=vectors.tolist(),
+            payloads=[{"risk_label": "bad" if i % 3 == 0 else "good"} for i in range(lo, hi)]
+        ))
+
+    latencies = []
+    for q in rng.standard_normal((queries, dim), dtype=np.float32):
+        start = time.perf_counter()
+        client.query_points(TEXT_COLLECTION, query=q.tolist(), limit=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    client.close()
+    return percentiles(latencies)
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       text=True).strip()
+    except Exception:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the decision pipeline across data scales (JSON output).")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument('--backend', default=None, help="Memory backend (qdrant or numpy)")
+    parser.add_argument('--queries', type=int, default=200, help="Evaluations / searches timed per size")
+    parser.add_argument('--text-max-cases', type=int, default=100_000,
+                        help="Largest dossiers_clients collection built for text search")
+    parser.add_argument('--no-text', action='store_true', help="Skip the SentenceTransformer pipeline")
+    parser.add_argument('--output', default=None, help="JSON file (default: stdout only)")
+    args = parser.parse_args()
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'backend': args.backend or os.environ.get('CREDITIQ_MEMORY_BACKEND', 'qdrant'),
+            'queries': args.queries,
+        },
+        'sizes': [],
+    }
+
+    model, text_error = (None, "disabled (--no-text)") if args.no_text else load_model()
+    if model is not None:
+        print("Text encode...", file=sys.stderr)
+        report['text_encode'] = bench_encode(model, args.queries)
+    else:
+        report['text_encode'] = {'skipped': text_error}
+
+    queries = sample_profiles(args.queries)
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            print(f"{n} cases...", file=sys.stderr)
+            history = os.path.join(tmp, f"history_{n}.jsonl")
+            write_history(history, n)
+
+            engine = DecisionEngine(memory_backend=args.backend)
+            entry = {'cases': n}
+            entry['ingest'] = bench_ingest(engine, history)
+            entry['evaluate'] = bench_evaluate(engine, queries)
+            entry['vectorize'] = bench_vectorize(n)
+            if args.no_text:
+                entry['text_search'] = {'skipped': text_error}
+            elif n > args.text_max_cases:
+                entry['text_search'] = {'skipped': f"above --text-max-cases ({args.text_max_cases})"}
+            else:
+                dim = model.get_sentence_embedding_dimension() if model is not None else TEXT_DIM
+                entry['text_search'] = bench_text_search(n, dim, args.queries)
+            report['sizes'].append(entry)
+
+            os.remove(history)
+            del engine
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+        print(f"Results written to {args.output}", file=sys.stderr)
+    print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import sys
+import os
+import time
+import numpy as np
+import pandas as pd
+
+# Add root to path
+sys.path.append(os.getcwd())
+
+from src.similarity import SimilarityEngine
+
+def make_profiles(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'income': rng.integers(2000, 15000, n),
+        'expenses': rng.integers(500, 4000, n),
+        'employment_length': rng.integers(0, 10, n),
+        'loan_amount': rng.integers(5000, 45000, n),
+        'loan_term': rng.choice([12, 24, 36, 48, 60], n),
+        'credit_history': rng.choice(['bad', 'fair', 'good'], n),
+    })
+
+def main():
+    engine = SimilarityEngine(cache_size=0)  # measure the vectorizer, not the cache
+    print(f"{'rows':>9} | {'per-row (rows/s)':>17} | {'vectorize_many (rows/s)':>24} | speedup")
+
+    for n in [1_000, 10_000, 100_000]:
+        df = make_profiles(n)
+        records = df.to_dict('records')
+
+        start = time.perf_counter()
+        for p in records:
+            engine.vectorize(p)
+        per_row = n / (time.perf_counter() - start)
+
+        buf = np.empty((n, SimilarityEngine.VECTOR_SIZE), dtype=np.float32)
+        start = time.perf_counter()
+        engine.vectorize_many(df, out=buf)
+        many = n / (time.perf_counter() - start)
+
+        print(f"{n:>9} | {per_row:>17,.0f} | {many:>24,.0f} | {many / per_row:.0f}x")
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,19 @@
 from qdrant_client import QdrantClient
 from sentence_transformers import SentenceTransformer
+import os
 import sys
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.embedding_cache import EmbeddingCache
+
 # --- CONFIGURATION ---
 SEUIL_ANOMALIE = 0.25
 
 print("1️⃣ Chargement du cerveau et de la mémoire...")
 try:
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+    NOM_MODELE = 'all-MiniLM-L6-v2'
+    model = SentenceTransformer(NOM_MODELE)
+    cache_embeddings = EmbeddingCache()
     # On force la connexion locale au dossier que tu viens de créer
     client = QdrantClient(path="./ma_memoire_qdrant")
     print(f"   (Version Qdrant détectée : {client.__class__.__name__})")
@@ -22,7 +28,7 @@ print(f"\n📄 Analyse du dossier : \"{nouveau_dossier}\"")
 
 # 2. Vectorisation (Traduction en maths)
 print("   -> Traduction en langage mathématique...")
-vecteur_brut = model.encode(nouveau_dossier)
+vecteur_brut = cache_embeddings.encode(model, nouveau_dossier, NOM_MODELE)  # Réutilisé si déjà vu
 vecteur_client = vecteur_brut.tolist() # Important pour Qdrant
 
 # 3. Recherche dans la mémoire
@@ -1,61 +1,213 @@
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+from qdrant_client.models import (Distance, VectorParams, Batch, PointIdsList, ScalarQuantization,
+                                  ScalarQuantizationConfig, ScalarType, ProductQuantization,
+                                  ProductQuantizationConfig, CompressionRatio, HnswConfigDiff)
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import argparse
 import pandas as pd
 import numpy as np
 import os
 import shutil
+import sys
+import time
+from embedding_store import EmbeddingStore, IdsPoints
 
-# --- NETTOYAGE (Optionnel) ---
-# Si le dossier existe déjà, on le supprime pour repartir à zéro
-if os.path.exists("./ma_memoire_qdrant"):
-    shutil.rmtree("./ma_memoire_qdrant")
-    print("🧹 Ancienne mémoire effacée.")
-
-print("1️⃣ Chargement des fichiers...")
-try:
-    df = pd.read_csv('base_de_connaissance.csv')
-    vectors = np.load('mes_vecteurs.npy')
-    print(f"   -> {len(df)} clients chargés.")
-except FileNotFoundError:
-    print("❌ ERREUR : Fichiers manquants (étape 2).")
-    exit()
-
-print("2️⃣ Initialisation de Qdrant...")
-# On crée une base de données LOCALE (sur ton disque dur)
-client = QdrantClient(path="./ma_memoire_qdrant")
-
-collection_name = "dossiers_clients"
-
-# Qdrant a besoin de savoir la taille des vecteurs (384 pour all-MiniLM-L6-v2)
-client.recreate_collection(
-    collection_name=collection_name,
-    vectors_config=VectorParams(size=384, distance=Distance.COSINE),
-)
-
-print("3️⃣ Remplissage de la mémoire...")
-
-points = []
-# On prépare les données au format Qdrant ("PointStruct")
-for idx, row in df.iterrows():
-    # On crée un "Point" pour chaque client
-    point = PointStruct(
-        id=idx,  # ID unique (0, 1, 2...)
-        vector=vectors[idx].tolist(), # Le vecteur mathématique
-        payload={ # Les infos textuelles (Payload)
-            "description": row['Full_Description'],
-            "risk_label": row['Risk']
-        }
-    )
-    points.append(point)
-
-# On envoie tout d'un coup (upsert)
-# Note : Pour des millions de lignes, on ferait des paquets (batchs), 
-# mais pour 1000 lignes, ça passe d'un coup.
-operation_info = client.upsert(
-    collection_name=collection_name,
-    points=points
-)
-
-print("\n✅ SUCCÈS ! La mémoire Qdrant est construite.")
-print(f"📁 Données sauvegardées dans le dossier './ma_memoire_qdrant'")
-print(f"   Statut de l'opération : {operation_info.status}")
\ No newline at end of file
+DOSSIER_MEMOIRE = "./ma_memoire_qdrant"
+COLLECTION = "dossiers_clients"
+
+
+def ouvrir_vecteurs():
+    """Memory-map : les vecteurs restent sur le disque, on ne lit que le paquet en cours."""
+    if os.path.exists('mes_vecteurs.emb'):
+        store = EmbeddingStore('mes_vecteurs.emb')
+        print(f"   -> Vecteurs {store.dtype} (modèle {store.model_name})")
+        return store.chunk, store.dim, len(store), store.keys
+    # Ancien format .npy, lu en memory-map lui aussi (pas d'empreintes : IDs par position)
+    vectors = np.load('mes_vecteurs.npy', mmap_mode='r')
+    return (lambda debut, fin: np.asarray(vectors[debut:fin], dtype=np.float32)), vectors.shape[1], len(vectors), None
+
+
+def config_quantification(mode, compression="x16"):
+    """
+    int8 : 1 octet par dimension (4x moins de RAM), pq : codes de produit (compression x4 à x64).
+    Les vecteurs quantifiés restent en RAM ; les originaux servent au re-classement (rescore).
+    """
+    if mode == "int8":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99,
+                                                                  always_ram=True))
+    if mode == "pq":
+        return ProductQuantization(product=ProductQuantizationConfig(compression=CompressionRatio(compression),
+                                                                     always_ram=True))
+    return None
+
+
+def paquets_de_points(lire_paquet, taille, cles=None, existants=None):
+    """
+    Construit les paquets au fil de l'eau : on ne lit du CSV et des vecteurs
+    que le paquet en cours, quelle que soit la taille du corpus.
+    Avec des empreintes, l'ID d'un point dépend de son contenu (modèle + description).
+    Avec existants ({id: risk_label} déjà dans l'index), seules les lignes nouvelles ou
+    modifiées sont envoyées ; les IDs vus sont retirés de existants (il reste les disparus).
+    """
+    ids_points = IdsPoints()
+    debut = 0
+    for lignes in pd.read_csv('base_de_connaissance.csv', chunksize=taille):
+        fin = debut + len(lignes)
+        if cles is not None:
+            ids = ids_points(cles[debut:fin])
+        else:
+            ids = list(range(debut, fin))  # ID unique (0, 1, 2...)
+        risques = lignes['Risk'].tolist()
+        garder = list(range(len(ids)))
+        if existants is not None:
+            absent = object()
+            garder = [j for j, (pid, risque) in enumerate(zip(ids, risques))
+                      if existants.pop(pid, absent) != risque]
+        if garder:
+            descriptions = lignes['Full_Description'].tolist()
+            yield Batch(
+                ids=[ids[j] for j in garder],
+                vectors=lire_paquet(debut, fin)[garder].tolist(),  # Les vecteurs du paquet seulement
+                payloads=[  # Les infos textuelles (Payload)
+                    {"description": descriptions[j], "risk_label": risques[j]}
+                    for j in garder
+                ]
+            )
+        debut = fin
+
+
+def lire_existants(client):
+    """{id: risk_label} de tous les points déjà indexés (sans les vecteurs)."""
+    existants = {}
+    offset = None
+    while True:
+        points, offset = client.scroll(collection_name=COLLECTION, limit=10000, offset=offset,
+                                       with_payload=["risk_label"], with_vectors=False)
+        for point in points:
+            existants[point.id] = (point.payload or {}).get("risk_label")
+        if offset is None:
+            return existants
+
+
+def envoyer(client, paquet, essais):
+    """Upsert d'un paquet, avec nouvelles tentatives (attente exponentielle) en cas d'échec."""
+    for tentative in range(1, essais + 1):
+        try:
+            return client.upsert(collection_name=COLLECTION, points=paquet)
+        except Exception as e:
+            if tentative == essais:
+                raise
+            attente = 0.5 * 2 ** (tentative - 1)
+            print(f"   ⚠️ Paquet {paquet.ids[0]}..{paquet.ids[-1]} en échec ({e}), nouvel essai dans {attente:.1f}s")
+            time.sleep(attente)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construit la mémoire Qdrant par paquets.")
+    parser.add_argument('--batch-size', type=int, default=1024, help="Points par upsert")
+    parser.add_argument('--parallel', type=int, default=4, help="Upserts simultanés (serveur Qdrant)")
+    parser.add_argument('--retries', type=int, default=3, help="Tentatives par paquet")
+    parser.add_argument('--url', default=os.environ.get('CREDITIQ_QDRANT_URL'),
+                        help="Serveur Qdrant (sinon base locale dans ./ma_memoire_qdrant)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Met à jour l'index existant (ajouts, modifications, suppressions) sans le recréer")
+    parser.add_argument('--quantization', choices=('none', 'int8', 'pq'), default='none',
+                        help="Collection quantifiée (moins de RAM) ; voir rapport_quantification.py")
+    parser.add_argument('--pq-compression', choices=('x4', 'x8', 'x16', 'x32', 'x64'), default='x16')
+    parser.add_argument('--on-disk', action='store_true',
+                        help="Vecteurs originaux sur disque (gardés pour le re-classement), seuls les quantifiés en RAM")
+    parser.add_argument('--hnsw-m', type=int, default=None,
+                        help="Liens par nœud du graphe HNSW (défaut Qdrant : 16) ; voir benchmarks/bench_hnsw.py")
+    parser.add_argument('--hnsw-ef-construct', type=int, default=None,
+                        help="Largeur de recherche à la construction du graphe (défaut Qdrant : 100)")
+    args = parser.parse_args()
+
+    if not args.url and not args.incremental:
+        # --- NETTOYAGE (Optionnel) ---
+        # Si le dossier existe déjà, on le supprime pour repartir à zéro
+        if os.path.exists(DOSSIER_MEMOIRE):
+            shutil.rmtree(DOSSIER_MEMOIRE)
+            print("🧹 Ancienne mémoire effacée.")
+
+    print("1️⃣ Chargement des fichiers...")
+    try:
+        lire_paquet, dimension, total, cles = ouvrir_vecteurs()
+        if not os.path.exists('base_de_connaissance.csv'):
+            raise FileNotFoundError('base_de_connaissance.csv')
+        print(f"   -> {total} clients à charger.")
+    except FileNotFoundError:
+        print("❌ ERREUR : Fichiers manquants (étape 2).")
+        sys.exit()
+
+    print("2️⃣ Initialisation de Qdrant...")
+    if args.url:
+        client = QdrantClient(url=args.url)
+        parallel = max(1, args.parallel)
+    else:
+        # On crée une base de données LOCALE (sur ton disque dur)
+        client = QdrantClient(path=DOSSIER_MEMOIRE)
+        # Le client local n'accepte pas d'écritures concurrentes : un seul upsert à la fois
+        parallel = 1
+
+    existants = None
+    if args.incremental and cles is None:
+        print("❌ Mode incrémental impossible : pas d'empreintes (relance vectoriser.py).")
+        sys.exit()
+    if args.incremental and client.collection_exists(COLLECTION):
+        # L'index reste en ligne : on ne fait qu'ajouter, modifier et supprimer des points
+        existants = lire_existants(client)
+        print(f"   -> {len(existants)} points déjà indexés.")
+    else:
+        # Qdrant a besoin de savoir la taille des vecteurs (384 pour all-MiniLM-L6-v2)
+        if client.collection_exists(COLLECTION):
+            client.delete_collection(COLLECTION)
+        client.create_collection(
+            collection_name=COLLECTION,
+            vectors_config=VectorParams(size=dimension, distance=Distance.COSINE, on_disk=args.on_disk),
+            quantization_config=config_quantification(args.quantization, args.pq_compression),
+            hnsw_config=HnswConfigDiff(m=args.hnsw_m, ef_construct=args.hnsw_ef_construct),
+        )
+        if args.quantization != 'none':
+            # Le mode local (sans serveur) accepte la config mais cherche toujours en exact
+            print(f"   -> Collection quantifiée ({args.quantization}), originaux {'sur disque' if args.on_disk else 'en RAM'}.")
+
+    print(f"3️⃣ Remplissage de la mémoire (paquets de {args.batch_size}, {parallel} en parallèle)...")
+    envoyes = 0
+    debut = time.perf_counter()
+
+    def termine(paquet_futur):
+        nonlocal envoyes
+        paquet, futur = paquet_futur
+        futur.result()  # relance l'erreur si toutes les tentatives ont échoué
+        envoyes += len(paquet.ids)
+        debit = envoyes / (time.perf_counter() - debut)
+        print(f"   -> {envoyes}/{total} clients ({debit:,.0f} lignes/s)")
+
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        # Au plus 2 paquets en attente par envoi parallèle : la mémoire reste plate
+        en_vol = deque()
+        for paquet in paquets_de_points(lire_paquet, args.batch_size, cles, existants):
+            en_vol.append((paquet, pool.submit(envoyer, client, paquet, args.retries)))
+            if len(en_vol) >= 2 * parallel:
+                termine(en_vol.popleft())
+        while en_vol:
+            termine(en_vol.popleft())
+
+    if existants:
+        # Ce qui reste dans existants a disparu de la source
+        disparus = list(existants)
+        for i in range(0, len(disparus), args.batch_size):
+            client.delete(collection_name=COLLECTION,
+                          points_selector=PointIdsList(points=disparus[i:i + args.batch_size]))
+        print(f"   -> {len(disparus)} points supprimés (lignes disparues).")
+
+    duree = time.perf_counter() - debut
+    print("\n✅ SUCCÈS ! La mémoire Qdrant est construite.")
+    print(f"📁 {envoyes} clients en {duree:.1f}s ({envoyes / max(duree, 1e-9):,.0f} lignes/s)")
+    if not args.url:
+        print(f"📁 Données sauvegardées dans le dossier '{DOSSIER_MEMOIRE}'")
+
+
+if __name__ == "__main__":
+    main()
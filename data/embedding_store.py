@@ -0,0 +1,251 @@
+"""
+Stockage des embeddings sur disque, lu en memory-map (np.memmap).
+
+Format d'un fichier .emb :
+  - 8 octets  : signature b"CIQEMB1\\n"
+  - en-tête   : JSON (modèle, dimension, nb de lignes, dtype) complété par des espaces jusqu'à 4096 octets
+  - données   : les lignes, à la suite
+
+Fichier voisin .emb.keys (optionnel) : l'identifiant "keys_id" de l'en-tête (16 octets, pour
+vérifier que les deux fichiers vont ensemble), puis une empreinte de 16 octets par ligne
+(modèle + description, voir empreintes()), utilisée pour les mises à jour incrémentales.
+
+dtypes possibles :
+  - "float32" : exact
+  - "float16" : 2x plus petit
+  - "int8"    : 4x plus petit, chaque ligne garde son échelle (float32) -> x ≈ q * scale
+"""
+import hashlib
+import json
+import os
+import uuid
+import numpy as np
+
+MAGIC = b"CIQEMB1\n"
+HEADER_SIZE = 4096
+DTYPES = ("float32", "float16", "int8")
+KEY_SIZE = 16
+# Espace de noms fixe : le même contenu donne toujours le même ID de point Qdrant
+NAMESPACE_POINTS = uuid.UUID("6f1c1d2e-8a4b-4c3e-9f5a-0b7d2e4c6a81")
+
+
+def empreintes(descriptions, nom_modele):
+    """Empreinte (16 octets) de chaque ligne : change si le texte ou le modèle change."""
+    prefixe = f"{nom_modele}\0".encode("utf-8")
+    return np.array(
+        [hashlib.blake2b(prefixe + str(d).encode("utf-8"), digest_size=KEY_SIZE).digest() for d in descriptions],
+        dtype=f"S{KEY_SIZE}",
+    )
+
+
+class IdsPoints:
+    """
+    ID de point stable pour chaque empreinte, dans l'ordre du fichier.
+    Les descriptions en double reçoivent #1, #2... pour rester des points distincts.
+    """
+    def __init__(self):
+        self.vus = {}
+
+    def __call__(self, cles):
+        ids = []
+        for cle in cles:
+            n = self.vus.get(cle, 0)
+            self.vus[cle] = n + 1
+            ids.append(str(uuid.uuid5(NAMESPACE_POINTS, f"{cle.hex()}#{n}")))
+        return ids
+
+
+def _row_dtype(dtype, dim):
+    if dtype == "int8":
+        return np.dtype([("q", np.int8, (dim,)), ("scale", "<f4")])
+    if dtype in ("float32", "float16"):
+        return np.dtype((np.dtype(dtype).newbyteorder("<"), (dim,)))
+    raise ValueError(f"dtype inconnu '{dtype}' (choix : {', '.join(DTYPES)})")
+
+
+def _read_header(path):
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} n'est pas un fichier d'embeddings CIQEMB1")
+        return json.loads(f.read(HEADER_SIZE - len(MAGIC)).decode("utf-8").strip())
+
+
+def _keys_valid(keys_path, header):
+    """Le fichier .keys correspond-il à cet en-tête et couvre-t-il toutes les lignes ?"""
+    if not os.path.exists(keys_path) or "keys_id" not in header:
+        return False
+    if os.path.getsize(keys_path) < KEY_SIZE * (1 + header["rows"]):
+        return False
+    with open(keys_path, "rb") as f:
+        return f.read(KEY_SIZE) == bytes.fromhex(header["keys_id"])
+
+
+def _write_header(f, header):
+    raw = json.dumps(header).encode("utf-8")
+    if len(MAGIC) + len(raw) > HEADER_SIZE:
+        raise ValueError("En-tête trop grand")
+    f.seek(0)
+    f.write(MAGIC + raw + b" " * (HEADER_SIZE - len(MAGIC) - len(raw)))
+
+
+def quantize_int8(vectors):
+    """Quantification symétrique par ligne : q = round(x / scale), scale = max|x| / 127."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scale = np.abs(vectors).max(axis=1) / 127.0
+    scale[scale == 0] = 1.0
+    q = np.clip(np.rint(vectors / scale[:, None]), -127, 127).astype(np.int8)
+    return q, scale.astype(np.float32)
+
+
+class EmbeddingStoreWriter:
+    """
+    Écrit (ou complète) un fichier .emb par paquets.
+    mode="w" crée un nouveau fichier, mode="a" reprend un fichier existant
+    (l'en-tête fait foi : une ligne à moitié écrite après un crash est ignorée).
+    """
+    def __init__(self, path, model_name=None, dim=None, dtype="float32", mode="w"):
+        self.path = path
+        self.keys_path = path + ".keys"
+        self.keys_f = None
+        if mode == "a" and os.path.exists(path):
+            self.header = _read_header(path)
+            self.row_dtype = _row_dtype(self.header["dtype"], self.header["dim"])
+            self.f = open(path, "r+b")
+            # On coupe tout ce qui dépasse les lignes validées dans l'en-tête
+            self.f.truncate(HEADER_SIZE + self.header["rows"] * self.row_dtype.itemsize)
+            if _keys_valid(self.keys_path, self.header):
+                self.keys_f = open(self.keys_path, "r+b")
+                self.keys_f.truncate(KEY_SIZE * (1 + self.rows))
+                self.keys_f.seek(0, os.SEEK_END)
+        else:
+            if dim is None:
+                raise ValueError("dim est obligatoire pour créer un fichier")
+            self.header = {"version": 1, "model": model_name, "dim": int(dim), "dtype": dtype, "rows": 0,
+                           "keys_id": uuid.uuid4().hex}
+            self.row_dtype = _row_dtype(dtype, dim)
+            self.f = open(path, "w+b")
+            _write_header(self.f, self.header)
+            if os.path.exists(self.keys_path):
+                os.remove(self.keys_path)
+        self.f.seek(0, os.SEEK_END)
+
+    @property
+    def rows(self):
+        return self.header["rows"]
+
+    def append(self, vectors, keys=None):
+        """
+        Ajoute un paquet de vecteurs (N, dim) puis valide le nouveau nombre de lignes dans l'en-tête.
+        keys : empreintes des lignes (voir empreintes()), à fournir à chaque paquet ou jamais.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[1] != self.header["dim"]:
+            raise ValueError(f"Attendu (N, {self.header['dim']}), reçu {vectors.shape}")
+        if keys is not None:
+            if self.keys_f is None:
+                if self.rows:
+                    raise ValueError("Ce fichier a été écrit sans empreintes")
+                self.keys_f = open(self.keys_path, "w+b")
+                self.keys_f.write(bytes.fromhex(self.header["keys_id"]))
+            keys = np.asarray(keys, dtype=f"S{KEY_SIZE}")
+            if len(keys) != len(vectors):
+                raise ValueError("Une empreinte par vecteur")
+            self.keys_f.write(keys.tobytes())
+            self.keys_f.flush()
+        elif self.keys_f is not None:
+            raise ValueError("Ce fichier attend une empreinte par ligne")
+
+        if self.header["dtype"] == "int8":
+            rows = np.empty(len(vectors), dtype=self.row_dtype)
+            rows["q"], rows["scale"] = quantize_int8(vectors)
+        else:
+            rows = vectors.astype(self.row_dtype.base)
+
+        self.f.seek(0, os.SEEK_END)
+        self.f.write(rows.tobytes())
+        self.f.flush()
+        # Les données d'abord, l'en-tête ensuite : en cas de crash on perd au pire le dernier paquet
+        self.header["rows"] += len(vectors)
+        _write_header(self.f, self.header)
+        self.f.flush()
+        self.f.seek(0, os.SEEK_END)
+
+    def close(self):
+        for f in (self.f, self.keys_f):
+            if f is not None:
+                f.flush()
+                os.fsync(f.fileno())
+                f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class EmbeddingStore:
+    """
+    Lecture en memory-map : rien n'est chargé en RAM tant qu'on ne touche pas aux lignes.
+    store[a:b] renvoie une vue sans copie (float32/float16) ; chunk(a, b) renvoie du float32
+    (copie limitée au paquet, et déquantifiée pour int8).
+    """
+    def __init__(self, path):
+        self.path = path
+        self.header = _read_header(path)
+        self.model_name = self.header["model"]
+        self.dim = self.header["dim"]
+        self.dtype = self.header["dtype"]
+        row_dtype = _row_dtype(self.dtype, self.dim)
+        if self.header["rows"]:
+            self.raw = np.memmap(path, dtype=row_dtype, mode="r", offset=HEADER_SIZE,
+                                 shape=(self.header["rows"],))
+        else:
+            self.raw = np.empty(0, dtype=row_dtype)
+
+        # Empreintes par ligne, si le fichier .keys est complet
+        keys_path = path + ".keys"
+        self.keys = None
+        if _keys_valid(keys_path, self.header):
+            if len(self):
+                self.keys = np.memmap(keys_path, dtype=f"S{KEY_SIZE}", mode="r", offset=KEY_SIZE,
+                                      shape=(len(self),))
+            else:
+                self.keys = np.empty(0, dtype=f"S{KEY_SIZE}")
+
+    def __len__(self):
+        return self.header["rows"]
+
+    @property
+    def shape(self):
+        return (len(self), self.dim)
+
+    def __getitem__(self, idx):
+        # Vue directe sur le fichier (pour int8 : tableau structuré, champs "q" et "scale")
+        return self.raw[idx]
+
+    def chunk(self, start, stop):
+        rows = self.raw[start:stop]
+        if self.dtype == "int8":
+            return rows["q"].astype(np.float32) * rows["scale"][:, None]
+        return np.asarray(rows, dtype=np.float32)
+
+    def take(self, rows):
+        """Vecteurs float32 des lignes demandées (dans l'ordre donné)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        selection = self.raw[rows]
+        if self.dtype == "int8":
+            return selection["q"].astype(np.float32) * selection["scale"][:, None]
+        return np.asarray(selection, dtype=np.float32)
+
+    def iter_chunks(self, chunk_size=4096):
+        """(début, vecteurs float32) par paquets de chunk_size lignes."""
+        for start in range(0, len(self), chunk_size):
+            yield start, self.chunk(start, start + chunk_size)
+
+
+def save_embeddings(path, vectors, model_name, dtype="float32", keys=None):
+    vectors = np.asarray(vectors)
+    with EmbeddingStoreWriter(path, model_name=model_name, dim=vectors.shape[1], dtype=dtype) as writer:
+        writer.append(vectors, keys=keys)
+    return path
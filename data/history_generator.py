@@ -1,84 +1,196 @@
-import json
-import random
+import argparse
 import os
+import sys
+import time
+import numpy as np
 
-def generate_profile(case_id):
-    """Generates a realistic-ish loan profile."""
-    # Profiles:
-    # 1. Safe: High Income, Good Credit, Low Loan
-    # 2. Risky: Low Income, Bad Credit, High Loan
-    # 3. Average: Mixed
-    
-    category = random.choices(['safe', 'risky', 'average', 'fraud'], weights=[0.4, 0.3, 0.25, 0.05])[0]
-    
-    profile = {}
-    decision = "decline"
-    labels = []
-    
-    if category == 'safe':
-        profile = {
-            'income': random.randint(6000, 15000),
-            'expenses': random.randint(1000, 3000),
-            'employment_length': random.randint(3, 10),
-            'loan_amount': random.randint(5000, 20000),
-            'loan_term': random.choice([12, 24, 36]),
-            'credit_history': 'good'
-        }
-        decision = "approve"
-        
-    elif category == 'risky':
-        profile = {
-            'income': random.randint(2000, 4000),
-            'expenses': random.randint(1500, 3000),
-            'employment_length': random.randint(0, 2),
-            'loan_amount': random.randint(10000, 40000),
-            'loan_term': random.choice([36, 48, 60]),
-            'credit_history': 'fair' if random.random() > 0.5 else 'bad'
-        }
-        decision = "decline"
-
-    elif category == 'average':
-        profile = {
-            'income': random.randint(4000, 7000),
-            'expenses': random.randint(2000, 4000),
-            'employment_length': random.randint(1, 4),
-            'loan_amount': random.randint(5000, 15000),
-            'loan_term': 24,
-            'credit_history': 'fair'
-        }
-        # T Toss
-        decision = "approve" if profile['income'] > 5000 else "decline"
-
-    elif category == 'fraud':
-        # Fraud lookalikes: seemingly ok but specific weird patterns (captured in vector space hopefully)
-        profile = {
-            'income': random.randint(8000, 12000),
-            'expenses': 500, # Unrealistic low expenses
-            'employment_length': 0,
-            'loan_amount': 45000, # Max out
-            'loan_term': 12, # Short term
-            'credit_history': 'good' # Stolen profile maybe
+# Run as a script too (python data/history_generator.py): the repo root holds src/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.history_io import history_schema
+
+# Profiles:
+# 1. Safe: High Income, Good Credit, Low Loan
+# 2. Risky: Low Income, Bad Credit, High Loan
+# 3. Average: Mixed
+# 4. Fraud: seemingly ok but specific weird patterns (captured in vector space hopefully)
+CATEGORIES = ('safe', 'risky', 'average', 'fraud')
+DEFAULT_MIX = (0.4, 0.3, 0.25, 0.05)
+
+PROFILE_FIELDS = ('income', 'expenses', 'employment_length', 'loan_amount', 'loan_term', 'credit_history')
+
+# Inclusive (low, high) ranges per category; a single value means a constant
+RANGES = {
+    'safe':    {'income': (6000, 15000), 'expenses': (1000, 3000), 'employment_length': (3, 10),
+                'loan_amount': (5000, 20000), 'loan_term': [12, 24, 36]},
+    'risky':   {'income': (2000, 4000), 'expenses': (1500, 3000), 'employment_length': (0, 2),
+                'loan_amount': (10000, 40000), 'loan_term': [36, 48, 60]},
+    'average': {'income': (4000, 7000), 'expenses': (2000, 4000), 'employment_length': (1, 4),
+                'loan_amount': (5000, 15000), 'loan_term': [24]},
+    'fraud':   {'income': (8000, 12000), 'expenses': (500, 500), 'employment_length': (0, 0),
+                'loan_amount': (45000, 45000), 'loan_term': [12]},  # Unrealistic low expenses, max out, short term
+}
+
+def generate_block(rng, start_id, n, mix=DEFAULT_MIX):
+    """
+    Generates n cases as columns (NumPy arrays), ids start_id..start_id + n - 1.
+    mix: weights of the safe/risky/average/fraud categories (normalized here).
+    """
+    p = np.asarray(mix, dtype=float)
+    category = rng.choice(len(CATEGORIES), size=n, p=p / p.sum())
+
+    cols = {'id': np.arange(start_id, start_id + n, dtype=np.int64)}
+    for field in ('income', 'expenses', 'employment_length', 'loan_amount', 'loan_term'):
+        cols[field] = np.empty(n, dtype=np.int64)
+    for c, name in enumerate(CATEGORIES):
+        mask = category == c
+        m = int(mask.sum())
+        for field, spec in RANGES[name].items():
+            if isinstance(spec, list):
+                cols[field][mask] = rng.choice(spec, size=m)
+            else:
+                cols[field][mask] = rng.integers(spec[0], spec[1] + 1, size=m)
+
+    safe, risky, average, fraud = (category == c for c in range(len(CATEGORIES)))
+    credit = np.full(n, 'good', dtype=object)
+    credit[average] = 'fair'
+    credit[risky] = np.where(rng.random(int(risky.sum())) > 0.5, 'fair', 'bad')
+    cols['credit_history'] = credit
+
+    # Average applicants: T Toss on income
+    approve = safe | (average & (cols['income'] > 5000))
+    cols['decision'] = np.where(approve, 'approve', 'decline').astype(object)
+    cols['outcome'] = np.where(approve & (rng.random(n) > 0.1), 'repaid', 'default').astype(object)
+    cols['fraud'] = fraud
+    return cols
+
+def records(cols):
+    """Columns -> list of case dicts (the history.json layout)."""
+    return [
+        {
+            "id": int(i),
+            "profile": {
+                'income': int(inc), 'expenses': int(exp), 'employment_length': int(emp),
+                'loan_amount': int(amt), 'loan_term': int(term), 'credit_history': credit
+            },
+            "decision": decision,
+            "outcome": outcome,
+            "labels": ["fraud"] if fraud else []
         }
-        decision = "decline"
-        labels = ["fraud"]
+        for i, inc, exp, emp, amt, term, credit, decision, outcome, fraud in zip(
+            cols['id'], cols['income'], cols['expenses'], cols['employment_length'], cols['loan_amount'],
+            cols['loan_term'], cols['credit_history'], cols['decision'], cols['outcome'], cols['fraud'])
+    ]
+
+def generate_profile(case_id, rng=None):
+    """Generates a single realistic-ish loan case."""
+    return records(generate_block(rng or np.random.default_rng(), case_id, 1))[0]
 
-    return {
-        "id": case_id,
-        "profile": profile,
-        "decision": decision,
-        "outcome": "repaid" if decision == "approve" and random.random() > 0.1 else "default",
-        "labels": labels
-    }
+# One JSON object per case, formatted directly (json.dumps per row dominates at this scale)
+_TEMPLATE = (
+    '{"id": %d, "profile": {"income": %d, "expenses": %d, "employment_length": %d, '
+    '"loan_amount": %d, "loan_term": %d, "credit_history": "%s"}, '
+    '"decision": "%s", "outcome": "%s", "labels": %s}'
+)
+
+def format_lines(cols):
+    labels = np.where(cols['fraud'], '["fraud"]', '[]')
+    rows = zip(cols['id'].tolist(), cols['income'].tolist(), cols['expenses'].tolist(),
+               cols['employment_length'].tolist(), cols['loan_amount'].tolist(), cols['loan_term'].tolist(),
+               cols['credit_history'], cols['decision'], cols['outcome'], labels)
+    return [_TEMPLATE % row for row in rows]
+
+class JsonWriter:
+    """JSON array (history.json) when array=True, JSON Lines otherwise; written block by block."""
+    def __init__(self, path, array=True):
+        self.f = open(path, 'w')
+        self.array = array
+        self.first = True
+        if array:
+            self.f.write('[\n')
+
+    def write(self, cols):
+        lines = format_lines(cols)
+        if not lines:
+            return
+        sep = ',\n' if self.array else '\n'
+        if not self.first:
+            self.f.write(sep)
+        self.f.write(sep.join(lines))
+        self.first = False
+
+    def close(self):
+        self.f.write('\n]\n' if self.array else '\n')
+        self.f.close()
+
+class ParquetWriter:
+    """Flat columnar layout (see src/history_io.py): typed profile columns, dictionary-encoded categoricals."""
+    def __init__(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa = pa
+        self.schema = history_schema()
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, cols):
+        pa = self.pa
+        offsets = np.concatenate([[0], np.cumsum(cols['fraud'])]).astype(np.int32)
+        fraud = pa.array(['fraud'] * int(offsets[-1]), type=pa.string())
+        arrays = [pa.array(cols['id'])]
+        arrays += [pa.array(cols[f], type=self.schema.field(f).type) for f in PROFILE_FIELDS if f != 'credit_history']
+        arrays += [pa.array(cols[f], type=pa.string()).dictionary_encode()
+                   for f in ('credit_history', 'decision', 'outcome')]
+        arrays.append(pa.ListArray.from_arrays(offsets, fraud))
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+def open_writer(path, fmt):
+    if fmt == 'parquet':
+        return ParquetWriter(path)
+    return JsonWriter(path, array=(fmt == 'json'))
+
+def generate(path, cases, seed=None, mix=DEFAULT_MIX, fmt=None, block_size=100_000, progress=None):
+    """
+    Streams `cases` cases to path, block_size at a time (memory is bounded by one block).
+    The same seed, mix and block_size always give the same file.
+    fmt: 'json' (array), 'jsonl' or 'parquet'; inferred from the extension when None.
+    """
+    if fmt is None:
+        fmt = {'.jsonl': 'jsonl', '.parquet': 'parquet'}.get(os.path.splitext(path)[1], 'json')
+    rng = np.random.default_rng(seed)
+    writer = open_writer(path, fmt)
+    try:
+        for start in range(0, cases, block_size):
+            writer.write(generate_block(rng, start, min(block_size, cases - start), mix))
+            if progress:
+                progress(min(start + block_size, cases))
+    finally:
+        writer.close()
+    return path
 
 def main():
-    data = []
-    for i in range(100):
-        data.append(generate_profile(i))
-        
-    os.makedirs("data", exist_ok=True)
-    with open("data/history.json", "w") as f:
-        json.dump(data, f, indent=2)
-    print(f"Generated {len(data)} cases in data/history.json")
+    parser = argparse.ArgumentParser(description="Generates a synthetic credit history.")
+    parser.add_argument('--cases', type=int, default=100)
+    parser.add_argument('--output', default='data/history.json',
+                        help="Format follows the extension: .json (array), .jsonl, .parquet")
+    parser.add_argument('--format', choices=('json', 'jsonl', 'parquet'), default=None)
+    parser.add_argument('--seed', type=int, default=None, help="Same seed -> same history")
+    parser.add_argument('--mix', type=float, nargs=4, default=list(DEFAULT_MIX),
+                        metavar=('SAFE', 'RISKY', 'AVERAGE', 'FRAUD'), help="Category weights")
+    parser.add_argument('--block-size', type=int, default=100_000)
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    start = time.perf_counter()
+
+    def progress(done):
+        if args.cases > args.block_size:
+            print(f"  {done:,}/{args.cases:,} cases ({done / (time.perf_counter() - start):,.0f}/s)")
+
+    generate(args.output, args.cases, seed=args.seed, mix=args.mix, fmt=args.format,
+             block_size=args.block_size, progress=progress)
+    print(f"Generated {args.cases} cases in {args.output} ({time.perf_counter() - start:.1f}s)")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,168 @@
+"""
+Rapport : que perd-on en quantifiant dossiers_clients ?
+
+Compare, sur les vecteurs de mes_vecteurs.emb, la recherche exacte (float32) à :
+  - int8 scalaire (comme Qdrant : bornes au quantile 0.99, 1 octet par dimension)
+  - quantification produit (PQ, 256 centroïdes par sous-vecteur, compression x4 à x64)
+avec et sans re-classement (rescore) des candidats sur les vecteurs originaux.
+
+Mesures : recall@5 (voisins retrouvés) et accord du vote GOOD/BAD (même règle que
+app_visuelle.py). Le client Qdrant local cherche toujours en exact : la notation
+quantifiée est donc reproduite ici en NumPy, avec les mêmes paramètres que le serveur.
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from embedding_store import EmbeddingStore
+
+K = 5
+SEUIL_REFUS = 25.0  # mêmes règles que app_visuelle.py
+
+
+def charger():
+    if os.path.exists('mes_vecteurs.emb'):
+        vecteurs = EmbeddingStore('mes_vecteurs.emb').chunk(0, None)
+    else:
+        vecteurs = np.load('mes_vecteurs.npy').astype(np.float32)
+    risques = pd.read_csv('base_de_connaissance.csv', usecols=['Risk'])['Risk'].to_numpy()
+    # Distance cosinus : Qdrant normalise les vecteurs à l'insertion
+    vecteurs = vecteurs / np.maximum(np.linalg.norm(vecteurs, axis=1, keepdims=True), 1e-12)
+    return vecteurs, risques
+
+
+def top_k(scores, k):
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    ordre = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(top, ordre, axis=1)
+
+
+def sans_soi_meme(scores, requetes):
+    # Chaque requête est un dossier de la base : on l'exclut de ses propres voisins
+    scores[np.arange(len(requetes)), requetes] = -np.inf
+    return scores
+
+
+# --- int8 scalaire ---------------------------------------------------------
+
+def int8_scalaire(vecteurs, quantile=0.99):
+    """Bornes communes au quantile (comme Qdrant), 256 niveaux. Renvoie la version déquantifiée."""
+    bas, haut = np.quantile(vecteurs, [(1 - quantile) / 2, (1 + quantile) / 2])
+    pas = (haut - bas) / 255.0
+    codes = np.clip(np.rint((vecteurs - bas) / pas), 0, 255).astype(np.uint8)
+    return codes.astype(np.float32) * pas + bas, codes.nbytes / len(vecteurs)
+
+
+# --- quantification produit -------------------------------------------------
+
+def kmeans(x, k, iterations, rng):
+    centres = x[rng.choice(len(x), size=min(k, len(x)), replace=False)].copy()
+    for _ in range(iterations):
+        d = (x ** 2).sum(1)[:, None] - 2 * x @ centres.T + (centres ** 2).sum(1)[None, :]
+        affect = d.argmin(axis=1)
+        for c in range(len(centres)):
+            membres = x[affect == c]
+            if len(membres):
+                centres[c] = membres.mean(axis=0)
+    return centres
+
+
+def quantif_produit(vecteurs, compression, iterations=8, graine=0):
+    """
+    Compression xN sur du float32 : chaque sous-vecteur de N/4 dimensions devient 1 octet
+    (index parmi 256 centroïdes). Renvoie la version reconstruite.
+    """
+    rng = np.random.default_rng(graine)
+    sous_dim = max(1, compression // 4)
+    dim = vecteurs.shape[1]
+    reconstruits = np.empty_like(vecteurs)
+    apprentissage = vecteurs[rng.choice(len(vecteurs), size=min(len(vecteurs), 20000), replace=False)]
+    nb_codes = 0
+    for debut in range(0, dim, sous_dim):
+        fin = min(dim, debut + sous_dim)
+        centres = kmeans(apprentissage[:, debut:fin], 256, iterations, rng)
+        partie = vecteurs[:, debut:fin]
+        d = (partie ** 2).sum(1)[:, None] - 2 * partie @ centres.T + (centres ** 2).sum(1)[None, :]
+        reconstruits[:, debut:fin] = centres[d.argmin(axis=1)]
+        nb_codes += 1
+    return reconstruits, nb_codes  # 1 octet par sous-vecteur
+
+
+# --- mesures -----------------------------------------------------------------
+
+def vote(indices, scores, risques):
+    """REFUS / ACCORD comme app_visuelle.py : les BAD pèsent 3 fois plus."""
+    mauvais = risques[indices] == 'bad'
+    puissance_bad = np.where(mauvais, scores, 0.0).sum(axis=1) * 3.0
+    puissance_good = np.where(mauvais, 0.0, scores).sum(axis=1)
+    total = puissance_bad + puissance_good
+    risque = np.divide(puissance_bad, total, out=np.zeros_like(total), where=total > 0) * 100
+    return risque > SEUIL_REFUS
+
+
+def evaluer(requetes, vecteurs, approx, risques, exact_idx, exact_refus, sur_echantillon):
+    scores_approx = sans_soi_meme(vecteurs[requetes] @ approx.T, requetes)
+    if sur_echantillon > 1:
+        # Re-classement : on prend K * sur_echantillon candidats approchés, notés ensuite en exact
+        candidats = top_k(scores_approx, K * sur_echantillon)
+        exacts = np.einsum('qd,qkd->qk', vecteurs[requetes], vecteurs[candidats])
+        idx = np.take_along_axis(candidats, top_k(exacts, K), axis=1)
+    else:
+        idx = top_k(scores_approx, K)
+    # Le vote utilise les similarités renvoyées par Qdrant : exactes si re-classement
+    scores = np.einsum('qd,qkd->qk', vecteurs[requetes], vecteurs[idx]) if sur_echantillon > 1 \
+        else np.take_along_axis(scores_approx, idx, axis=1)
+    rappel = np.mean([len(set(a) & set(b)) / K for a, b in zip(idx, exact_idx)])
+    accord = np.mean(vote(idx, scores, risques) == exact_refus)
+    return rappel, accord
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@5 et accord de vote des collections quantifiées.")
+    parser.add_argument('--queries', type=int, default=500, help="Dossiers tirés au hasard comme requêtes")
+    parser.add_argument('--pq-compression', type=int, nargs='+', default=[16, 32], help="Compressions PQ testées")
+    parser.add_argument('--oversampling', type=int, default=2, help="Candidats re-classés = 5 x oversampling")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print("1️⃣ Chargement des vecteurs...")
+    try:
+        vecteurs, risques = charger()
+    except FileNotFoundError:
+        print("❌ ERREUR : Fichiers manquants (lance vectoriser.py d'abord).")
+        sys.exit()
+    n, dim = vecteurs.shape
+    print(f"   -> {n} dossiers, {dim} dimensions ({vecteurs.nbytes / 1e6:.1f} Mo en float32)")
+
+    rng = np.random.default_rng(args.seed)
+    requetes = rng.choice(n, size=min(args.queries, n), replace=False)
+    scores_exacts = sans_soi_meme(vecteurs[requetes] @ vecteurs.T, requetes)
+    exact_idx = top_k(scores_exacts, K)
+    exact_refus = vote(exact_idx, np.take_along_axis(scores_exacts, exact_idx, axis=1), risques)
+
+    print("2️⃣ Quantification...")
+    variantes = []
+    debut = time.perf_counter()
+    approx, octets = int8_scalaire(vecteurs)
+    variantes.append(("int8 scalaire", approx, octets))
+    for compression in args.pq_compression:
+        approx, octets = quantif_produit(vecteurs, compression, graine=args.seed)
+        variantes.append((f"PQ x{compression}", approx, octets))
+    print(f"   -> {time.perf_counter() - debut:.1f}s")
+
+    print(f"\n3️⃣ Rapport ({len(requetes)} requêtes, k={K}, re-classement sur {K * args.oversampling} candidats)")
+    print(f"{'mode':<16} | {'octets/vecteur':>14} | {'RAM':>6} | {'recall@5':>8} | {'vote':>6} | "
+          f"{'recall@5 (rescore)':>18} | {'vote (rescore)':>14}")
+    print(f"{'float32 (exact)':<16} | {dim * 4:>14} | {'1x':>6} | {1.0:>8.1%} | {1.0:>6.1%} | {'-':>18} | {'-':>14}")
+    for nom, approx, octets in variantes:
+        rappel, accord = evaluer(requetes, vecteurs, approx, risques, exact_idx, exact_refus, 1)
+        rappel_r, accord_r = evaluer(requetes, vecteurs, approx, risques, exact_idx, exact_refus, args.oversampling)
+        print(f"{nom:<16} | {octets:>14.0f} | {dim * 4 / octets:>5.0f}x | {rappel:>8.1%} | {accord:>6.1%} | "
+              f"{rappel_r:>18.1%} | {accord_r:>14.1%}")
+    print("\nRAM : vecteurs quantifiés seulement (avec --on-disk, les originaux restent sur disque pour le rescore).")
+
+
+if __name__ == "__main__":
+    main()
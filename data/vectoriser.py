@@ -1,34 +1,255 @@
-from sentence_transformers import SentenceTransformer
-import pandas as pd
-import numpy as np
+import argparse
+import os
+import shutil
 import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from embedding_store import EmbeddingStore, EmbeddingStoreWriter, DTYPES, empreintes
+
+NOM_MODELE = 'all-MiniLM-L6-v2'
+FICHIER_ENTREE = 'donnees_pretes_pour_vecteurs.csv'
+FICHIER_VECTEURS = 'mes_vecteurs.emb'
+FICHIER_CONNAISSANCE = 'base_de_connaissance.csv'
+
+# Modèle chargé une seule fois par processus (travailleur ou principal)
+_model = None
+
+
+def _init_worker(nom_modele, nb_threads):
+    global _model
+    import torch
+    from sentence_transformers import SentenceTransformer
+    # Chaque processus garde quelques threads : pas de sur-souscription des coeurs
+    torch.set_num_threads(nb_threads)
+    _model = SentenceTransformer(nom_modele)
+
+
+def _encoder_paquet(descriptions):
+    return np.asarray(_model.encode(descriptions), dtype=np.float32)
+
+
+def encoder_en_paquets(paquets, workers, nb_threads):
+    """Encode chaque paquet de descriptions (sur un pool de processus si workers > 1), dans l'ordre."""
+    if workers == 1:
+        _init_worker(NOM_MODELE, nb_threads)
+        for descriptions in paquets:
+            yield _encoder_paquet(descriptions)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(NOM_MODELE, nb_threads)) as pool:
+        # Au plus 2 paquets en vol par processus : la mémoire reste bornée,
+        # et on rend les résultats dans l'ordre du fichier pour pouvoir reprendre.
+        en_vol = deque()
+        for descriptions in paquets:
+            en_vol.append(pool.submit(_encoder_paquet, descriptions))
+            if len(en_vol) >= 2 * workers:
+                yield en_vol.popleft().result()
+        while en_vol:
+            yield en_vol.popleft().result()
+
+
+def lire_paquets(chemin, taille, deja_faits=0):
+    """
+    Lit les descriptions du CSV par paquets, en sautant les deja_faits premiers clients (reprise).
+    On compte des enregistrements CSV, pas des lignes : une description entre guillemets
+    peut tenir sur plusieurs lignes.
+    """
+    a_sauter = deja_faits
+    for paquet in pd.read_csv(chemin, chunksize=taille, usecols=['Full_Description']):
+        descriptions = paquet['Full_Description'].tolist()
+        if a_sauter:
+            n = min(a_sauter, len(descriptions))
+            descriptions, a_sauter = descriptions[n:], a_sauter - n
+        if descriptions:
+            yield descriptions
+
+
+def compter_clients(chemin, taille=65536):
+    return sum(len(descriptions) for descriptions in lire_paquets(chemin, taille))
+
+
+def ouvrir_sortie(reprendre, format_vecteurs):
+    """Reprend mes_vecteurs.emb s'il est compatible, sinon repart de zéro."""
+    if reprendre and os.path.exists(FICHIER_VECTEURS):
+        writer = EmbeddingStoreWriter(FICHIER_VECTEURS, mode="a")
+        if writer.header["model"] == NOM_MODELE and writer.header["dtype"] == format_vecteurs:
+            return writer
+        writer.close()
+        print("   -> Fichier existant incompatible (modèle ou format différent) : on repart de zéro.")
+    if os.path.exists(FICHIER_VECTEURS):
+        os.remove(FICHIER_VECTEURS)
+    return None
+
+
+def debut_inchange(taille):
+    """
+    Les lignes déjà vectorisées sont-elles toujours le début du CSV ?
+    On compare leurs empreintes (.keys) à celles des descriptions actuelles : un CSV modifié
+    (même avec le même nombre de lignes) ne doit pas garder ses anciens vecteurs.
+    """
+    store = EmbeddingStore(FICHIER_VECTEURS)
+    if store.keys is None:
+        return False
+    verifies = 0
+    for descriptions in lire_paquets(FICHIER_ENTREE, taille):
+        n = min(len(descriptions), len(store) - verifies)
+        if n <= 0:
+            break
+        if not np.array_equal(empreintes(descriptions[:n], NOM_MODELE), store.keys[verifies:verifies + n]):
+            return False
+        verifies += n
+    return verifies == len(store)
+
+
+def vectoriser_incremental(args, workers, nb_threads, total):
+    """
+    Ne ré-encode que les lignes nouvelles ou modifiées : les autres vecteurs sont repris
+    de l'ancien fichier grâce aux empreintes (modèle + description).
+    Le nouveau fichier est écrit à côté puis remplace l'ancien d'un coup.
+    """
+    ancien = EmbeddingStore(FICHIER_VECTEURS)
+    if ancien.keys is None or ancien.model_name != NOM_MODELE:
+        return False
+    index_ancien = {cle: i for i, cle in enumerate(ancien.keys)}
+
+    # 1. Les textes jamais vus (chaque texte distinct n'est encodé qu'une fois)
+    a_encoder = {}
+    for descriptions in lire_paquets(FICHIER_ENTREE, args.chunk_size, 0):
+        for cle, description in zip(empreintes(descriptions, NOM_MODELE), descriptions):
+            if cle not in index_ancien:
+                a_encoder.setdefault(cle, description)
+    print(f"   -> {total - len(a_encoder)} lignes inchangées réutilisées, {len(a_encoder)} à encoder.")
+
+    nouveaux = {}
+    cles = list(a_encoder)
+    textes = list(a_encoder.values())
+    morceaux = (textes[i:i + args.chunk_size] for i in range(0, len(textes), args.chunk_size))
+    debut = time.perf_counter()
+    if textes:
+        for i, vecteurs in enumerate(encoder_en_paquets(morceaux, workers, nb_threads)):
+            for cle, vecteur in zip(cles[i * args.chunk_size:], vecteurs):
+                nouveaux[cle] = vecteur
+            print(f"   -> {len(nouveaux)}/{len(cles)} encodés "
+                  f"({len(nouveaux) / (time.perf_counter() - debut):,.0f} lignes/s)")
+
+    # 2. Nouveau fichier, dans l'ordre du CSV
+    temporaire = FICHIER_VECTEURS + ".tmp"
+    with EmbeddingStoreWriter(temporaire, model_name=NOM_MODELE, dim=ancien.dim, dtype=args.format) as writer:
+        for descriptions in lire_paquets(FICHIER_ENTREE, args.chunk_size, 0):
+            cles_paquet = empreintes(descriptions, NOM_MODELE)
+            vecteurs = np.empty((len(descriptions), ancien.dim), dtype=np.float32)
+            repris = [(j, index_ancien[c]) for j, c in enumerate(cles_paquet) if c in index_ancien]
+            if repris:
+                positions, lignes = zip(*repris)
+                vecteurs[list(positions)] = ancien.take(lignes)
+            for j, cle in enumerate(cles_paquet):
+                if cle not in index_ancien:
+                    vecteurs[j] = nouveaux[cle]
+            writer.append(vecteurs, keys=cles_paquet)
+
+    del ancien
+    # Les empreintes d'abord : tant que le .emb n'est pas remplacé, leur keys_id ne correspond pas
+    os.replace(temporaire + ".keys", FICHIER_VECTEURS + ".keys")
+    os.replace(temporaire, FICHIER_VECTEURS)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorise les descriptions clients par paquets.")
+    parser.add_argument('--format', choices=DTYPES, default='float32', help="Format de stockage des vecteurs")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Nombre de processus")
+    parser.add_argument('--chunk-size', type=int, default=2048, help="Descriptions par paquet")
+    parser.add_argument('--no-resume', action='store_true', help="Ignore un travail interrompu et recommence")
+    parser.add_argument('--incremental', action='store_true',
+                        help="N'encode que les lignes nouvelles ou modifiées depuis le dernier passage")
+    args = parser.parse_args()
+
+    # 1. Chargement
+    print("1️⃣  Chargement des données...")
+    if not os.path.exists(FICHIER_ENTREE):
+        print(f"❌ ERREUR : Le fichier '{FICHIER_ENTREE}' est introuvable.")
+        sys.exit()
+    total = compter_clients(FICHIER_ENTREE)
+    print(f"   -> Trouvé {total} clients dans le fichier.")
+
+    workers = max(1, args.workers)
+    nb_threads = max(1, (os.cpu_count() or 1) // workers)
+
+    if args.incremental and os.path.exists(FICHIER_VECTEURS):
+        print("2️⃣  Mise à jour incrémentale (empreintes modèle + texte)...")
+        if vectoriser_incremental(args, workers, nb_threads, total):
+            shutil.copyfile(FICHIER_ENTREE, FICHIER_CONNAISSANCE)
+            print("\n✅ SUCCÈS : vecteurs à jour.")
+            return
+        print("   -> Pas d'empreintes exploitables (ancien fichier ou autre modèle) : vectorisation complète.")
+        args.no_resume = True
+
+    writer = ouvrir_sortie(not args.no_resume, args.format)
+    deja_faits = writer.rows if writer else 0
+    if deja_faits and not debut_inchange(args.chunk_size):
+        # Le CSV a changé (ou rétréci) depuis : on ne reprend pas des vecteurs périmés
+        writer.close()
+        print("   -> Le CSV a changé depuis le dernier passage : mise à jour incrémentale.")
+        if vectoriser_incremental(args, workers, nb_threads, total):
+            shutil.copyfile(FICHIER_ENTREE, FICHIER_CONNAISSANCE)
+            print("\n✅ SUCCÈS : vecteurs à jour.")
+            return
+        print("   -> Pas d'empreintes pour vérifier l'existant : vectorisation complète.")
+        os.remove(FICHIER_VECTEURS)
+        writer, deja_faits = None, 0
+    if deja_faits:
+        print(f"   -> Reprise : {deja_faits} clients déjà vectorisés.")
+
+    # 2. Préparation du modèle IA (un exemplaire par processus)
+    print(f"2️⃣  Chargement du cerveau (Modèle) sur {workers} processus...")
+    # La première fois, ça prendra un peu de temps pour télécharger le modèle (80Mo)
+
+    # 3. Vectorisation par paquets, chaque paquet terminé est ajouté au fichier tout de suite
+    print("3️⃣  Traduction des textes en mathématiques (Patience)...")
+    faits = deja_faits
+    debut = time.perf_counter()
+
+    def enregistrer(vecteurs, cles):
+        nonlocal writer, faits
+        if writer is None:
+            writer = EmbeddingStoreWriter(FICHIER_VECTEURS, model_name=NOM_MODELE,
+                                          dim=vecteurs.shape[1], dtype=args.format)
+        writer.append(vecteurs, keys=cles if writer.keys_f is not None or writer.rows == 0 else None)
+        faits += len(vecteurs)
+        debit = (faits - deja_faits) / (time.perf_counter() - debut)
+        print(f"   -> {faits}/{total} clients ({debit:,.0f} lignes/s)")
+
+    # Les empreintes (modèle + texte) accompagnent les vecteurs : elles servent aux mises à jour incrémentales
+    cles_en_attente = deque()
+
+    def paquets():
+        for descriptions in lire_paquets(FICHIER_ENTREE, args.chunk_size, deja_faits):
+            cles_en_attente.append(empreintes(descriptions, NOM_MODELE))
+            yield descriptions
+
+    try:
+        for vecteurs in encoder_en_paquets(paquets(), workers, nb_threads):
+            enregistrer(vecteurs, cles_en_attente.popleft())
+    finally:
+        if writer is not None:
+            writer.close()
+
+    # 4. Sauvegarde
+    print("4️⃣  Sauvegarde des résultats...")
+    # On garde aussi les données textuelles liées (mêmes lignes, même ordre)
+    shutil.copyfile(FICHIER_ENTREE, FICHIER_CONNAISSANCE)
+
+    duree = time.perf_counter() - debut
+    print("\n✅ SUCCÈS TOTAL !")
+    print(f"Tu as créé {faits} vecteurs ({args.format}) en {duree:.1f}s "
+          f"({(faits - deja_faits) / max(duree, 1e-9):,.0f} lignes/s).")
+    print(f"Fichiers créés : '{FICHIER_VECTEURS}' et '{FICHIER_CONNAISSANCE}'")
+
 
-# 1. Chargement
-print("1️⃣  Chargement des données...")
-try:
-    df = pd.read_csv('donnees_pretes_pour_vecteurs.csv')
-    print(f"   -> Trouvé {len(df)} clients dans le fichier.")
-except FileNotFoundError:
-    print("❌ ERREUR : Le fichier 'donnees_pretes_pour_vecteurs.csv' est introuvable.")
-    sys.exit()
-
-# 2. Préparation du modèle IA
-print("2️⃣  Chargement du cerveau (Modèle)...")
-# La première fois, ça prendra un peu de temps pour télécharger le modèle (80Mo)
-model = SentenceTransformer('all-MiniLM-L6-v2')
-
-# 3. Vectorisation
-print("3️⃣  Traduction des textes en mathématiques (Patience)...")
-descriptions = df['Full_Description'].tolist()
-vectors = model.encode(descriptions)
-
-# 4. Sauvegarde
-print("4️⃣  Sauvegarde des résultats...")
-# On sauvegarde les vecteurs dans un fichier .npy (format rapide)
-np.save('mes_vecteurs.npy', vectors)
-# On garde aussi les données textuelles liées
-df.to_csv('base_de_connaissance.csv', index=False)
-
-print("\n✅ SUCCÈS TOTAL !")
-print(f"Tu as créé {vectors.shape[0]} vecteurs de dimension {vectors.shape[1]}.")
-print("Fichiers créés : 'mes_vecteurs.npy' et 'base_de_connaissance.csv'")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
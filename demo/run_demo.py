@@ -25,13 +25,15 @@ def main():
         print("Error: data/history.json not found. Run generator first.")
         return
 
-    print("Loading historical data...")
-    engine.load_history("data/history.json")
+    if engine.memory.get_stats()['total_cases']:
+        print("Reopened persistent memory (skipping history load).")
+    else:
+        print("Loading historical data...")
+        engine.load_history("data/history.json")
     stats = engine.memory.get_stats()
     print(
-    f"Memory Loaded: {stats.get('total_cases', 'N/A')} cases "
-    f"({stats.get('approved', stats.get('approvals', 'N/A'))} approved, "
-    f"{stats.get('declined', stats.get('declines', 'N/A'))} declined)"
+    f"Memory Loaded: {stats['total_cases']} cases "
+    f"({stats['approved']} approved, {stats['declined']} declined)"
 )
 
     # 3. Simulate New Application (Safe)
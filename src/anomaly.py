@@ -47,6 +47,52 @@ class AnomalyDetector:
         
         return []
 
+    def check_fraud_similarity_batch(self, input_vectors, threshold=0.15):
+        """
+        Batched check_fraud_similarity: one memory round-trip, threshold applied as an array op.
+        """
+        fraud_batch = self.memory.retrieve_fraud_cases_batch(input_vectors, k=1)
+
+        dists = np.array([fraud[0][1] if fraud else np.inf for fraud in fraud_batch], dtype=float)
+        hits = dists < threshold
+
+        results = []
+        for fraud, hit in zip(fraud_batch, hits):
+            if hit:
+                fraud_case, dist = fraud[0]
+                results.append([f"Matches Known Fraud Pattern (Case #{fraud_case.get('id', '?')}, Dist: {dist:.2f})"])
+            else:
+                results.append([])
+        return results
+
+    def detect_outliers_batch(self, input_vectors, neighbors_batch):
+        """
+        Batched detect_outliers over the nearest-neighbor distance of each query.
+        """
+        nearest = np.array([n[0][1] if n else -np.inf for n in neighbors_batch], dtype=float)
+        flagged = nearest > 0.35
+
+        return [
+            [f"High Dissimilarity (Nearest Dist: {neighbors[0][1]:.2f})"] if flag else []
+            for neighbors, flag in zip(neighbors_batch, flagged)
+        ]
+
+    def analyze_batch(self, profiles, input_vectors, neighbors_batch):
+        """
+        Same checks as analyze(), for a whole batch. Returns one anomaly list per profile.
+        """
+        outliers = self.detect_outliers_batch(input_vectors, neighbors_batch)
+        frauds = self.check_fraud_similarity_batch(input_vectors)
+
+        anomalies_batch = []
+        for profile, outlier, fraud in zip(profiles, outliers, frauds):
+            anomalies = []
+            anomalies.extend(self.check_hard_rules(profile))
+            anomalies.extend(outlier)
+            anomalies.extend(fraud)
+            anomalies_batch.append(anomalies)
+        return anomalies_batch
+
     def analyze(self, profile, input_vector, neighbors):
         anomalies = []
         anomalies.extend(self.check_hard_rules(profile))
@@ -8,11 +8,23 @@ sys.path.append(os.getcwd())
 
 from src.decision_engine import DecisionEngine
 
+# Case ids are integers, or UUID strings for histories that bring their own ids
+CASE_ID_PATTERN = re.compile(r'\d+|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', re.IGNORECASE | re.ASCII)
+
 class CreditChatbot:
+    # Seconds to wait for learned cases to reach the backend (it may be down)
+    FLUSH_TIMEOUT = 10.0
+
     def __init__(self):
         print("Initializing Logic Core...")
         self.engine = DecisionEngine()
         self.history_loaded = False
+
+        # A persistent memory (CREDITIQ_QDRANT_PATH / CREDITIQ_QDRANT_URL) may already hold the index
+        existing = self.engine.memory.get_stats()['total_cases']
+        if existing:
+            self.history_loaded = True
+            print(f"Reopened persistent memory with {existing} cases.")
         
         # Simple parsing patterns
         self.key_map = {
@@ -37,7 +49,9 @@ class CreditChatbot:
         print("Commands:")
         print(" - 'load': Load historical data to Qdrant")
         print(" - 'assess [details]': specific application (e.g., 'assess income=5000 credit=good')")
-        print(" - 'search [id]': look up details of a case")
+        print(" - 'search [id]': look up a case and its most similar precedents ('search 1 2 3' for several)")
+        print(" - 'snapshot [file]' / 'restore [file]': save or reopen a persistent memory index")
+        print(" - 'metrics': per-stage latencies, backend calls and cache hits")
         print(" - 'quit': exit")
         print("--------------------------------------------------")
 
@@ -60,8 +74,19 @@ class CreditChatbot:
         raw = text.lower()
         
         if raw == 'quit' or raw == 'exit':
+            if not self.engine.close(timeout=self.FLUSH_TIMEOUT):
+                print(f"⚠️ {self.unflushed_warning()} They are lost on exit.")
             sys.exit(0)
             
+        if raw.startswith('snapshot'):
+            return self.snapshot_memory(text)
+
+        if raw.startswith('restore'):
+            return self.restore_memory(text)
+
+        if raw.startswith('metrics') or raw.startswith('stats'):
+            return "\n".join(self.engine.metrics.summary_lines())
+
         if 'load' in raw:
             return self.load_data()
             
@@ -80,7 +105,41 @@ class CreditChatbot:
         self.engine.load_history("data/history.json")
         stats = self.engine.memory.get_stats()
         self.history_loaded = True
-        return f"✅ Knowledge Base Loaded. {stats['total_cases']} cases indexed in Qdrant."
+        return (f"✅ Knowledge Base Loaded. {stats['total_cases']} cases indexed in Qdrant "
+                f"({stats['approved']} approved, {stats['declined']} declined).")
+
+    def unflushed_warning(self):
+        buffer = self.engine.memory.write_buffer
+        error = f" (last error: {buffer.last_error})" if buffer.last_error else ""
+        return f"{buffer.depth()} learned cases could not be stored{error}."
+
+    def snapshot_memory(self, text):
+        parts = text.split(maxsplit=1)
+        destination = parts[1] if len(parts) > 1 else "data/memory_snapshot.tar.gz"
+        backend = self.engine.memory.backend
+        if not getattr(backend, 'is_persistent', False):
+            return "⚠️ Memory is in-process only. Set CREDITIQ_QDRANT_PATH or CREDITIQ_QDRANT_URL to enable snapshots."
+        if not self.engine.memory.flush(timeout=self.FLUSH_TIMEOUT):
+            return f"❌ {self.unflushed_warning()} Snapshot not taken."
+        snapshot = backend.snapshot(destination)
+        return f"✅ Snapshot written: {snapshot}"
+
+    def restore_memory(self, text):
+        parts = text.split(maxsplit=1)
+        source = parts[1] if len(parts) > 1 else "data/memory_snapshot.tar.gz"
+        backend = self.engine.memory.backend
+        if not getattr(backend, 'is_persistent', False):
+            return "⚠️ Memory is in-process only. Set CREDITIQ_QDRANT_PATH or CREDITIQ_QDRANT_URL to enable restore."
+        if not backend.url and not os.path.exists(source):
+            return f"❌ Snapshot not found: {source}"
+        if not self.engine.memory.flush(timeout=self.FLUSH_TIMEOUT):
+            return f"❌ {self.unflushed_warning()} Memory not restored."
+        backend.restore(source)
+        self.engine.memory.rebuild_fraud_index()
+        self.engine.memory.load_aggregates()
+        stats = self.engine.memory.get_stats()
+        self.history_loaded = stats['total_cases'] > 0
+        return f"✅ Memory restored. {stats['total_cases']} cases indexed."
 
     def assess_application(self, text):
         if not self.history_loaded:
@@ -112,12 +171,35 @@ class CreditChatbot:
         return "\n".join(output)
 
     def search_case(self, text):
-        # Implementation for looking up a case by ID isn't directly supported by my Memory class 
-        # (which is search-only). 
-        # But we can do a mock search or just say "Not implemented".
-        # Let's support vector search that finds "Cases like ID X" if we could...
-        # For now, just a placeholder.
-        return "Search by ID is not yet implemented in this prototype."
+        """
+        'search 42' (or 'find 42'): the case and its closest precedents, using its stored vector.
+        'search 42 43 44': several cases in one lookup.
+        """
+        # Other words ('find case 42') are not ids
+        tokens = [t for t in re.findall(r'[\w-]+', text)[1:] if CASE_ID_PATTERN.fullmatch(t)]
+        ids = [int(t) if t.isdigit() else t for t in tokens]
+        if not ids:
+            return "Usage: 'search [id]' (e.g. 'search 42'), or several ids for a batch lookup."
+
+        if len(ids) > 1:
+            output = []
+            for case_id, case in zip(ids, self.engine.memory.get_cases(ids)):
+                output.append(self._format_case(case) if case else f" - [ID {case_id}] not found")
+            return "\n".join(output)
+
+        found = self.engine.find_similar(ids[0], k=5)
+        if found is None:
+            return f"❌ No case with ID {ids[0]}."
+        output = [self._format_case(found['case']), "\nSimilar Cases:"]
+        for c in found['similar_cases']:
+            output.append(f" - [ID {c['id']}] {c['decision'].upper()} (Match: {int((1-c['distance'])*100)}%) - {c['match_reason']}")
+        return "\n".join(output)
+
+    def _format_case(self, case):
+        profile = ", ".join(f"{k}={v}" for k, v in case.get('profile', {}).items())
+        labels = f" labels={','.join(case['labels'])}" if case.get('labels') else ""
+        return (f" - [ID {case.get('id')}] {str(case.get('decision')).upper()} "
+                f"(outcome: {case.get('outcome') or 'unknown'}){labels}\n   {profile}")
 
     def _parse_profile(self, text):
         """
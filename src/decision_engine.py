@@ -1,51 +1,133 @@
 from src.similarity import SimilarityEngine
 from src.memory import DecisionMemory
 from src.anomaly import AnomalyDetector
+from src.metrics import Metrics
 import numpy as np
 
 class DecisionEngine:
-    def __init__(self):
-        self.memory = DecisionMemory()
+    def __init__(self, memory_backend=None, metrics=None):
+        # Per-stage latencies, backend call counts and cache hits (see metrics.snapshot())
+        self.metrics = metrics or Metrics()
         self.similarity = SimilarityEngine()
+        self.memory = DecisionMemory(similarity_engine=self.similarity, backend=memory_backend, metrics=self.metrics)
         self.anomaly_detector = AnomalyDetector(self.memory)
+        self.metrics.add_collector('vector_cache', self.similarity.cache.stats)
+        self.metrics.add_collector('evaluate', self._call_stats)
+        if self.memory.write_buffer is not None:
+            self.metrics.add_collector('write_buffer', self.memory.write_buffer.stats)
 
     def load_history(self, filepath):
-        self.memory.load_from_file(filepath)
+        return self.memory.load_from_file(filepath)
 
     def evaluate_application(self, application_profile):
         """
         Full pipeline: Profile -> Vector -> Anomaly Check -> Memory Retrieval -> Recommendation
         """
-        # 1. Vectorize
-        vector = self.similarity.vectorize(application_profile)
+        metrics = self.metrics
+        # Counted on this thread only: write-behind flushes running meanwhile are not ours
+        calls_before = self.memory.thread_backend_calls()
+        with metrics.timer('evaluate'):
+            # 1. Vectorize
+            with metrics.timer('vectorize'):
+                vector = self.similarity.vectorize(application_profile)
 
-        # 2. Retrieve Similar Cases
-        neighbors = self.memory.retrieve_neighbors(vector, k=5)
+            # 2. Retrieve Similar Cases
+            with metrics.timer('neighbor_search'):
+                neighbors = self.memory.retrieve_neighbors(vector, k=5)
 
-        # 3. Detect Anomalies
-        anomalies = self.anomaly_detector.analyze(application_profile, vector, neighbors)
+            # 3. Detect Anomalies (includes the fraud search)
+            with metrics.timer('anomaly'):
+                anomalies = self.anomaly_detector.analyze(application_profile, vector, neighbors)
 
-        # 4. Formulate Recommendation based on Neighbors
-        
-        relevant_neighbors = neighbors
-        
-        approval_score = 0
-        if relevant_neighbors:
-            # Weighted vote by distance (inverse distance)
-            total_weight = 0
-            weighted_approve = 0
-            
-            for case, dist in relevant_neighbors:
-                # Dist is 1 - CosineSim.
-                # If dist is 0 (identical), weight is high.
-                weight = 1.0 / (dist + 0.05) 
-                total_weight += weight
-                if case['decision'] == 'approve':
-                    weighted_approve += weight
-            
-            if total_weight > 0:
-                approval_score = weighted_approve / total_weight
-        
+            # 4. Formulate Recommendation based on Neighbors
+            with metrics.timer('vote'):
+                approval_score = self._approval_scores([neighbors])[0]
+
+            # 5. Decision Logic + Explainability
+            with metrics.timer('explain'):
+                result = self._build_result(application_profile, neighbors, anomalies, approval_score)
+
+        metrics.inc('evaluations')
+        metrics.inc('evaluate_backend_calls', self.memory.thread_backend_calls() - calls_before)
+        return result
+
+    def evaluate_batch(self, application_profiles, k=5):
+        """
+        Batched pipeline for bulk scoring: one vectorization pass, one batched neighbor search,
+        one batched fraud search, and array-based voting. Accepts a list of profile dicts or a DataFrame.
+        Returns one result dict per profile, identical to evaluate_application.
+        """
+        if hasattr(application_profiles, 'to_dict'):
+            # A DataFrame holds NaN (or None) where a row lacks a field: leave those out,
+            # so the row scores like the same profile passed as a dict
+            application_profiles = [
+                {field: value for field, value in row.items()
+                 if value is not None and not (isinstance(value, float) and np.isnan(value))}
+                for row in application_profiles.to_dict('records')
+            ]
+        profiles = list(application_profiles)
+        if not profiles:
+            return []
+
+        metrics = self.metrics
+        with metrics.timer('batch.evaluate'):
+            # 1. Vectorize (one matrix)
+            with metrics.timer('batch.vectorize'):
+                vectors = self.similarity.vectorize_many(profiles)
+
+            # 2. Retrieve Similar Cases (single batched query)
+            with metrics.timer('batch.neighbor_search'):
+                neighbors_batch = self.memory.retrieve_neighbors_batch(vectors, k=k)
+
+            # 3. Detect Anomalies
+            with metrics.timer('batch.anomaly'):
+                anomalies_batch = self.anomaly_detector.analyze_batch(profiles, vectors, neighbors_batch)
+
+            # 4. Weighted votes for the whole batch
+            with metrics.timer('batch.vote'):
+                approval_scores = self._approval_scores(neighbors_batch)
+
+            with metrics.timer('batch.explain'):
+                results = [
+                    self._build_result(profile, neighbors, anomalies, approval_score)
+                    for profile, neighbors, anomalies, approval_score
+                    in zip(profiles, neighbors_batch, anomalies_batch, approval_scores)
+                ]
+
+        metrics.inc('batch_evaluations', len(profiles))
+        return results
+
+    def _call_stats(self):
+        evaluations = self.metrics.counter('evaluations')
+        return {
+            'backend_calls_per_evaluation':
+                self.metrics.counter('evaluate_backend_calls') / evaluations if evaluations else 0.0,
+        }
+
+    def _approval_scores(self, neighbors_batch):
+        """
+        Inverse-distance weighted share of 'approve' neighbors, one score per neighbor list.
+        Shorter lists are padded with infinite distance (zero weight).
+        """
+        width = max((len(n) for n in neighbors_batch), default=0)
+        dists = np.full((len(neighbors_batch), width), np.inf)
+        approved = np.zeros((len(neighbors_batch), width), dtype=bool)
+        for i, neighbors in enumerate(neighbors_batch):
+            for j, (case, dist) in enumerate(neighbors):
+                dists[i, j] = dist
+                approved[i, j] = case['decision'] == 'approve'
+
+        # Dist is 1 - CosineSim.
+        # If dist is 0 (identical), weight is high.
+        weights = 1.0 / (dists + 0.05)
+        total_weight = weights.sum(axis=1)
+        weighted_approve = np.where(approved, weights, 0.0).sum(axis=1)
+
+        scores = np.zeros(len(neighbors_batch))
+        np.divide(weighted_approve, total_weight, out=scores, where=total_weight > 0)
+        return scores
+
+    def _build_result(self, application_profile, neighbors, anomalies, approval_score):
         # Decision Logic
         recommendation = "REVIEW"
         confidence = 0.0
@@ -63,25 +145,39 @@ class DecisionEngine:
             recommendation = "MANUAL_REVIEW"
             confidence = 0.5
 
-        # 5. Explainability
+        # Explainability
         explanation = self._generate_explanation(recommendation, neighbors, anomalies)
 
         return {
             "recommendation": recommendation,
-            "confidence": round(confidence, 2),
+            "confidence": round(float(confidence), 2),
             "anomalies": anomalies,
             "explanation": explanation,
-            "similar_cases": [
-                {
-                    "id": casing.get('id', 'Unknown'),
-                    "decision": casing.get('decision', 'Unknown'),
-                    "distance": round(dist, 3),
-                    "match_reason": self._explain_similarity(application_profile, casing.get('profile', {}))
-                 } 
-                for casing, dist in neighbors
-            ]
+            "similar_cases": self._format_neighbors(application_profile, neighbors)
         }
 
+    def _format_neighbors(self, application_profile, neighbors):
+        return [
+            {
+                "id": casing.get('id', 'Unknown'),
+                "decision": casing.get('decision', 'Unknown'),
+                "distance": round(dist, 3),
+                "match_reason": self._explain_similarity(application_profile, casing.get('profile', {}))
+             } 
+            for casing, dist in neighbors
+        ]
+
+    def find_similar(self, case_id, k=5):
+        """
+        "More like case X": the stored case and its k closest precedents, or None for an unknown id.
+        Uses the vector stored with the case (no re-vectorization, no extra search to fetch it).
+        """
+        found = self.memory.retrieve_similar_to_case(case_id, k=k)
+        if found is None:
+            return None
+        case, neighbors = found
+        return {'case': case, 'similar_cases': self._format_neighbors(case.get('profile', {}), neighbors)}
+
     def _explain_similarity(self, profile_a, profile_b):
         """Simple text diff of key drivers."""
         reasons = []
@@ -105,16 +201,25 @@ class DecisionEngine:
         
         return f"Based on {total} similar past cases ({approve_count} approved). Most similar case was {neighbors[0][0].get('decision')}."
 
-    def learn(self, application_profile, final_decision, actual_outcome=None):
+    def learn(self, application_profile, final_decision, actual_outcome=None, labels=None):
         """
-        Adds the completed case to memory.
+        Adds the completed case to memory and returns its id.
+        labels=['fraud'] also registers it as a known fraud pattern.
+        The upsert is deferred to the write-behind buffer (batched in the background);
+        evaluations see the case immediately all the same. close() flushes it.
+        Raises TypeError unless labels is a list of strings (a bare 'fraud' would be split into letters).
         """
+        labels = [] if labels is None else labels
+        if isinstance(labels, str) or not all(isinstance(label, str) for label in labels):
+            raise TypeError(f"labels must be a list of strings, got {labels!r}")
         case = {
             'profile': application_profile,
             'decision': final_decision,
             'outcome': actual_outcome, 
-            'labels': []
+            'labels': list(labels)
         }
-        # In Qdrant version, valid ID is preferred.
-        # We'll rely on UUID generation in Manager if not provided.
-        self.memory.add_case(case)
+        return self.memory.add_case(case, defer=True)
+
+    def close(self, timeout=None):
+        """Flushes learned cases still waiting in the write-behind buffer."""
+        return self.memory.close(timeout)
@@ -0,0 +1,106 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+import numpy as np
+
+# Anchored at the repo root so every entry point (whatever its cwd) shares the same file
+DEFAULT_CACHE_PATH = os.environ.get(
+    'CREDITIQ_EMBEDDING_CACHE',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'embeddings.sqlite')
+)
+
+def normalize_text(text):
+    """Unicode NFC + collapsed whitespace, so trivially different dossiers share an entry."""
+    return " ".join(unicodedata.normalize('NFC', text).split())
+
+class EmbeddingCache:
+    """
+    Persistent, size-bounded description -> embedding cache (SQLite on local disk).
+    Keyed by model name + normalized text; least-recently-used entries are evicted
+    once max_entries is exceeded. Safe to share between threads (Streamlit sessions).
+    """
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=50000):
+        self.path = path
+        self.max_entries = max_entries
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY, model TEXT, dtype TEXT, vector BLOB, last_used REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+            self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _key(self, model_name, text):
+        return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode('utf-8')).hexdigest()
+
+    def get(self, model_name, text):
+        key = self._key(model_name, text)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT dtype, vector FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+        return np.frombuffer(row[1], dtype=row[0])
+
+    def put(self, model_name, text, vector):
+        vector = np.asarray(vector)
+        key = self._key(model_name, text)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, model, dtype, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, model_name, vector.dtype.str, vector.tobytes(), time.time())
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN"
+                " (SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)", (excess,)
+            )
+            self.evictions += excess
+
+    def encode(self, model, text, model_name):
+        """Returns the cached embedding for text, or runs model.encode once and caches it."""
+        vector = self.get(model_name, text)
+        if vector is None:
+            vector = np.asarray(model.encode(text))
+            self.put(model_name, text, vector)
+        return vector
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,128 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+
+class Histogram:
+    """Counts of observed values in power-of-two buckets (1, 2, 4, 8, ...)."""
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+
+    def observe(self, value):
+        bucket = 1
+        while bucket < value:
+            bucket *= 2
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+
+    def snapshot(self):
+        return {
+            'buckets': {f"<={b}": n for b, n in sorted(self.buckets.items())},
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+        }
+
+class EncodeScheduler:
+    """
+    Shares one SentenceTransformer between threads (e.g. Streamlit sessions).
+    Pending texts are queued and encoded together in one model.encode call, flushed
+    max_wait_ms after the first text arrived or as soon as max_batch texts are waiting.
+    Each caller gets a Future. Exposes encode(text) so it drops in wherever a model does
+    (EmbeddingCache.encode included).
+    """
+    def __init__(self, model, max_batch=32, max_wait_ms=10.0, max_queue=1024):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        # put() blocks once max_queue texts are pending: callers slow down instead of piling up
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self.batch_sizes = Histogram()
+        self.queue_depths = Histogram()
+        self.batches = 0
+        self.texts = 0
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="encode-scheduler", daemon=True)
+        self._worker.start()
+
+    def submit(self, text):
+        """Queues one text; the Future resolves to its float32 embedding."""
+        if self._closed:
+            raise RuntimeError("EncodeScheduler is closed")
+        future = Future()
+        self._queue.put((text, future))
+        with self._lock:
+            self.queue_depths.observe(self._queue.qsize())
+        return future
+
+    def encode(self, texts, timeout=None):
+        """Blocking helper: one text -> (dim,), a list of texts -> (N, dim)."""
+        if isinstance(texts, str):
+            return self.submit(texts).result(timeout)
+        futures = [self.submit(t) for t in texts]
+        return np.stack([f.result(timeout) for f in futures])
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Close requested: finish this batch, then stop
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            batch = [(t, f) for t, f in batch if f.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            texts = [t for t, _ in batch]
+            try:
+                vectors = np.asarray(self.model.encode(texts, batch_size=len(texts)), dtype=np.float32)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            with self._lock:
+                self.batches += 1
+                self.texts += len(texts)
+                self.batch_sizes.observe(len(texts))
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': self._queue.qsize(),
+                'batches': self.batches,
+                'texts': self.texts,
+                'avg_batch_size': self.texts / self.batches if self.batches else 0.0,
+                'batch_size_histogram': self.batch_sizes.snapshot(),
+                'queue_depth_histogram': self.queue_depths.snapshot(),
+            }
+
+    def close(self, timeout=None):
+        """Encodes what is already queued, then stops the worker thread."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._worker.join(timeout)
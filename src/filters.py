@@ -0,0 +1,75 @@
+from qdrant_client.models import Filter, FieldCondition, MatchValue, MatchAny, Range, HasIdCondition
+
+class CaseFilter:
+    """
+    Small declarative filter over stored cases.
+    All given conditions must hold (AND):
+      - labels_any: case has at least one of these labels (e.g. ['fraud'])
+      - decision: case decision equals this value
+      - ranges: {profile_field: (min, max)}, either bound may be None
+      - ids: case id is in this set
+      - exclude_ids: case id is not in this set
+    Compiles to a Qdrant Filter with to_qdrant(), and can be evaluated in Python with matches().
+    """
+    def __init__(self, labels_any=None, decision=None, ranges=None, ids=None, exclude_ids=None):
+        if isinstance(labels_any, str):
+            labels_any = [labels_any]
+        self.labels_any = list(labels_any) if labels_any else None
+        self.decision = decision
+        self.ranges = dict(ranges) if ranges else {}
+        self.ids = list(ids) if ids is not None else None
+        self._id_set = set(self.ids) if ids is not None else None
+        self.exclude_ids = set(exclude_ids) if exclude_ids else set()
+
+    @classmethod
+    def label(cls, label):
+        return cls(labels_any=[label])
+
+    def excluding(self, case_ids):
+        """A copy of this filter that also leaves out case_ids."""
+        return CaseFilter(self.labels_any, self.decision, self.ranges, self.ids, self.exclude_ids | set(case_ids))
+
+    def to_qdrant(self):
+        must = []
+        if self.labels_any:
+            # Matching on an array payload field is true if any element matches
+            must.append(FieldCondition(key='labels', match=MatchAny(any=self.labels_any)))
+        if self.decision is not None:
+            must.append(FieldCondition(key='decision', match=MatchValue(value=self.decision)))
+        for field, (low, high) in self.ranges.items():
+            must.append(FieldCondition(key=f'profile.{field}', range=Range(gte=low, lte=high)))
+        if self.ids is not None:
+            must.append(HasIdCondition(has_id=self.ids))
+        # Qdrant point ids are the integer case ids (other ids get a random UUID point id,
+        # so they can only be left out by matches())
+        must_not = []
+        excluded = sorted(i for i in self.exclude_ids if isinstance(i, int))
+        if excluded:
+            must_not.append(HasIdCondition(has_id=excluded))
+        return Filter(must=must, must_not=must_not) if must or must_not else None
+
+    def matches(self, case):
+        if self.labels_any and not set(self.labels_any) & set(case.get('labels') or []):
+            return False
+        if self.decision is not None and case.get('decision') != self.decision:
+            return False
+        profile = case.get('profile', {})
+        for field, (low, high) in self.ranges.items():
+            value = profile.get(field)
+            if value is None:
+                return False
+            if low is not None and value < low:
+                return False
+            if high is not None and value > high:
+                return False
+        if self._id_set is not None and case.get('id') not in self._id_set:
+            return False
+        if case.get('id') in self.exclude_ids:
+            return False
+        return True
+
+    def __repr__(self):
+        return (f"CaseFilter(labels_any={self.labels_any}, decision={self.decision!r}, "
+                f"ranges={self.ranges}, ids={self.ids}, exclude_ids={sorted(self.exclude_ids, key=str)})")
+
+FRAUD_FILTER = CaseFilter.label('fraud')
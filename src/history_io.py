@@ -0,0 +1,156 @@
+import json
+
+class HistoryReader:
+    """
+    Streams history records from disk without loading the whole file.
+    Supports a JSON array (history.json) or JSON Lines (one case per line).
+    """
+    def __init__(self, filepath, read_size=1 << 16):
+        self.filepath = filepath
+        self.read_size = read_size
+        self.decoder = json.JSONDecoder()
+
+    def __iter__(self):
+        with open(self.filepath, 'r') as f:
+            head = self._skip_ws(f)
+            if head == '[':
+                yield from self._iter_array(f)
+            elif head:
+                # JSON Lines: put back the first char we consumed
+                first = head + f.readline()
+                if first.strip():
+                    yield json.loads(first)
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+
+    def iter_chunks(self, chunk_size):
+        """Yields lists of at most chunk_size records."""
+        chunk = []
+        for record in self:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _skip_ws(self, f):
+        while True:
+            c = f.read(1)
+            if not c or not c.isspace():
+                return c
+
+    def _iter_array(self, f):
+        # Incremental decoding of "[ {...}, {...} ]" with a bounded read buffer.
+        buf = ''
+        eof = False
+        while True:
+            buf = buf.lstrip(' \t\r\n,')
+            if buf.startswith(']'):
+                return
+            if buf:
+                try:
+                    record, end = self.decoder.raw_decode(buf)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    # A complete value must be followed by ',' or ']' (or more data we haven't read yet)
+                    if end < len(buf) or eof:
+                        yield record
+                        buf = buf[end:]
+                        continue
+            if eof:
+                if buf.strip():
+                    raise json.JSONDecodeError("Unterminated JSON array", buf, 0)
+                return
+            data = f.read(self.read_size)
+            if not data:
+                eof = True
+            buf += data
+
+# Columnar history (Parquet): typed profile columns, dictionary-encoded categoricals.
+# Profile fields are float64 (amounts may be fractional), null where the case has no value.
+# pyarrow is only imported when a columnar file is actually used.
+PROFILE_NUMERIC_COLUMNS = ('income', 'expenses', 'employment_length', 'loan_amount', 'loan_term')
+CATEGORICAL_COLUMNS = ('credit_history', 'decision', 'outcome')
+
+def history_schema():
+    import pyarrow as pa
+    category = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema(
+        [('id', pa.int64())]
+        + [(f, pa.float64()) for f in PROFILE_NUMERIC_COLUMNS]
+        + [(f, category) for f in CATEGORICAL_COLUMNS]
+        # Nested dictionary columns can't be read back across row groups; Parquet still
+        # dictionary-encodes the label strings on disk.
+        + [('labels', pa.list_(pa.string()))]
+    )
+
+def convert_to_parquet(src, dst, batch_size=65536):
+    """
+    Converts a JSON / JSON Lines history into the columnar layout, one row group per batch.
+    Returns the number of cases written. Cases without an id get their row number.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = history_schema()
+    written = 0
+    with pq.ParquetWriter(dst, schema) as writer:
+        for chunk in HistoryReader(src).iter_chunks(batch_size):
+            profiles = [case.get('profile', {}) for case in chunk]
+            data = {'id': [case.get('id', written + i) for i, case in enumerate(chunk)]}
+            for field in PROFILE_NUMERIC_COLUMNS:
+                data[field] = [p.get(field) for p in profiles]
+            data['credit_history'] = [p.get('credit_history') for p in profiles]
+            data['decision'] = [case.get('decision') for case in chunk]
+            data['outcome'] = [case.get('outcome') for case in chunk]
+            data['labels'] = [case.get('labels') or [] for case in chunk]
+            writer.write_table(pa.Table.from_pydict(data, schema=schema))
+            written += len(chunk)
+    return written
+
+class ColumnarHistoryReader:
+    """
+    Streams a Parquet history as column batches: {column: NumPy array}, labels as a list of lists.
+    Profile columns can go straight into SimilarityEngine.vectorize_many.
+    """
+    def __init__(self, filepath):
+        self.filepath = filepath
+
+    def __len__(self):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(self.filepath).metadata.num_rows
+
+    def iter_batches(self, batch_size=65536):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(self.filepath).iter_batches(batch_size=batch_size):
+            yield {name: self._to_numpy(batch.column(name)) if name != 'labels' else batch.column(name).to_pylist()
+                   for name in batch.schema.names}
+
+    def _to_numpy(self, column):
+        if hasattr(column, 'dictionary'):
+            # Decode through the (tiny) dictionary: one lookup array instead of a string per row
+            values = column.dictionary.to_numpy(zero_copy_only=False)
+            decoded = values[column.indices.fill_null(0).to_numpy()]
+            if column.null_count:
+                decoded = decoded.astype(object)
+                decoded[column.is_null().to_numpy(zero_copy_only=False)] = None
+            return decoded
+        return column.to_numpy(zero_copy_only=False)
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Converts a JSON / JSON Lines history to the columnar (Parquet) layout.")
+    parser.add_argument('source', nargs='?', default='data/history.json')
+    parser.add_argument('destination', nargs='?', default='data/history.parquet')
+    parser.add_argument('--batch-size', type=int, default=65536, help="Cases per row group")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = convert_to_parquet(args.source, args.destination, args.batch_size)
+    print(f"Converted {count} cases to {args.destination} ({time.perf_counter() - start:.1f}s)")
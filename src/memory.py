@@ -1,16 +1,174 @@
 import numpy as np
-import json
+import os
+import threading
+import time
+import uuid
 from src.similarity import SimilarityEngine
 from src.qdrant_manager import QdrantManager
+from src.numpy_backend import NumpyMemoryBackend
+from src.history_io import HistoryReader, ColumnarHistoryReader, PROFILE_NUMERIC_COLUMNS
+from src.filters import CaseFilter, FRAUD_FILTER
+from src.metrics import Metrics
+from src.memory_stats import MemoryAggregates
+from src.write_buffer import WriteBehindBuffer
+
+# Memory backends selectable by name (DecisionMemory(backend=...) or $CREDITIQ_MEMORY_BACKEND).
+# Both expose add_case, add_batch, search, search_batch, get_count, has_case, retrieve, scroll
+# and get_metadata/update_metadata.
+BACKENDS = {
+    'qdrant': QdrantManager,
+    'numpy': NumpyMemoryBackend,
+}
+
+def create_backend(backend=None):
+    """Returns a backend instance from a name, an instance, or the environment default."""
+    if backend is None:
+        backend = os.environ.get('CREDITIQ_MEMORY_BACKEND', 'qdrant')
+    if isinstance(backend, str):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown memory backend '{backend}'. Choose from {sorted(BACKENDS)}")
+        return BACKENDS[backend]()
+    return backend
+
+def new_case_id():
+    """Random 63-bit integer id: a valid Qdrant point id that stays usable for point lookups."""
+    return uuid.uuid4().int >> 65
+
+def _payload_values(values):
+    """
+    Column -> payload values as a JSON load gives them: whole floats back to int, NaN to None
+    (float64 profile columns hold both ints and fractional amounts).
+    """
+    if values.dtype.kind != 'f':
+        return values.tolist()
+    missing = np.isnan(values)
+    whole = ~missing & (values == np.trunc(values))
+    if whole.all():
+        return values.astype(np.int64).tolist()
+    out = values.tolist()
+    for i in np.flatnonzero(whole).tolist():
+        out[i] = int(out[i])
+    for i in np.flatnonzero(missing).tolist():
+        out[i] = None
+    return out
 
 class DecisionMemory:
-    def __init__(self):
-        self.qdrant = QdrantManager()
-        self.similarity_engine = SimilarityEngine()
+    def __init__(self, similarity_engine=None, backend=None, metrics=None, write_behind=None):
+        self.backend = create_backend(backend)
+        # A backend created here from a name is ours to close; an instance belongs to the caller
+        self._owns_backend = backend is None or isinstance(backend, str)
+        # Serializes backend access between callers and the write-behind thread
+        # (the local Qdrant client is not thread-safe)
+        self._backend_lock = threading.RLock()
+        # Per-thread round-trip count, so a caller can attribute calls to its own work
+        self._calls = threading.local()
+        # Share the engine (and its vector cache) with the caller when given
+        self.similarity_engine = similarity_engine or SimilarityEngine()
+        # Counts backend round-trips (Qdrant calls) and times the fraud search
+        self.metrics = metrics or Metrics()
+        # Known fraud cases (a few % of history) also live in a small exact in-process index,
+        # so the fraud proximity check never searches the full memory.
+        self.fraud_index = NumpyMemoryBackend(vector_size=self.backend.vector_size, initial_capacity=64)
+        self.rebuild_fraud_index()
+        # Decision/outcome/label counts and profile histograms, kept current on every upsert.
+        # Persisted once per batch or buffer flush; single synchronous writes only mark them dirty
+        # until the next flush()/close() (a count that no longer matches is rebuilt at startup).
+        self._aggregates_dirty = False
+        self.aggregates = MemoryAggregates()
+        self.load_aggregates()
+        # Deferred writes (learn): batched upserts, searchable right away through an overlay.
+        # write_behind=False (or CREDITIQ_WRITE_BEHIND=0) stores every case synchronously.
+        if write_behind is None:
+            write_behind = os.environ.get('CREDITIQ_WRITE_BEHIND', '1') != '0'
+        self.write_buffer = WriteBehindBuffer(self._store, self.backend.vector_size) if write_behind else None
+
+    def _backend_call(self):
+        self.metrics.inc('backend_calls')
+        self._calls.count = getattr(self._calls, 'count', 0) + 1
+
+    def thread_backend_calls(self):
+        """Backend round-trips made so far by the calling thread (write-behind flushes excluded)."""
+        return getattr(self._calls, 'count', 0)
+
+    def rebuild_fraud_index(self):
+        """Reloads the fraud sub-index from the backend (startup on a persistent store, after a restore)."""
+        self.fraud_index = NumpyMemoryBackend(vector_size=self.backend.vector_size, initial_capacity=64)
+        if not self.backend.get_count():
+            return
+        for page in self.backend.scroll(with_vectors=True, filter_conditions=FRAUD_FILTER):
+            self.fraud_index.add_batch([case_id for case_id, _, _ in page],
+                                       np.stack([vector for _, _, vector in page]),
+                                       [payload for _, payload, _ in page])
+
+    def load_aggregates(self):
+        """
+        Reads the aggregates persisted with the backend (startup, after a restore).
+        Rebuilt with one scroll when they are missing or no longer match the case count.
+        """
+        persisted = self.backend.get_metadata().get('aggregates') if self._persistent else None
+        aggregates = MemoryAggregates.from_dict(persisted)
+        if aggregates is None or aggregates.total != self.backend.get_count():
+            self.rebuild_aggregates()
+        else:
+            self.aggregates = aggregates
+
+    def rebuild_aggregates(self):
+        """Recounts everything from a single payload scroll."""
+        aggregates = MemoryAggregates()
+        if self.backend.get_count():
+            for page in self.backend.scroll():
+                aggregates.add([payload for _, payload, _ in page])
+        self.aggregates = aggregates
+        self._save_aggregates()
+
+    @property
+    def _persistent(self):
+        return getattr(self.backend, 'is_persistent', False)
+
+    def _save_aggregates(self):
+        self._aggregates_dirty = False
+        if self._persistent:
+            with self._backend_lock:
+                self.backend.update_metadata({'aggregates': self.aggregates.to_dict()})
+
+    def _store(self, case_ids, vectors, payloads, new_ids=(), check_existing=True, persist=True):
+        """
+        Upserts into the backend, mirrors fraud cases into the fraud sub-index and updates the aggregates.
+        Ids in new_ids (just created by new_case_id()) are not looked up for a payload to replace;
+        check_existing=False skips the lookup for all of them. persist=False leaves saving the
+        aggregates to a later flush().
+        """
+        with self._backend_lock:
+            lookup = [case_id for case_id in case_ids if case_id not in new_ids] if check_existing else []
+            replaced = list(self.backend.retrieve(lookup).values()) if lookup else []
+            self._backend_call()
+            self.backend.add_batch(case_ids, vectors, payloads)
+
+        if len(set(case_ids)) < len(case_ids):
+            # Repeated ids within one upsert: the last one wins, count only that one
+            last = {case_id: i for i, case_id in enumerate(case_ids)}
+            counted = [payloads[i] for i in sorted(last.values())]
+        else:
+            counted = payloads
+        self.aggregates.add([payload for payload, _ in replaced], sign=-1)
+        self.aggregates.add(counted)
+        self._aggregates_dirty = True
+        if persist:
+            self._save_aggregates()
 
-    def add_case(self, case_data):
+        # A case already in the sub-index is updated too, so a cleared label stops matching
+        rows = [
+            i for i, (case_id, payload) in enumerate(zip(case_ids, payloads))
+            if FRAUD_FILTER.matches(payload) or self.fraud_index.has_case(case_id)
+        ]
+        if rows:
+            self.fraud_index.add_batch([case_ids[i] for i in rows], np.asarray(vectors)[rows],
+                                       [payloads[i] for i in rows])
+
+    def add_case(self, case_data, defer=False):
         """
-        Adds a case to memory (Qdrant).
+        Adds a case to memory (via the backend) and returns its id.
+        defer=True hands it to the write-behind buffer: searchable at once, upserted with the next batch.
         """
         # Vectorize if needed
         if 'vector' not in case_data:
@@ -23,41 +181,96 @@ class DecisionMemory:
         if 'vector' in payload:
             del payload['vector']
             
-        # Ensure ID
-        if 'id' not in payload:
-            # We need an ID for Qdrant.
-            # In a real system we'd generate one. Here we assume one might exist or we auto-gen in manager.
-            # But the manager wants an ID passed in or it creates UUID.
-            # Let's check logic: case_data usually has 'id'.
-            pass
-
-        # We pass case_id if present, else None (Manager generates UUID)
+        # Cases without an id get a fresh integer one (kept in the payload, so it can be looked up)
         case_id = payload.get('id', None)
-        if case_id is None:
-             # Just use a random int for now if missing, or let manager handle?
-             # Manager handles if we pass str(uuid). Let's let manager handle if needed,
-             # but we usually generate integer IDs in this proto.
-             pass
+        new = case_id is None
+        if new:
+            case_id = payload['id'] = new_case_id()
+        vector = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+        if defer and self.write_buffer is not None:
+            # Fraud cases join the sub-index now, so the fraud check sees them before the flush
+            if FRAUD_FILTER.matches(payload) or self.fraud_index.has_case(case_id):
+                self.fraud_index.add_batch([case_id], vector, [payload])
+            self.write_buffer.put(case_id, vector[0], payload, new=new)
+        else:
+            self._store([case_id], vector, [payload], new_ids={case_id} if new else (), persist=False)
+        return case_id
+
+    def flush(self, timeout=None):
+        """
+        Writes every deferred case to the backend, and the aggregates with them
+        (before a snapshot, a restore or shutdown).
+        """
+        done = self.write_buffer.flush(timeout) if self.write_buffer is not None else True
+        if self._aggregates_dirty:
+            self._save_aggregates()
+        return done
 
-        self.qdrant.add_case(case_id if case_id is not None else -1, vector, payload)
+    def close(self, timeout=None):
+        """Flushes and stops deferred writes, then closes the backend if it was created here."""
+        done = self.write_buffer.close(timeout) if self.write_buffer is not None else True
+        if self._aggregates_dirty:
+            self._save_aggregates()
+        if done and self._owns_backend and hasattr(self.backend, 'close'):
+            self.backend.close()
+        return done
 
-    def retrieve_neighbors(self, input_vector, k=5, filter_func=None):
+    def _pending_hits(self, input_vectors, k, case_filter):
         """
-        Finds k nearest neighbors using Qdrant.
+        (top-k among the deferred cases not stored yet, their ids), or None. Searched before
+        the backend: a case flushed in between is then left out of the backend search but
+        still found here, never missed.
         """
-        # Note: filter_func is hard to translate to Qdrant filters dynamically without
-        # complex logic. For this prototype, we'll retrieve slightly more (k*2) and filter in python
-        # OR just ignore filter_func if it's complex.
-        # The only filter used so far was 'fraud' check.
-        
-        # If filter_func is specifically checking for 'fraud' label, we can try to optimize,
-        # but for now let's keep it simple: 
-        # Retrieve, then post-filter? 
-        # Qdrant is fast. We can support basic filtering if needed. 
-        # But 'fraud' case retrieval was: filter_func=lambda c: 'fraud' in c.get('labels', [])
-        
-        # Let's try to pass a simpler hint or just use standard search.
-        results = self.qdrant.search(input_vector, k=k)
+        if self.write_buffer is None:
+            return None
+        return self.write_buffer.search_batch(input_vectors, k=k, filter_conditions=case_filter)
+
+    def _backend_filter(self, case_filter, pending):
+        """case_filter, also leaving out every pending id: the backend copies of those are stale."""
+        if pending is None:
+            return case_filter
+        _, pending_ids = pending
+        if case_filter is None:
+            return CaseFilter(exclude_ids=pending_ids)
+        if hasattr(case_filter, 'excluding'):
+            return case_filter.excluding(pending_ids)
+        return case_filter  # a raw backend filter: _merge_pending still drops them
+
+    def _merge_pending(self, results_batch, pending, k):
+        """
+        Merges pending hits into backend top-k lists. A pending id wins over its backend copy
+        even when its new vector no longer ranks it in the top k.
+        """
+        if pending is None:
+            return results_batch
+        pending_batch, pending_ids = pending
+        merged_batch = []
+        for results, hits in zip(results_batch, pending_batch):
+            # Hits from the newest overlay come first, so the newest copy of an id wins
+            seen, merged = set(), []
+            for payload, score in hits:
+                case_id = payload.get('id')
+                if case_id is not None and case_id in seen:
+                    continue
+                seen.add(case_id)
+                merged.append((payload, score))
+            merged.extend(hit for hit in results if hit[0].get('id') not in pending_ids)
+            merged.sort(key=lambda hit: -hit[1])
+            merged_batch.append(merged[:k])
+        return merged_batch
+
+    def retrieve_neighbors(self, input_vector, k=5, filter_func=None, case_filter=None):
+        """
+        Finds k nearest neighbors using the memory backend.
+        case_filter (a CaseFilter) is pushed down into the backend search, so the k results
+        all satisfy it. filter_func is a legacy Python post-filter applied to those k results.
+        """
+        pending = self._pending_hits(np.asarray(input_vector).reshape(1, -1), k, case_filter)
+        self._backend_call()
+        with self._backend_lock:
+            results = self.backend.search(input_vector, k=k,
+                                          filter_conditions=self._backend_filter(case_filter, pending))
+        results = self._merge_pending([results], pending, k)[0]
         
         # Convert back to expected format: (case_dict, distance/score)
         # Qdrant returns (payload, score). Score is Cosine Similarity (-1 to 1).
@@ -69,6 +282,23 @@ class DecisionMemory:
         # We need to return a "distance-like" metric for the DecisionEngine which expects lower=closer.
         # Or update DecisionEngine to handle high score = good.
         
+        return self._to_neighbors(results, k, filter_func)
+
+    def retrieve_neighbors_batch(self, input_vectors, k=5, filter_func=None, case_filter=None):
+        """
+        Batched counterpart of retrieve_neighbors: one backend round-trip for all query vectors.
+        Returns one neighbor list per input vector.
+        """
+        pending = self._pending_hits(input_vectors, k, case_filter)
+        self._backend_call()
+        with self._backend_lock:
+            results_batch = self.backend.search_batch(input_vectors, k=k,
+                                                      filter_conditions=self._backend_filter(case_filter, pending))
+        results_batch = self._merge_pending(results_batch, pending, k)
+        return [self._to_neighbors(results, k, filter_func) for results in results_batch]
+
+    def _to_neighbors(self, results, k, filter_func=None):
+        """Maps Qdrant (payload, score) hits to (case_dict, distance) and applies filter_func."""
         mapped_results = []
         for payload, score in results:
             # Reconstruct case_dict (add vector back if needed? Not really needed for logic)
@@ -83,40 +313,182 @@ class DecisionMemory:
         # Apply python filter_func if exists
         if filter_func:
             mapped_results = [r for r in mapped_results if filter_func(r[0])]
-            
-            # If we filtered everything, maybe query more? 
-            # For 'fraud' check, we specifically need fraud cases.
-            # This 'retrieve then filter' approach is weak if fraud cases are rare.
-            # But for prototype with small dataset, it might work if we query enough.
-            # Better: Modify `retrieve_neighbors` to accept a `label_filter`.
-            pass
 
         return mapped_results[:k]
 
     def retrieve_fraud_cases(self, input_vector, k=1):
         """
         Special method to find fraud cases for Anomaly Detector.
+        Searches only the fraud sub-index (exact), so the cost follows the number of known
+        fraud cases, and the nearest one is found even when it is far from the overall top-k.
+        """
+        with self.metrics.timer('fraud_search'):
+            results = self.fraud_index.search(input_vector, k=k, filter_conditions=FRAUD_FILTER)
+            return self._to_neighbors(results, k)
+
+    def retrieve_fraud_cases_batch(self, input_vectors, k=1):
+        """
+        Batched counterpart of retrieve_fraud_cases.
         """
-        # We can implement a proper Qdrant filter here if we want, 
-        # or just rely on the fact that we need to find *any* similar fraud.
-        # Let's do a broader search or assume `retrieve_neighbors` with post-filter is okay for now.
-        # Actually, let's just use the current mechanism but ask for more matches.
-        return self.retrieve_neighbors(input_vector, k=20, filter_func=lambda c: 'fraud' in c.get('labels', []))
+        with self.metrics.timer('batch.fraud_search'):
+            results_batch = self.fraud_index.search_batch(input_vectors, k=k, filter_conditions=FRAUD_FILTER)
+            return [self._to_neighbors(results, k) for results in results_batch]
+
+    def _lookup(self, case_ids, with_vectors=False):
+        """Point-id lookup: {case_id: (payload, vector_or_None)}, deferred cases included."""
+        pending = self.write_buffer.retrieve(case_ids, with_vectors) if self.write_buffer is not None else {}
+        missing = [case_id for case_id in case_ids if case_id not in pending]
+        found = {}
+        if missing:
+            self._backend_call()
+            with self._backend_lock:
+                found = self.backend.retrieve(missing, with_vectors)
+        found.update(pending)
+        return found
+
+    def get_case(self, case_id):
+        """The stored case (payload) with this id, or None. One point lookup, no search."""
+        return self.get_cases([case_id])[0]
+
+    def get_cases(self, case_ids):
+        """Batch lookup in one backend call: one payload (or None) per id, in input order."""
+        case_ids = list(case_ids)
+        found = self._lookup(case_ids)
+        return [found[case_id][0] if case_id in found else None for case_id in case_ids]
+
+    def retrieve_similar_to_case(self, case_id, k=5, filter_func=None, case_filter=None):
+        """
+        (case, neighbors) for the k cases closest to a stored case, or None if the id is unknown.
+        Reuses the stored vector (fetched with the case), so nothing is re-vectorized;
+        the case itself is left out of its neighbors.
+        """
+        found = self._lookup([case_id], with_vectors=True)
+        if case_id not in found:
+            return None
+        case, vector = found[case_id]
+        neighbors = self.retrieve_neighbors(vector, k=k + 1, filter_func=filter_func, case_filter=case_filter)
+        neighbors = [(c, dist) for c, dist in neighbors if c.get('id') != case_id]
+        return case, neighbors[:k]
 
     def get_stats(self):
-        count = self.qdrant.get_count()
+        # O(1): read from the aggregates maintained on every upsert, no scroll of the collection
+        aggregates = self.aggregates.to_dict()
         return {
-            'total_cases': count,
-            # Approvals/Declines requiring retrieving all logic which is slow in Vector DB without aggregation
-            # We'll just return count for now or maintain a counter.
-            'status': "Qdrant Connected"
+            'total_cases': aggregates['total'],
+            'fraud_cases': self.fraud_index.get_count(FRAUD_FILTER),
+            'approved': aggregates['by_decision'].get('approve', 0),
+            'declined': aggregates['by_decision'].get('decline', 0),
+            'by_decision': aggregates['by_decision'],
+            'by_outcome': aggregates['by_outcome'],
+            'by_label': aggregates['by_label'],
+            'by_credit_history': aggregates['by_credit_history'],
+            'profile_histograms': self.aggregates.histogram_snapshot(),
+            # Learned cases accepted but not upserted yet (counted above once flushed)
+            'pending_writes': self.write_buffer.depth() if self.write_buffer is not None else 0,
+            'status': f"{type(self.backend).__name__} Connected"
         }
 
-    def load_from_file(self, filepath):
-        """Load history from JSON."""
-        with open(filepath, 'r') as f:
-            data = json.load(f)
-            for item in data:
-                # Re-vectorize on load
-                item['vector'] = self.similarity_engine.vectorize(item['profile'])
-                self.add_case(item)
+    def add_cases(self, cases):
+        """
+        Adds a list of cases with one vectorization pass and a single backend upsert.
+        """
+        if not cases:
+            return
+        ids, vectors, payloads = self._prepare_batch(cases)
+        # Ids created by _prepare_batch are new: nothing to look up for them
+        new_ids = {case_id for case, case_id in zip(cases, ids) if case.get('id') is None}
+        self._store(ids, vectors, payloads, new_ids=new_ids)
+
+    def _prepare_batch(self, cases):
+        """(ids, vectors, payloads) for a list of cases, vectorizing those without a vector."""
+        missing = [c for c in cases if 'vector' not in c]
+        if missing:
+            vectors = self.similarity_engine.vectorize_many([c['profile'] for c in missing])
+            for case, vector in zip(missing, vectors):
+                case['vector'] = vector
+
+        ids, vectors, payloads = [], [], []
+        for case in cases:
+            payload = {k: v for k, v in case.items() if k != 'vector'}
+            case_id = payload.get('id', None)
+            if case_id is None:
+                case_id = payload['id'] = new_case_id()
+            ids.append(case_id)
+            vectors.append(case['vector'])
+            payloads.append(payload)
+        return ids, np.asarray(vectors, dtype=np.float32), payloads
+
+    def load_from_file(self, filepath, batch_size=2048, progress=None):
+        """
+        Streams history from a JSON array, JSON Lines or columnar (.parquet) file into memory.
+        Records are read incrementally, vectorized and upserted batch_size at a time,
+        so peak memory is bounded by one batch rather than the whole file.
+        progress(stats) is called after every batch; the final stats are returned.
+        """
+        stats = {'cases': 0, 'batches': 0, 'seconds': 0.0, 'cases_per_sec': 0.0}
+        start = time.perf_counter()
+
+        if filepath.endswith('.parquet'):
+            batches = self._columnar_batches(filepath, batch_size)
+        else:
+            batches = self._json_batches(filepath, batch_size)
+
+        # Into an empty memory, ids never seen in this file are new: no need to look them up
+        started_empty = not self.backend.get_count()
+        seen = set()
+        for ids, vectors, payloads in batches:
+            if started_empty:
+                repeated = not seen.isdisjoint(ids)
+                seen.update(ids)
+            self._store(ids, vectors, payloads, check_existing=not started_empty or repeated, persist=False)
+
+            stats['cases'] += len(ids)
+            stats['batches'] += 1
+            stats['seconds'] = time.perf_counter() - start
+            stats['cases_per_sec'] = stats['cases'] / stats['seconds'] if stats['seconds'] > 0 else 0.0
+            if progress:
+                progress(dict(stats))
+
+        # Aggregates are saved once for the whole file
+        if self._aggregates_dirty:
+            self._save_aggregates()
+        self.last_load_stats = stats
+        return stats
+
+    def _json_batches(self, filepath, batch_size):
+        for chunk in HistoryReader(filepath).iter_chunks(batch_size):
+            # Re-vectorize on load
+            for item in chunk:
+                item.pop('vector', None)
+            yield self._prepare_batch(chunk)
+
+    def _columnar_batches(self, filepath, batch_size):
+        """
+        Yields (ids, vectors, payloads) per Parquet batch. The profile columns go straight into
+        vectorize_many; payload dicts are only built for the backend to store.
+        """
+        defaults = {field: default for field, _, default in self.similarity_engine.NUMERIC_FIELDS}
+        for columns in ColumnarHistoryReader(filepath).iter_batches(batch_size):
+            # Missing values take the vectorize defaults for the vector only; payloads leave them out
+            filled = dict(columns)
+            for field in PROFILE_NUMERIC_COLUMNS:
+                values = columns.get(field)
+                if values is not None and values.dtype.kind == 'f' and np.isnan(values).any():
+                    filled[field] = np.where(np.isnan(values), defaults[field], values)
+            vectors = self.similarity_engine.vectorize_many(filled)
+
+            fields = [f for f in PROFILE_NUMERIC_COLUMNS + ('credit_history',) if f in columns]
+            n = len(vectors)
+            profiles = [
+                {field: value for field, value in zip(fields, row) if value is not None}
+                for row in zip(*(_payload_values(columns[f]) for f in fields))
+            ]
+            ids = columns['id'].tolist() if 'id' in columns else [new_case_id() for _ in range(n)]
+            payloads = [
+                {'id': case_id, 'profile': profile, 'decision': decision, 'outcome': outcome, 'labels': labels}
+                for case_id, profile, decision, outcome, labels in zip(
+                    ids, profiles,
+                    columns.get('decision', [None] * n), columns.get('outcome', [None] * n),
+                    columns.get('labels', [[]] * n))
+            ]
+            yield ids, vectors, payloads
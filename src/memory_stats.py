@@ -0,0 +1,130 @@
+import threading
+from bisect import bisect_left
+from collections import Counter
+import numpy as np
+
+# Histogram upper bounds per profile field (the last bucket is +Inf), in the profile's units
+PROFILE_HISTOGRAM_BOUNDS = {
+    'income': (2000, 4000, 6000, 8000, 10000, 15000, 20000),
+    'expenses': (500, 1000, 2000, 3000, 4000, 6000),
+    'employment_length': (0, 1, 2, 4, 6, 10),
+    'loan_amount': (5000, 10000, 20000, 30000, 40000, 50000),
+    'loan_term': (12, 24, 36, 48, 60),
+}
+
+class MemoryAggregates:
+    """
+    Running totals over the stored cases: counts by decision, outcome, label and credit history,
+    plus fixed-bucket histograms of the numeric profile fields.
+    Updated with every upsert (add(), minus the replaced payloads when ids are overwritten),
+    so reading them is O(1). to_dict()/from_dict() is the persisted form; rebuild by
+    feeding every stored payload to add() when they drift.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = 0
+        self.by_decision = Counter()
+        self.by_outcome = Counter()
+        self.by_label = Counter()
+        self.by_credit_history = Counter()
+        self.histograms = {field: [0] * (len(bounds) + 1) for field, bounds in PROFILE_HISTOGRAM_BOUNDS.items()}
+
+    def add(self, payloads, sign=1):
+        """Counts payloads in (sign=1) or out (sign=-1, for cases being replaced)."""
+        if not payloads:
+            return
+        if len(payloads) == 1:
+            self._add_one(payloads[0], sign)
+            return
+        profiles = [p.get('profile') or {} for p in payloads]
+        decisions = Counter(p.get('decision') for p in payloads)
+        outcomes = Counter(p.get('outcome') for p in payloads)
+        labels = Counter(label for p in payloads for label in (p.get('labels') or []))
+        credit = Counter(profile.get('credit_history') for profile in profiles)
+
+        # Bucket whole columns at once; missing values are not counted
+        bucketed = {}
+        for field, bounds in PROFILE_HISTOGRAM_BOUNDS.items():
+            values = np.array([profile.get(field, np.nan) for profile in profiles], dtype=np.float64)
+            values = values[~np.isnan(values)]
+            bucketed[field] = np.bincount(np.searchsorted(bounds, values, side='left'),
+                                          minlength=len(bounds) + 1)
+
+        with self._lock:
+            self.total += sign * len(payloads)
+            for target, counts in ((self.by_decision, decisions), (self.by_outcome, outcomes),
+                                   (self.by_label, labels), (self.by_credit_history, credit)):
+                for key, n in counts.items():
+                    if key is None:
+                        continue
+                    target[key] += sign * n
+                    if target[key] <= 0:
+                        del target[key]
+            for field, counts in bucketed.items():
+                hist = self.histograms[field]
+                for i, n in enumerate(counts.tolist()):
+                    hist[i] += sign * n
+
+    def _add_one(self, payload, sign):
+        """add() for a single payload (one learned case): plain dict updates, no NumPy round-trip."""
+        profile = payload.get('profile') or {}
+        keys = ((self.by_decision, [payload.get('decision')]), (self.by_outcome, [payload.get('outcome')]),
+                (self.by_label, payload.get('labels') or []),
+                (self.by_credit_history, [profile.get('credit_history')]))
+        buckets = []
+        for field, bounds in PROFILE_HISTOGRAM_BOUNDS.items():
+            value = profile.get(field)
+            if value is None:
+                continue
+            value = float(value)  # same conversion as the batched path
+            if value == value:  # NaN is missing too
+                # bisect_left puts a value equal to a bound in that bound's bucket, like searchsorted
+                buckets.append((field, bisect_left(bounds, value)))
+
+        with self._lock:
+            self.total += sign
+            for target, values in keys:
+                for key in values:
+                    if key is None:
+                        continue
+                    target[key] += sign
+                    if target[key] <= 0:
+                        del target[key]
+            for field, bucket in buckets:
+                self.histograms[field][bucket] += sign
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'total': self.total,
+                'by_decision': dict(self.by_decision),
+                'by_outcome': dict(self.by_outcome),
+                'by_label': dict(self.by_label),
+                'by_credit_history': dict(self.by_credit_history),
+                'histograms': {field: list(counts) for field, counts in self.histograms.items()},
+            }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Inverse of to_dict(); None if data is missing or was written with other histogram bounds."""
+        if not data or set(data.get('histograms', {})) != set(PROFILE_HISTOGRAM_BOUNDS):
+            return None
+        aggregates = cls()
+        for field, counts in data['histograms'].items():
+            if len(counts) != len(PROFILE_HISTOGRAM_BOUNDS[field]) + 1:
+                return None
+            aggregates.histograms[field] = list(counts)
+        aggregates.total = data.get('total', 0)
+        aggregates.by_decision.update(data.get('by_decision', {}))
+        aggregates.by_outcome.update(data.get('by_outcome', {}))
+        aggregates.by_label.update(data.get('by_label', {}))
+        aggregates.by_credit_history.update(data.get('by_credit_history', {}))
+        return aggregates
+
+    def histogram_snapshot(self):
+        """{field: {'le_<bound>': count, ..., 'le_inf': count}} (non-cumulative)."""
+        with self._lock:
+            return {
+                field: {f"le_{b}": n for b, n in zip(list(bounds) + ['inf'], self.histograms[field])}
+                for field, bounds in PROFILE_HISTOGRAM_BOUNDS.items()
+            }
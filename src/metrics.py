@@ -0,0 +1,178 @@
+import bisect
+import os
+import threading
+import time
+import types
+import weakref
+
+# Latency bucket upper bounds, in milliseconds (the last bucket is +Inf)
+LATENCY_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (Prometheus style: counts per upper bound, plus sum)."""
+    def __init__(self, bounds_ms=LATENCY_BUCKETS_MS):
+        self.bounds_ms = bounds_ms
+        self.counts = [0] * (len(bounds_ms) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(self.bounds_ms, ms)] += 1
+        self.count += 1
+        self.sum_ms += ms
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation (an upper estimate)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.bounds_ms[i] if i < len(self.bounds_ms) else float('inf')
+        return float('inf')
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum_ms': self.sum_ms,
+            'mean_ms': self.sum_ms / self.count if self.count else 0.0,
+            'p50_ms': self.quantile(0.50),
+            'p95_ms': self.quantile(0.95),
+            'p99_ms': self.quantile(0.99),
+            'buckets': {f"le_{b}ms": n for b, n in zip(list(self.bounds_ms) + ['inf'], self.counts)},
+        }
+
+class _Timer:
+    __slots__ = ('metrics', 'stage', 'start')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, (time.perf_counter() - self.start) * 1000.0)
+        return False
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP = _NoopTimer()
+
+class Metrics:
+    """
+    Per-stage latency histograms, counters, and gauges pulled from collectors at snapshot time.
+    Disabled (enabled=False or CREDITIQ_METRICS=0), timer() returns a shared no-op and
+    inc()/observe() return immediately, so instrumented code pays one attribute check.
+    """
+    def __init__(self, enabled=None):
+        if enabled is None:
+            enabled = os.environ.get('CREDITIQ_METRICS', '1') != '0'
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._counters = {}
+        self._collectors = {}
+
+    def timer(self, stage):
+        """with metrics.timer('vectorize'): ... records the block's latency under that stage."""
+        if not self.enabled:
+            return _NOOP
+        return _Timer(self, stage)
+
+    def observe(self, stage, ms):
+        if not self.enabled:
+            return
+        with self._lock:
+            hist = self._stages.get(stage)
+            if hist is None:
+                hist = self._stages[stage] = LatencyHistogram()
+            hist.observe(ms)
+
+    def inc(self, counter, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + n
+
+    def counter(self, counter):
+        return self._counters.get(counter, 0)
+
+    def add_collector(self, name, fn):
+        """
+        fn() -> {key: number}; exported as gauges name.key (e.g. a cache's stats()).
+        Bound methods are held weakly: an owner registering its own stats() (engine, memory)
+        would otherwise be kept alive by its metrics, in a cycle only the GC can break.
+        """
+        self._collectors[name] = weakref.WeakMethod(fn) if isinstance(fn, types.MethodType) else (lambda: fn)
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        """JSON-serializable view of everything recorded so far."""
+        with self._lock:
+            stages = {name: hist.snapshot() for name, hist in self._stages.items()}
+            counters = dict(self._counters)
+        gauges = {}
+        for name, ref in list(self._collectors.items()):
+            fn = ref()
+            if fn is None:
+                continue  # owner gone
+            for key, value in fn().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    gauges[f"{name}.{key}"] = value
+        return {'enabled': self.enabled, 'stages': stages, 'counters': counters, 'gauges': gauges}
+
+    def to_prometheus(self, prefix='creditiq'):
+        """Prometheus text exposition format (version 0.0.4)."""
+        snap = self.snapshot()
+        lines = [f"# TYPE {prefix}_stage_seconds histogram"]
+        with self._lock:
+            hists = list(self._stages.items())
+            for stage, hist in hists:
+                cumulative = 0
+                for bound, n in zip(list(hist.bounds_ms) + [None], hist.counts):
+                    cumulative += n
+                    le = '+Inf' if bound is None else repr(bound / 1000.0)
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {hist.sum_ms / 1000.0}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {hist.count}')
+        for name, value in snap['counters'].items():
+            metric = f"{prefix}_{_metric_name(name)}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        for name, value in snap['gauges'].items():
+            metric = f"{prefix}_{_metric_name(name)}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary_lines(self):
+        """Short human-readable table (chatbot / logs)."""
+        snap = self.snapshot()
+        if not snap['enabled']:
+            return ["Metrics are disabled (CREDITIQ_METRICS=0)."]
+        lines = [f"{'stage':<24} {'count':>7} {'mean ms':>9} {'p95 ms':>8}"]
+        for stage, s in sorted(snap['stages'].items()):
+            lines.append(f"{stage:<24} {s['count']:>7} {s['mean_ms']:>9.3f} {s['p95_ms']:>8g}")
+        for name, value in sorted({**snap['counters'], **snap['gauges']}.items()):
+            shown = f"{value:.2f}" if isinstance(value, float) else str(value)
+            lines.append(f"{name:<34} {shown:>14}")
+        return lines
+
+def _metric_name(name):
+    return ''.join(c if c.isalnum() else '_' for c in name)
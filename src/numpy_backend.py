@@ -0,0 +1,204 @@
+import numpy as np
+import uuid
+import threading
+from src.similarity import SimilarityEngine
+
+class NumpyMemoryBackend:
+    """
+    Exact, in-process cosine k-NN over a contiguous float32 matrix.
+    Same interface as QdrantManager (add_case, add_batch, search, search_batch, get_count, has_case, retrieve,
+    scroll, get_metadata, update_metadata).
+    At 9 dimensions one BLAS matrix-vector product over all cases is cheaper than
+    the local Qdrant client's per-call overhead for up to a few hundred thousand cases.
+    """
+    def __init__(self, vector_size=SimilarityEngine.VECTOR_SIZE, initial_capacity=1024):
+        self.vector_size = vector_size
+        self._lock = threading.RLock()
+        self._size = 0
+        self._capacity = 0
+        # Rows are preallocated and grown by doubling; only [:self._size] is live.
+        self._vectors = np.empty((0, vector_size), dtype=np.float32)   # L2-normalised
+        self._numeric = np.empty((0, len(SimilarityEngine.NUMERIC_FIELDS)), dtype=np.float64)
+        self._decisions = np.empty(0, dtype=object)
+        self._ids = np.empty(0, dtype=object)
+        self._payloads = []
+        self._row_of_id = {}
+        self._label_rows = {}  # label -> set of rows
+        self._metadata = {}
+        self._grow(initial_capacity)
+
+    def _grow(self, min_capacity):
+        capacity = max(self._capacity, 1)
+        while capacity < min_capacity:
+            capacity *= 2
+        if capacity == self._capacity:
+            return
+
+        def grown(arr, fill):
+            new = np.full((capacity,) + arr.shape[1:], fill, dtype=arr.dtype)
+            new[:self._size] = arr[:self._size]
+            return new
+
+        self._vectors = grown(self._vectors, 0)
+        self._numeric = grown(self._numeric, np.nan)
+        self._decisions = grown(self._decisions, None)
+        self._ids = grown(self._ids, None)
+        self._capacity = capacity
+
+    def add_case(self, case_id, vector, payload):
+        self.add_batch([case_id], np.asarray(vector, dtype=np.float32).reshape(1, -1), [payload])
+
+    def add_batch(self, case_ids, vectors, payloads):
+        """
+        Upserts many cases. Existing ids are overwritten in place, like a Qdrant upsert.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.vector_size)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+        with self._lock:
+            self._grow(self._size + len(vectors))
+            for case_id, vector, payload in zip(case_ids, vectors, payloads):
+                if not isinstance(case_id, int):
+                    case_id = str(uuid.uuid4())
+                row = self._row_of_id.get(case_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._row_of_id[case_id] = row
+                    self._payloads.append(payload)
+                else:
+                    self._unindex_labels(row)
+                    self._payloads[row] = payload
+
+                self._vectors[row] = vector
+                self._ids[row] = case_id
+                self._decisions[row] = payload.get('decision')
+                profile = payload.get('profile', {})
+                self._numeric[row] = [
+                    profile.get(field, np.nan) for field, _, _ in SimilarityEngine.NUMERIC_FIELDS
+                ]
+                for label in payload.get('labels') or []:
+                    self._label_rows.setdefault(label, set()).add(row)
+
+    def _unindex_labels(self, row):
+        for label in self._payloads[row].get('labels') or []:
+            self._label_rows.get(label, set()).discard(row)
+
+    def search(self, query_vector, k=5, filter_conditions=None):
+        """
+        Exact cosine search. filter_conditions is a CaseFilter (or None).
+        Returns List[(payload, score)] like QdrantManager.search.
+        """
+        return self.search_batch(np.asarray(query_vector).reshape(1, -1), k, filter_conditions)[0]
+
+    def search_batch(self, query_vectors, k=5, filter_conditions=None):
+        queries = np.asarray(query_vectors, dtype=np.float32).reshape(-1, self.vector_size)
+        if len(queries) == 0:
+            return []
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = np.divide(queries, norms, out=np.zeros_like(queries), where=norms > 0)
+
+        with self._lock:
+            n = self._size
+            mask = self._filter_mask(filter_conditions, n)
+            if n == 0 or k <= 0 or (mask is not None and not mask.any()):
+                return [[] for _ in queries]
+
+            scores = queries @ self._vectors[:n].T  # (B, n)
+            if mask is not None:
+                scores[:, ~mask] = -np.inf
+                k = min(k, int(mask.sum()))
+            k = min(k, n)
+
+            # argpartition top-k, then sort just those k
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+            return [
+                [(dict(self._payloads[row]), float(score)) for row, score in zip(rows, row_scores)]
+                for rows, row_scores in zip(top, top_scores)
+            ]
+
+    def _filter_mask(self, case_filter, n):
+        """Evaluates a CaseFilter over the live rows as a boolean mask (None = no filter)."""
+        if case_filter is None:
+            return None
+
+        mask = np.ones(n, dtype=bool)
+        if case_filter.labels_any:
+            label_mask = np.zeros(n, dtype=bool)
+            for label in case_filter.labels_any:
+                rows = self._label_rows.get(label)
+                if rows:
+                    label_mask[list(rows)] = True
+            mask &= label_mask
+        if case_filter.decision is not None:
+            mask &= self._decisions[:n] == case_filter.decision
+        fields = [field for field, _, _ in SimilarityEngine.NUMERIC_FIELDS]
+        for field, (low, high) in case_filter.ranges.items():
+            if field not in fields:
+                # Not a columnar field: fall back to the Python predicate
+                mask &= np.array([case_filter.matches(p) for p in self._payloads[:n]], dtype=bool)
+                continue
+            column = self._numeric[:n, fields.index(field)]
+            mask &= ~np.isnan(column)
+            if low is not None:
+                mask &= column >= low
+            if high is not None:
+                mask &= column <= high
+        if case_filter.ids is not None:
+            id_mask = np.zeros(n, dtype=bool)
+            rows = [self._row_of_id[i] for i in case_filter.ids if i in self._row_of_id]
+            id_mask[rows] = True
+            mask &= id_mask
+        excluded = [self._row_of_id[i] for i in case_filter.exclude_ids if i in self._row_of_id]
+        if excluded:
+            mask[excluded] = False
+        return mask
+
+    def get_count(self, filter_conditions=None):
+        if filter_conditions is None:
+            return self._size
+        with self._lock:
+            return int(self._filter_mask(filter_conditions, self._size).sum())
+
+    def has_case(self, case_id):
+        return case_id in self._row_of_id
+
+    def case_ids(self):
+        with self._lock:
+            return set(self._row_of_id)
+
+    def retrieve(self, case_ids, with_vectors=False):
+        """{case_id: (payload, vector_or_None)} for the ids that are stored."""
+        found = {}
+        with self._lock:
+            for case_id in case_ids:
+                row = self._row_of_id.get(case_id)
+                if row is not None:
+                    found[case_id] = (self._payloads[row], self._vectors[row].copy() if with_vectors else None)
+        return found
+
+    def get_metadata(self):
+        return dict(self._metadata)
+
+    def update_metadata(self, values):
+        """Merged into the backend's metadata (lives as long as the process, like the cases)."""
+        self._metadata.update(values)
+
+    def scroll(self, batch_size=1000, with_vectors=False, filter_conditions=None):
+        """Yields lists of (case_id, payload, vector_or_None) in insertion order, optionally filtered."""
+        for start in range(0, self._size, batch_size):
+            with self._lock:
+                stop = min(start + batch_size, self._size)
+                mask = self._filter_mask(filter_conditions, stop)
+                page = [
+                    (self._ids[row], self._payloads[row], self._vectors[row].copy() if with_vectors else None)
+                    for row in range(start, stop) if mask is None or mask[row]
+                ]
+            if page:
+                yield page
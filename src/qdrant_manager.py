@@ -1,25 +1,89 @@
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+from qdrant_client.models import (Distance, VectorParams, PointStruct, QueryRequest, Batch, PayloadSchemaType,
+                                  HnswConfigDiff, SearchParams)
 import numpy as np
 import uuid
+import warnings
+import os
+import shutil
+import tempfile
 
 class QdrantManager:
-    def __init__(self, collection_name="credit_memory"):
-        # Initialize in-memory mode for prototype
-        self.client = QdrantClient(":memory:")
+    # Payload fields that CaseFilter can filter on; indexed so filtered k-NN stays cheap
+    PAYLOAD_INDEXES = {
+        'labels': PayloadSchemaType.KEYWORD,
+        'decision': PayloadSchemaType.KEYWORD,
+        'profile.credit_history': PayloadSchemaType.KEYWORD,
+        'profile.income': PayloadSchemaType.FLOAT,
+        'profile.expenses': PayloadSchemaType.FLOAT,
+        'profile.employment_length': PayloadSchemaType.FLOAT,
+        'profile.loan_amount': PayloadSchemaType.FLOAT,
+        'profile.loan_term': PayloadSchemaType.FLOAT,
+    }
+
+    def __init__(self, collection_name="credit_memory", path=None, url=None,
+                 hnsw_m=None, hnsw_ef_construct=None, hnsw_ef=None):
+        """
+        Storage mode, first match wins:
+          url  (or $CREDITIQ_QDRANT_URL)  -> a running Qdrant server
+          path (or $CREDITIQ_QDRANT_PATH) -> on-disk local collection, reopened as-is on restart
+          neither                         -> in-memory, rebuilt on every start (prototype default)
+        HNSW: hnsw_m / hnsw_ef_construct ($CREDITIQ_HNSW_M / $CREDITIQ_HNSW_EF_CONSTRUCT) shape the
+        graph of a new collection; hnsw_ef ($CREDITIQ_HNSW_EF) is the search-time beam width.
+        Unset means Qdrant's defaults. See benchmarks/bench_hnsw.py for recall vs latency.
+        The local client (path / in-memory) always searches exactly, so these only matter on a server.
+        """
+        self.url = url or os.environ.get('CREDITIQ_QDRANT_URL')
+        self.path = path or os.environ.get('CREDITIQ_QDRANT_PATH')
+        self.hnsw_m = hnsw_m if hnsw_m is not None else _env_int('CREDITIQ_HNSW_M')
+        self.hnsw_ef_construct = hnsw_ef_construct if hnsw_ef_construct is not None \
+            else _env_int('CREDITIQ_HNSW_EF_CONSTRUCT')
+        self.hnsw_ef = hnsw_ef if hnsw_ef is not None else _env_int('CREDITIQ_HNSW_EF')
+        self.client = self._connect()
         self.collection_name = collection_name
         self.vector_size = 9  # Update this based on SimilarityEngine output size!
                              # [Inc, Exp, Emp, Amt, Term, Cred] + [DocEmb(3)] = 6 + 3 = 9
         
         self._init_collection()
 
+    @property
+    def is_persistent(self):
+        return bool(self.url or self.path)
+
+    def _connect(self):
+        if self.url:
+            return QdrantClient(url=self.url)
+        if self.path:
+            return QdrantClient(path=self.path)
+        # Initialize in-memory mode for prototype
+        return QdrantClient(":memory:")
+
     def _init_collection(self):
-        # Check if collection exists (always false for in-memory on init, but good practice)
+        # Persistent modes reopen the existing collection (and its points) instead of recreating it
         if not self.client.collection_exists(self.collection_name):
             self.client.create_collection(
                 collection_name=self.collection_name,
                 vectors_config=VectorParams(size=self.vector_size, distance=Distance.COSINE),
+                hnsw_config=self._hnsw_config(),
             )
+            # The local client ignores payload indexes (and warns about it); they matter on a server.
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", UserWarning)
+                for field, schema in self.PAYLOAD_INDEXES.items():
+                    self.client.create_payload_index(
+                        collection_name=self.collection_name,
+                        field_name=field,
+                        field_schema=schema
+                    )
+
+    def _hnsw_config(self):
+        if self.hnsw_m is None and self.hnsw_ef_construct is None:
+            return None
+        return HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct)
+
+    def _search_params(self):
+        # Read on every search, so a harness can sweep hnsw_ef on one collection
+        return SearchParams(hnsw_ef=self.hnsw_ef) if self.hnsw_ef is not None else None
 
     def add_case(self, case_id, vector, payload):
         """
@@ -41,19 +105,39 @@ class QdrantManager:
             points=[point]
         )
 
+    def add_batch(self, case_ids, vectors, payloads):
+        """
+        Adds many cases with a single upsert.
+        vectors can be an (N, dim) array; ids follow the same rule as add_case.
+        """
+        if isinstance(vectors, np.ndarray):
+            vectors = vectors.tolist()
+
+        ids = [cid if isinstance(cid, int) else str(uuid.uuid4()) for cid in case_ids]
+
+        self.client.upsert(
+            collection_name=self.collection_name,
+            points=Batch(ids=ids, vectors=vectors, payloads=list(payloads))
+        )
+
     def search(self, query_vector, k=5, filter_conditions=None):
         """
         Search for nearest neighbors.
+        filter_conditions is a CaseFilter or a Qdrant Filter, applied inside the search.
         """
         if isinstance(query_vector, np.ndarray):
             query_vector = query_vector.tolist()
+        filter_conditions = self._as_qdrant_filter(filter_conditions)
 
-        search_result = self.client.search(
+        # `client.search` is gone from recent qdrant-client releases, query_points is the replacement.
+        search_result = self.client.query_points(
             collection_name=self.collection_name,
-            query_vector=query_vector,
+            query=query_vector,
             limit=k,
-            query_filter=filter_conditions
-        )
+            query_filter=filter_conditions,
+            search_params=self._search_params(),
+            with_payload=True
+        ).points
         
         # Convert to standardized format List[(payload, distance)]
         # Qdrant returns score (cosine sim). Higher is better.
@@ -72,6 +156,134 @@ class QdrantManager:
             
         return results
 
+    def search_batch(self, query_vectors, k=5, filter_conditions=None):
+        """
+        Search nearest neighbors for many query vectors in a single Qdrant call.
+        Returns one List[(payload, score)] per query, in input order.
+        """
+        if isinstance(query_vectors, np.ndarray):
+            query_vectors = query_vectors.tolist()
+
+        if len(query_vectors) == 0:
+            return []
+        filter_conditions = self._as_qdrant_filter(filter_conditions)
+
+        params = self._search_params()
+        requests = [
+            QueryRequest(query=vec, limit=k, filter=filter_conditions, params=params, with_payload=True)
+            for vec in query_vectors
+        ]
+        responses = self.client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=requests
+        )
+
+        return [[(hit.payload, hit.score) for hit in resp.points] for resp in responses]
+
+    def _as_qdrant_filter(self, filter_conditions):
+        # Backends share CaseFilter; compile it here. Raw Qdrant Filters pass through.
+        if hasattr(filter_conditions, 'to_qdrant'):
+            return filter_conditions.to_qdrant()
+        return filter_conditions
+
     def get_count(self):
         info = self.client.get_collection(self.collection_name)
         return info.points_count
+
+    def snapshot(self, destination):
+        """
+        Writes a restorable snapshot of the collection.
+        Local path mode: a .tar.gz of the storage directory at `destination`.
+        Server mode: a server-side snapshot; returns its name (destination is ignored).
+        """
+        if self.url:
+            return self.client.create_snapshot(collection_name=self.collection_name).name
+        if not self.path:
+            raise ValueError("Snapshots need a persistent store: set path= or CREDITIQ_QDRANT_PATH")
+
+        # The local client keeps the storage open; close it so the archive is consistent.
+        self.client.close()
+        try:
+            base = destination[:-len('.tar.gz')] if destination.endswith('.tar.gz') else destination
+            archive = shutil.make_archive(base, 'gztar', root_dir=self.path)
+        finally:
+            self.client = self._connect()
+        return archive
+
+    def restore(self, source):
+        """
+        Replaces the current collection with a snapshot made by snapshot().
+        Local path mode: `source` is the .tar.gz archive.
+        Server mode: `source` is a snapshot location understood by the server (file:// or http URL).
+        """
+        if self.url:
+            self.client.recover_snapshot(collection_name=self.collection_name, location=source)
+            return
+        if not self.path:
+            raise ValueError("Restore needs a persistent store: set path= or CREDITIQ_QDRANT_PATH")
+
+        # Unpack next to the store first, so a bad archive never leaves us without an index.
+        staging = tempfile.mkdtemp(prefix='.restore-', dir=os.path.dirname(os.path.abspath(self.path)))
+        try:
+            shutil.unpack_archive(source, staging, 'gztar')
+            self.client.close()
+            shutil.rmtree(self.path, ignore_errors=True)
+            os.replace(staging, self.path)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        finally:
+            self.client = self._connect()
+        self._init_collection()
+
+    def has_case(self, case_id):
+        if not isinstance(case_id, int):
+            return False  # non-int ids were replaced by fresh UUIDs on insert
+        return bool(self.client.retrieve(self.collection_name, ids=[case_id], with_payload=False))
+
+    def retrieve(self, case_ids, with_vectors=False):
+        """{case_id: (payload, vector_or_None)} for the ids that are stored, in one point-id lookup."""
+        ids = [cid for cid in case_ids if isinstance(cid, int)]
+        if not ids:
+            return {}
+        records = self.client.retrieve(self.collection_name, ids=ids, with_payload=True, with_vectors=with_vectors)
+        return {
+            r.id: (r.payload, np.asarray(r.vector, dtype=np.float32) if with_vectors else None)
+            for r in records
+        }
+
+    def get_metadata(self):
+        """Collection metadata: stored with the collection, so it follows snapshots and restores."""
+        return dict(self.client.get_collection(self.collection_name).config.metadata or {})
+
+    def update_metadata(self, values):
+        self.client.update_collection(self.collection_name, metadata=values)
+
+    def close(self):
+        """Releases the client (and the storage lock of a local path store)."""
+        self.client.close()
+
+    def scroll(self, batch_size=1000, with_vectors=False, filter_conditions=None):
+        """Yields lists of (case_id, payload, vector_or_None), one list per scroll page."""
+        scroll_filter = self._as_qdrant_filter(filter_conditions)
+        offset = None
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=scroll_filter,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=with_vectors
+            )
+            if records:
+                yield [
+                    (r.id, r.payload, np.asarray(r.vector, dtype=np.float32) if with_vectors else None)
+                    for r in records
+                ]
+            if offset is None:
+                break
+
+def _env_int(name):
+    value = os.environ.get(name)
+    return int(value) if value else None
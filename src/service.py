@@ -0,0 +1,356 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+# Add root to path
+sys.path.append(os.getcwd())
+
+from src.decision_engine import DecisionEngine
+from src.similarity import SimilarityEngine
+
+class QueueFullError(Exception):
+    """Raised when the micro-batch queue is at capacity (the service answers 503)."""
+
+class InvalidProfileError(ValueError):
+    """Raised for a profile the engine cannot score (the service answers 400 for that request only)."""
+
+def validate_profile(profile):
+    """
+    Returns a copy of profile with numeric fields converted to numbers, or raises InvalidProfileError.
+    Run before queueing, so one bad request never reaches (and fails) a shared batch.
+    """
+    if not isinstance(profile, dict):
+        raise InvalidProfileError(f"profile must be a JSON object, got {profile!r}")
+    profile = dict(profile)
+    for field, _, _ in SimilarityEngine.NUMERIC_FIELDS:
+        if field not in profile:
+            continue
+        value = profile[field]
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            raise InvalidProfileError(f"'{field}' must be a number, got {value!r}")
+        if not isinstance(value, int):
+            try:
+                value = float(value)
+            except ValueError:
+                raise InvalidProfileError(f"'{field}' must be a number, got {value!r}")
+            if not math.isfinite(value):
+                raise InvalidProfileError(f"'{field}' must be finite, got {value!r}")
+        profile[field] = value
+    credit = profile.get('credit_history')
+    if credit is not None and not isinstance(credit, str):
+        raise InvalidProfileError(f"'credit_history' must be a string, got {credit!r}")
+    return profile
+
+class MicroBatcher:
+    """
+    Collects concurrent evaluate requests and scores them together.
+    A batch is sent as soon as max_batch requests are waiting, or max_wait_ms after its
+    first request arrived, whichever comes first. At most queue_depth requests wait;
+    beyond that submit() raises QueueFullError instead of letting latency grow unbounded.
+    """
+    def __init__(self, engine, executor, max_batch=64, max_wait_ms=5.0, queue_depth=1024):
+        self.engine = engine
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = asyncio.Queue(maxsize=queue_depth)
+        self.batches = 0
+        self.requests = 0
+        self.rejected = 0
+        self._worker = None
+
+    def start(self):
+        self._worker = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, profile):
+        profile = validate_profile(profile)
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((profile, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise QueueFullError(f"Queue full ({self.queue.maxsize} pending requests)")
+        return await future
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch:
+            # Take whatever is already queued without waiting
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            remaining = deadline - asyncio.get_running_loop().time()
+            if len(batch) >= self.max_batch or remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Callers that gave up (client disconnected) are dropped before scoring
+            batch = [(p, f) for p, f in batch if not f.done()]
+            if not batch:
+                continue
+            profiles = [p for p, _ in batch]
+            try:
+                results = await loop.run_in_executor(self.executor, self.engine.evaluate_batch, profiles)
+            except Exception:
+                # Something in the batch still failed: score one by one so only that request errors
+                results = await loop.run_in_executor(self.executor, self._evaluate_each, profiles)
+                for (_, future), result in zip(batch, results):
+                    if future.done():
+                        continue
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+                continue
+            self.batches += 1
+            self.requests += len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def _evaluate_each(self, profiles):
+        results = []
+        for profile in profiles:
+            try:
+                results.append(self.engine.evaluate_batch([profile])[0])
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def stats(self):
+        return {
+            'queue_depth': self.queue.qsize(),
+            'max_queue_depth': self.queue.maxsize,
+            'max_batch': self.max_batch,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'batches': self.batches,
+            'requests': self.requests,
+            'avg_batch_size': self.requests / self.batches if self.batches else 0.0,
+            'rejected': self.rejected,
+        }
+
+# Upper bound for GET /cases/<id>?k=
+MAX_SIMILAR = 100
+
+class DecisionService:
+    """
+    Minimal HTTP/JSON front end for DecisionEngine (stdlib asyncio, keep-alive aware).
+      POST /evaluate  {profile fields}                    -> decision result
+      POST /learn     {"profile": {...}, "decision": ..., "outcome": ..., "labels": [...]}
+      GET  /stats     memory + batching counters + metrics snapshot (JSON)
+      GET  /metrics   per-stage latency histograms and counters (Prometheus text)
+      GET  /cases/<id>  a stored case and its most similar precedents (?k=5)
+      POST /cases     {"ids": [...]}                      -> the stored cases, in order (null if unknown)
+    All engine calls run on a single worker thread, so the engine is never used concurrently.
+    """
+    def __init__(self, engine=None, max_batch=64, max_wait_ms=5.0, queue_depth=1024):
+        self.engine = engine or DecisionEngine()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.batcher_config = dict(max_batch=max_batch, max_wait_ms=max_wait_ms, queue_depth=queue_depth)
+        self.batcher = None
+        self.started = time.time()
+
+    async def serve(self, host='127.0.0.1', port=8080):
+        # The queue must be created inside the running loop
+        self.batcher = MicroBatcher(self.engine, self.executor, **self.batcher_config)
+        self.batcher.start()
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        print(f"CreditIQ decision service listening on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.batcher.stop()
+            # Learned cases still in the write-behind buffer are stored before exiting
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.engine.close)
+            self.executor.shutdown(wait=False)
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                if body is None:
+                    # Unusable Content-Length: the body can't be framed, so answer and close
+                    status, payload = 400, {'error': f"Invalid Content-Length: {headers['content-length']!r}"}
+                    headers['connection'] = 'close'
+                else:
+                    status, payload = await self.dispatch(method, path, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, path, _ = line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            return None
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0) or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            return method.upper(), path, headers, None
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), path, headers, body
+
+    def _write_response(self, writer, status, payload, keep_alive):
+        reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error',
+                   503: 'Service Unavailable'}
+        if isinstance(payload, str):
+            # Prometheus text exposition
+            body, content_type = payload.encode('utf-8'), "text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(payload, default=str).encode('utf-8'), "application/json"
+        head = (
+            f"HTTP/1.1 {status} {reasons.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        )
+        if status == 503:
+            head += "Retry-After: 1\r\n"
+        writer.write(head.encode('latin-1') + b"\r\n" + body)
+
+    async def dispatch(self, method, path, body):
+        """Routes one request; returns (status, json-serializable payload)."""
+        path, _, query = path.partition('?')
+        try:
+            if method == 'GET' and path.startswith('/cases/'):
+                return await self.case(path[len('/cases/'):], parse_qs(query))
+            if method == 'GET' and path == '/stats':
+                return 200, await self.stats()
+            if method == 'GET' and path == '/metrics':
+                return 200, self.engine.metrics.to_prometheus()
+            if method == 'POST' and path in ('/evaluate', '/learn', '/cases'):
+                try:
+                    data = json.loads(body or b'{}')
+                except json.JSONDecodeError as e:
+                    return 400, {'error': f"Invalid JSON: {e}"}
+                if not isinstance(data, dict):
+                    return 400, {'error': "Expected a JSON object"}
+                if path == '/evaluate':
+                    return 200, await self.batcher.submit(data)
+                if path == '/cases':
+                    return await self.cases(data)
+                return await self.learn(data)
+            return 404, {'error': f"No route for {method} {path}"}
+        except InvalidProfileError as e:
+            return 400, {'error': str(e)}
+        except QueueFullError as e:
+            return 503, {'error': str(e)}
+        except Exception as e:
+            return 500, {'error': str(e)}
+
+    async def learn(self, data):
+        if 'profile' not in data or 'decision' not in data:
+            return 400, {'error': "learn needs 'profile' and 'decision'"}
+        profile = validate_profile(data['profile'])
+        labels = data.get('labels')
+        if labels is not None and not (isinstance(labels, list) and all(isinstance(l, str) for l in labels)):
+            return 400, {'error': f"labels must be a list of strings, got {labels!r}"}
+        for field in ('decision', 'outcome'):
+            if data.get(field) is not None and not isinstance(data[field], str):
+                return 400, {'error': f"'{field}' must be a string, got {data[field]!r}"}
+        loop = asyncio.get_running_loop()
+        case_id = await loop.run_in_executor(
+            self.executor, self.engine.learn, profile, data['decision'], data.get('outcome'), labels
+        )
+        return 200, {'status': 'learned', 'id': case_id}
+
+    async def case(self, case_id, query):
+        case_id = int(case_id) if case_id.isdigit() else case_id
+        k = query.get('k', ['5'])[0]
+        if not k.isdigit() or not 1 <= int(k) <= MAX_SIMILAR:
+            return 400, {'error': f"k must be an integer between 1 and {MAX_SIMILAR}, got {k!r}"}
+        k = int(k)
+        loop = asyncio.get_running_loop()
+        found = await loop.run_in_executor(self.executor, self.engine.find_similar, case_id, k)
+        if found is None:
+            return 404, {'error': f"No case with id {case_id}"}
+        return 200, found
+
+    async def cases(self, data):
+        ids = data.get('ids')
+        if not isinstance(ids, list):
+            return 400, {'error': "cases needs 'ids' (a list)"}
+        loop = asyncio.get_running_loop()
+        cases = await loop.run_in_executor(self.executor, self.engine.memory.get_cases, ids)
+        return 200, {'cases': cases}
+
+    async def stats(self):
+        loop = asyncio.get_running_loop()
+        memory = await loop.run_in_executor(self.executor, self.engine.memory.get_stats)
+        return {
+            'memory': memory,
+            'batching': self.batcher.stats(),
+            'vector_cache': self.engine.similarity.cache.stats(),
+            'metrics': self.engine.metrics.snapshot(),
+            'uptime_seconds': round(time.time() - self.started, 1),
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve DecisionEngine over HTTP/JSON with request micro-batching.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--max-batch', type=int, default=64, help="Requests scored together at most")
+    parser.add_argument('--max-wait-ms', type=float, default=5.0, help="Latency budget to fill a batch")
+    parser.add_argument('--queue-depth', type=int, default=1024, help="Pending requests before answering 503")
+    parser.add_argument('--backend', default=None, help="Memory backend (qdrant or numpy)")
+    parser.add_argument('--history', default='data/history.json', help="Loaded when the memory is empty")
+    args = parser.parse_args()
+
+    engine = DecisionEngine(memory_backend=args.backend)
+    if not engine.memory.get_stats()['total_cases'] and os.path.exists(args.history):
+        print(f"Loading {args.history}...")
+        engine.load_history(args.history)
+
+    service = DecisionService(engine, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms,
+                              queue_depth=args.queue_depth)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\nExiting...")
+
+if __name__ == "__main__":
+    main()
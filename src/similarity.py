@@ -1,9 +1,43 @@
 import numpy as np
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 import logging
+import hashlib
+import math
+import struct
+from src.vector_cache import VectorCache
+
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+
+def _mix64(x):
+    """splitmix64 finalizer over a uint64 array (wrapping arithmetic)."""
+    z = x + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+def _mix64_int(x):
+    """Scalar _mix64 on a Python int, same results (used for single profiles)."""
+    z = (x + 0x9E3779B97F4A7C15) & _MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return z ^ (z >> 31)
 
 class SimilarityEngine:
-    def __init__(self):
+    # (field, normalisation range, default) for the numeric part of the vector, in vector order.
+    # ranges: income(0-20k), exp(0-10k), emp(0-20), amt(0-50k), term(12-60)
+    NUMERIC_FIELDS = [
+        ('income', 20000.0, 0),
+        ('expenses', 10000.0, 0),
+        ('employment_length', 20.0, 0),
+        ('loan_amount', 50000.0, 0),
+        ('loan_term', 60.0, 12),
+    ]
+    # Credit History Score (0-1 usually, mapping bad->0, good->1)
+    CREDIT_MAP = {'bad': 0.0, 'poor': 0.2, 'fair': 0.5, 'good': 0.8, 'excellent': 1.0}
+    DOC_EMBEDDING_DIM = 3
+    VECTOR_SIZE = len(NUMERIC_FIELDS) + 1 + DOC_EMBEDDING_DIM
+
+    def __init__(self, cache_size=10000):
         self.numerical_scaler = StandardScaler()
         # Simple predefined schema for the prototype
         # Features: [Income, Expenses, Employment_Length, Loan_Amount, Loan_Term]
@@ -18,6 +52,9 @@ class SimilarityEngine:
         # Here we'll do a "partial fit" approximation or just simple normalization.
         self.is_fitted = False
 
+        # Profile -> vector cache (vectors are deterministic, so repeats can skip vectorization)
+        self.cache = VectorCache(cache_size)
+
     def _extract_numerical_vector(self, profile):
         """Extracts fixed numerical features in specific order."""
         vec = [
@@ -34,29 +71,164 @@ class SimilarityEngine:
         Converts a profile dict into a normalized feature vector.
         For this prototype, we'll use simple min-max scaling loosely based on expected ranges
         to avoid complexity of stateful scalers for the first pass.
+        Vectors are deterministic and cached by profile_key; the returned array is read-only.
         """
+        key = self.profile_key(profile)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
         # Manual normalization logic for control/simplicity in prototype
-        # ranges: income(0-20k), exp(0-10k), emp(0-20), amt(0-50k), term(12-60)
-        
-        income_norm = min(profile.get('income', 0) / 20000.0, 1.0)
-        exp_norm = min(profile.get('expenses', 0) / 10000.0, 1.0)
-        emp_norm = min(profile.get('employment_length', 0) / 20.0, 1.0)
-        amt_norm = min(profile.get('loan_amount', 0) / 50000.0, 1.0)
-        term_norm = min(profile.get('loan_term', 12) / 60.0, 1.0)
+        raw = [profile.get(field, default) for field, _, default in self.NUMERIC_FIELDS]
+        income_norm, exp_norm, emp_norm, amt_norm, term_norm = [
+            min(value / scale, 1.0)
+            for value, (_, scale, _) in zip(raw, self.NUMERIC_FIELDS)
+        ]
         
-        # Credit History Score (0-1 usually, mapping bad->0, good->1)
         # We process this simply: bad=0, fair=0.5, good=1.0
-        cred_map = {'bad': 0.0, 'poor': 0.2, 'fair': 0.5, 'good': 0.8, 'excellent': 1.0}
-        credit_score = cred_map.get(profile.get('credit_history', 'fair'), 0.5)
+        credit_score = self.CREDIT_MAP.get(profile.get('credit_history', 'fair'), 0.5)
 
         # Vector: [Inc, Exp, Emp, Amt, Term, Credit]
         vector = np.array([income_norm, exp_norm, emp_norm, amt_norm, term_norm, credit_score])
         
-        # Add mock document embedding (3 dims)
-        # In real world: these come from an embedding model (BERT/ResNet)
-        doc_embedding = np.random.normal(0, 0.1, 3) 
+        # Add document embedding (3 dims)
+        # In real world: these come from an embedding model (BERT/ResNet).
+        # Use the supplied one if any, else a mock seeded from the profile content.
+        doc_embedding = profile.get('document_embedding')
+        if doc_embedding is None:
+            doc_embedding = self._doc_embedding_one(raw, credit_score)
         
-        return np.concatenate([vector, doc_embedding])
+        # float32 like vectorize_many (and Qdrant's own storage), so both paths yield identical vectors
+        vector = np.concatenate([vector, doc_embedding]).astype(np.float32)
+        vector.flags.writeable = False
+        self.cache.put(key, vector)
+        return vector
+
+    def profile_key(self, profile):
+        """Canonical content hash of the fields that feed the vector (stable across processes)."""
+        parts = [float(profile.get(field, default)) for field, _, default in self.NUMERIC_FIELDS]
+        parts.append(str(profile.get('credit_history', 'fair')))
+        doc_embedding = profile.get('document_embedding')
+        if doc_embedding is not None:
+            parts.extend(float(x) for x in doc_embedding)
+        return hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+    def _doc_embeddings(self, raw_numeric, credit_scores):
+        """
+        Deterministic mock document embeddings, ~N(0, 0.1) per dim, one row per profile.
+        Seeded by hashing the raw field values (splitmix64), then Box-Muller.
+        """
+        n = len(raw_numeric)
+        fields = np.column_stack([raw_numeric, credit_scores.astype(np.float64)])
+        bits = np.ascontiguousarray(fields, dtype=np.float64).view(np.uint64)
+
+        with np.errstate(over='ignore'):
+            h = np.zeros(n, dtype=np.uint64)
+            for col in range(bits.shape[1]):
+                h = _mix64(h ^ bits[:, col])
+            uniforms = []
+            for _ in range(4):
+                h = _mix64(h)
+                uniforms.append(((h >> np.uint64(11)).astype(np.float64) + 0.5) * 2.0 ** -53)
+
+        r1 = np.sqrt(-2.0 * np.log(uniforms[0]))
+        r2 = np.sqrt(-2.0 * np.log(uniforms[2]))
+        z = np.column_stack([
+            r1 * np.cos(2 * np.pi * uniforms[1]),
+            r1 * np.sin(2 * np.pi * uniforms[1]),
+            r2 * np.cos(2 * np.pi * uniforms[3]),
+        ])
+        return 0.1 * z[:, :self.DOC_EMBEDDING_DIM]
+
+    def _doc_embedding_one(self, raw, credit_score):
+        """
+        Pure-Python _doc_embeddings for a single profile (a 1-row NumPy pass costs ~30x more).
+        Bit-identical to the batched version: same hash over the float64 bit patterns,
+        credit score rounded through float32 as in vectorize_many's output column.
+        """
+        credit = struct.unpack('<f', struct.pack('<f', credit_score))[0]
+        values = [float(v) for v in raw] + [credit]
+        h = 0
+        for bits in struct.unpack(f'<{len(values)}Q', struct.pack(f'<{len(values)}d', *values)):
+            h = _mix64_int(h ^ bits)
+        uniforms = []
+        for _ in range(4):
+            h = _mix64_int(h)
+            uniforms.append(((h >> 11) + 0.5) * 2.0 ** -53)
+
+        r1 = math.sqrt(-2.0 * math.log(uniforms[0]))
+        r2 = math.sqrt(-2.0 * math.log(uniforms[2]))
+        z = [
+            r1 * math.cos(2 * math.pi * uniforms[1]),
+            r1 * math.sin(2 * math.pi * uniforms[1]),
+            r2 * math.cos(2 * math.pi * uniforms[3]),
+        ]
+        return np.array([0.1 * v for v in z[:self.DOC_EMBEDDING_DIM]])
+
+    def vectorize_many(self, profiles, out=None):
+        """
+        Columnar counterpart of vectorize: returns an (N, 9) float32 matrix in one pass.
+        profiles can be a dict of arrays, a pandas DataFrame, a NumPy structured array
+        or a list of profile dicts. Missing columns take the same defaults as vectorize.
+        Pass out= (an (N, 9) float32 array) to reuse a buffer in hot loops.
+        """
+        columns, n = self._as_columns(profiles)
+
+        if out is None:
+            out = np.empty((n, self.VECTOR_SIZE), dtype=np.float32)
+        elif out.shape != (n, self.VECTOR_SIZE):
+            raise ValueError(f"out must have shape {(n, self.VECTOR_SIZE)}, got {out.shape}")
+
+        raw = np.empty((n, len(self.NUMERIC_FIELDS)), dtype=np.float64)
+        for col, (field, scale, default) in enumerate(self.NUMERIC_FIELDS):
+            values = columns.get(field)
+            raw[:, col] = default if values is None else np.asarray(values, dtype=np.float64)
+            np.minimum(raw[:, col] / scale, 1.0, out=out[:, col])
+
+        credit = columns.get('credit_history')
+        if credit is None:
+            out[:, 5] = self.CREDIT_MAP['fair']
+        else:
+            # One vectorized comparison per known label; unknown labels keep the 'fair' default
+            credit = np.asarray(credit)
+            out[:, 5] = 0.5
+            for label, score in self.CREDIT_MAP.items():
+                out[credit == label, 5] = score
+
+        # Document embedding (3 dims): supplied per row where present, deterministic mock otherwise
+        out[:, 6:] = self._doc_embeddings(raw, out[:, 5])
+        docs = columns.get('document_embedding')
+        if docs is not None:
+            nan_row = [np.nan] * self.DOC_EMBEDDING_DIM
+            docs = np.array([nan_row if d is None else d for d in docs], dtype=np.float64)
+            supplied = ~np.isnan(docs).any(axis=1)
+            out[supplied, 6:] = docs[supplied]
+
+        return out
+
+    def _as_columns(self, profiles):
+        """Normalises supported inputs to ({field: array-like}, row count)."""
+        if isinstance(profiles, np.ndarray) and profiles.dtype.names:
+            return {name: profiles[name] for name in profiles.dtype.names}, len(profiles)
+
+        if hasattr(profiles, 'columns') and hasattr(profiles, 'to_numpy'):
+            return {col: profiles[col].to_numpy() for col in profiles.columns}, len(profiles)
+
+        if isinstance(profiles, dict):
+            lengths = {len(v) for v in profiles.values()}
+            if len(lengths) > 1:
+                raise ValueError("All columns must have the same length")
+            return profiles, lengths.pop() if lengths else 0
+
+        # Sequence of profile dicts
+        profiles = list(profiles)
+        fields = [f for f, _, _ in self.NUMERIC_FIELDS] + ['credit_history']
+        defaults = {f: d for f, _, d in self.NUMERIC_FIELDS}
+        defaults['credit_history'] = 'fair'
+        columns = {f: [p.get(f, defaults[f]) for p in profiles] for f in fields}
+        if any(p.get('document_embedding') is not None for p in profiles):
+            columns['document_embedding'] = [p.get('document_embedding') for p in profiles]
+        return columns, len(profiles)
 
     def calculate_distance(self, vec_a, vec_b):
         """Euclidean distance betweeen two vectors."""
@@ -0,0 +1,183 @@
+import atexit
+import threading
+import time
+import types
+import weakref
+import numpy as np
+from src.numpy_backend import NumpyMemoryBackend
+
+# Buffers still holding cases are flushed at interpreter exit
+_open_buffers = weakref.WeakSet()
+
+@atexit.register
+def _flush_open_buffers():
+    for buffer in list(_open_buffers):
+        buffer.close(timeout=10)
+
+class WriteBehindBuffer:
+    """
+    Learned cases wait here and are upserted in batches by a background thread, as soon as
+    max_size cases are pending or the oldest one has waited max_age_ms.
+    Until their batch is stored, search_batch() finds them in a small exact in-process overlay,
+    so a case is searchable the moment put() returns (read-your-writes).
+    put() blocks once max_pending cases are waiting, so a slow store slows learners down
+    instead of growing the buffer without bound.
+    The worker thread only runs while cases are pending. A bound-method store is held weakly
+    (its owner holds the buffer); the worker keeps it alive until the pending cases are stored.
+    """
+    def __init__(self, store, vector_size, max_size=256, max_age_ms=200.0, max_pending=10000):
+        # store(case_ids, vectors, payloads, new_ids): one batched upsert
+        self._store = weakref.WeakMethod(store) if isinstance(store, types.MethodType) else (lambda: store)
+        self.vector_size = vector_size
+        self.max_size = max_size
+        self.max_age = max_age_ms / 1000.0
+        self.max_pending = max_pending
+        self._cond = threading.Condition()
+        self._pending = []
+        self._overlay = self._new_overlay()
+        self._in_flight = None  # overlay of the batch being stored
+        self._oldest = None
+        self._flush_requested = False
+        self._closed = False
+        self._worker = None
+        self.flushes = 0
+        self.flushed = 0
+        self.errors = 0
+        self.last_error = None
+        _open_buffers.add(self)
+
+    def _new_overlay(self):
+        return NumpyMemoryBackend(vector_size=self.vector_size, initial_capacity=64)
+
+    def put(self, case_id, vector, payload, new=False):
+        """Queues a case; new=True marks an id just created, so the store needn't look it up."""
+        vector = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("WriteBehindBuffer is closed")
+            while len(self._pending) >= self.max_pending:
+                self._cond.wait()
+            self._pending.append((case_id, vector[0], payload, new))
+            self._overlay.add_batch([case_id], vector, [payload])
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, args=(self._store(),), name="write-behind",
+                                                daemon=True)
+                self._worker.start()
+            self._cond.notify_all()
+
+    def _take_batch(self):
+        """Waits until a flush is due; returns the batch to store, or None once nothing is left."""
+        with self._cond:
+            while True:
+                if not self._pending:
+                    self._worker = None
+                    self._cond.notify_all()
+                    return None
+                age = time.monotonic() - self._oldest
+                if (len(self._pending) >= self.max_size or age >= self.max_age
+                        or self._flush_requested or self._closed):
+                    break
+                self._cond.wait(self.max_age - age)
+
+            batch, self._pending = self._pending[:self.max_size], self._pending[self.max_size:]
+            # Searches keep seeing the batch through its overlay until the store has it
+            self._in_flight = self._overlay
+            self._overlay = self._new_overlay()
+            if self._pending:
+                ids, vectors, payloads, _ = zip(*self._pending)
+                self._overlay.add_batch(list(ids), np.stack(vectors), list(payloads))
+            self._oldest = time.monotonic() if self._pending else None
+            return batch
+
+    def _run(self, store):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            ids, vectors, payloads, new = zip(*batch)
+            try:
+                store(list(ids), np.stack(vectors), list(payloads),
+                           {case_id for case_id, is_new in zip(ids, new) if is_new})
+            except Exception as e:
+                # Keep the cases (and their overlay) and retry after max_age
+                with self._cond:
+                    self.errors += 1
+                    self.last_error = f"{type(e).__name__}: {e}"
+                    self._pending = list(batch) + self._pending
+                    self._overlay.add_batch(list(ids), np.stack(vectors), list(payloads))
+                    self._in_flight = None
+                    self._oldest = time.monotonic()
+                    self._flush_requested = False
+                    self._cond.notify_all()
+                    self._cond.wait(self.max_age)
+                continue
+            with self._cond:
+                self._in_flight = None
+                self.flushes += 1
+                self.flushed += len(batch)
+                if not self._pending:
+                    self._flush_requested = False
+                self._cond.notify_all()
+
+    def search_batch(self, query_vectors, k=5, filter_conditions=None):
+        """
+        Exact top-k over the cases not stored yet, with the ids of all of them (their backend
+        copies, if any, are stale): (results, pending_ids), or None when there are none (the usual case).
+        """
+        with self._cond:
+            overlays = [o for o in (self._overlay, self._in_flight) if o is not None and o.get_count()]
+            pending_ids = set().union(*(overlay.case_ids() for overlay in overlays))
+        if not overlays:
+            return None
+        results = [[] for _ in range(len(query_vectors))]
+        for overlay in overlays:
+            for hits, more in zip(results, overlay.search_batch(query_vectors, k, filter_conditions)):
+                hits.extend(more)
+        return results, pending_ids
+
+    def retrieve(self, case_ids, with_vectors=False):
+        """{case_id: (payload, vector_or_None)} for the requested ids that are not stored yet."""
+        with self._cond:
+            overlays = [o for o in (self._in_flight, self._overlay) if o is not None and o.get_count()]
+        found = {}
+        for overlay in overlays:  # oldest first, so the newest copy of an id wins
+            found.update(overlay.retrieve(case_ids, with_vectors))
+        return found
+
+    def depth(self):
+        """Cases accepted but not stored yet (pending + the batch being written)."""
+        with self._cond:
+            return len(self._pending) + (self._in_flight.get_count() if self._in_flight is not None else 0)
+
+    def flush(self, timeout=None):
+        """Stores everything pending now; returns False if timeout expired first."""
+        with self._cond:
+            if not self._pending and self._in_flight is None:
+                return True
+            self._flush_requested = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._pending and self._in_flight is None, timeout)
+
+    def close(self, timeout=None):
+        """Flushes, then refuses new cases."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        done = self.flush(timeout)
+        _open_buffers.discard(self)
+        return done
+
+    def stats(self):
+        with self._cond:
+            return {
+                'pending': len(self._pending),
+                'in_flight': self._in_flight.get_count() if self._in_flight is not None else 0,
+                'max_size': self.max_size,
+                'max_age_ms': self.max_age * 1000.0,
+                'flushes': self.flushes,
+                'flushed': self.flushed,
+                'avg_flush_size': self.flushed / self.flushes if self.flushes else 0.0,
+                'errors': self.errors,
+            }
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.decision_engine import DecisionEngine
+from data.history_generator import generate_block, records
+
+# Approvals, declines, a known fraud, a partial profile and an outlier
+MIXED = [
+    {'income': 9000, 'expenses': 1500, 'employment_length': 5, 'loan_amount': 10000,
+     'loan_term': 24, 'credit_history': 'good'},
+    {'income': 2200, 'expenses': 1900, 'employment_length': 0, 'loan_amount': 40000,
+     'loan_term': 60, 'credit_history': 'bad'},
+    {'income': 10000, 'expenses': 500, 'employment_length': 0, 'loan_amount': 45000,
+     'loan_term': 12, 'credit_history': 'good'},
+    {'income': 4500, 'expenses': 2100, 'employment_length': 3, 'loan_amount': 15000,
+     'loan_term': 36, 'credit_history': 'fair'},
+    {'income': 6000, 'loan_amount': 8000, 'credit_history': 'fair'},
+    {'income': 150000, 'expenses': 200, 'employment_length': 40, 'loan_amount': 1000,
+     'loan_term': 12, 'credit_history': 'good'},
+]
+
+@pytest.fixture(scope='module')
+def engine():
+    engine = DecisionEngine(memory_backend='numpy')
+    engine.memory.add_cases(records(generate_block(np.random.default_rng(0), 0, 500)))
+    engine.learn(dict(MIXED[2]), 'decline', 'default', labels=['fraud'])
+    engine.memory.flush(timeout=10)
+    yield engine
+    engine.close()
+
+@pytest.mark.parametrize('as_frame', [False, True], ids=['dicts', 'dataframe'])
+def test_evaluate_batch_matches_evaluate_application(engine, as_frame):
+    expected = [engine.evaluate_application(dict(profile)) for profile in MIXED]
+    batch = pd.DataFrame(MIXED) if as_frame else [dict(profile) for profile in MIXED]
+    assert engine.evaluate_batch(batch) == expected
+    assert {r['recommendation'] for r in expected} >= {'APPROVE', 'DECLINE (Anomaly)'}
+
+def test_evaluate_batch_of_nothing(engine):
+    assert engine.evaluate_batch([]) == []
+    assert engine.evaluate_batch(pd.DataFrame(columns=list(MIXED[0]))) == []
@@ -0,0 +1,64 @@
+import json
+import numpy as np
+import pytest
+from src.memory import DecisionMemory
+from src.history_io import convert_to_parquet, history_schema
+from data.history_generator import generate
+
+pytest.importorskip('pyarrow')
+
+def load(path):
+    memory = DecisionMemory(backend='numpy', write_behind=False)
+    memory.load_from_file(path, batch_size=64)
+    return memory
+
+def assert_same_types(a, b):
+    assert a == b
+    assert [type(v) for v in a['profile'].values()] == [type(v) for v in b['profile'].values()]
+
+def test_parquet_and_json_loads_give_identical_payloads(tmp_path):
+    source = str(tmp_path / 'history.jsonl')
+    generate(source, 200, seed=0, fmt='jsonl')
+    converted = str(tmp_path / 'history.parquet')
+    assert convert_to_parquet(source, converted, batch_size=64) == 200
+
+    from_json, from_parquet = load(source), load(converted)
+    for a, b in zip(from_json.get_cases(range(200)), from_parquet.get_cases(range(200))):
+        assert_same_types(a, b)
+        assert isinstance(b['profile']['income'], int)
+
+def test_partial_and_fractional_profiles_load_the_same_from_both_formats(tmp_path):
+    cases = [
+        {'id': 1, 'profile': {'income': 3000, 'credit_history': 'good'}, 'decision': 'approve',
+         'outcome': 'repaid', 'labels': []},
+        {'id': 2, 'profile': {'income': 2500.5, 'expenses': 812.25, 'loan_term': 36}, 'decision': 'decline',
+         'outcome': 'default', 'labels': ['fraud']},
+        {'id': 3, 'profile': {'expenses': 1000.0, 'employment_length': 2, 'loan_amount': 9000,
+                              'loan_term': 24, 'credit_history': 'fair'},
+         'decision': 'approve', 'outcome': 'repaid', 'labels': []},
+    ]
+    source = tmp_path / 'history.jsonl'
+    source.write_text(''.join(json.dumps(case) + '\n' for case in cases))
+    converted = str(tmp_path / 'history.parquet')
+    convert_to_parquet(str(source), converted)
+
+    from_json, from_parquet = load(str(source)), load(converted)
+    json_cases = from_json._lookup([1, 2, 3], with_vectors=True)
+    parquet_cases = from_parquet._lookup([1, 2, 3], with_vectors=True)
+    for case_id in (1, 2, 3):
+        (a, vector_a), (b, vector_b) = json_cases[case_id], parquet_cases[case_id]
+        assert a == b
+        np.testing.assert_array_equal(vector_a, vector_b)
+    assert from_parquet.get_case(1)['profile'] == {'income': 3000, 'credit_history': 'good'}
+    assert from_parquet.get_case(2)['profile']['income'] == 2500.5
+
+def test_generated_parquet_uses_the_history_schema(tmp_path):
+    import pyarrow.parquet as pq
+    generated = str(tmp_path / 'history.parquet')
+    generate(generated, 150, seed=1, block_size=64)
+    source = str(tmp_path / 'history.jsonl')
+    generate(source, 150, seed=1, block_size=64)
+
+    assert pq.read_schema(generated).remove_metadata().equals(history_schema())
+    for a, b in zip(load(source).get_cases(range(150)), load(generated).get_cases(range(150))):
+        assert_same_types(a, b)
@@ -0,0 +1,171 @@
+import numpy as np
+import pytest
+from src.decision_engine import DecisionEngine
+from src.memory import DecisionMemory
+from src.filters import FRAUD_FILTER
+from data.history_generator import generate_block, records
+
+FRAUDSTER = {'income': 10000, 'expenses': 500, 'employment_length': 0, 'loan_amount': 45000,
+             'loan_term': 12, 'credit_history': 'good'}
+
+def history(n=200, seed=0):
+    """n generated cases, ids 0..n-1, none labelled fraud."""
+    return records(generate_block(np.random.default_rng(seed), 0, n, mix=(0.4, 0.3, 0.3, 0.0)))
+
+@pytest.fixture(params=[True, False], ids=['write_behind', 'sync'])
+def memory(request):
+    memory = DecisionMemory(backend='numpy', write_behind=request.param)
+    memory.add_cases(history())
+    yield memory
+    memory.close()
+
+def fraud_ids(memory):
+    vector = memory.similarity_engine.vectorize(FRAUDSTER)
+    return [case['id'] for case, _ in memory.retrieve_fraud_cases(vector, k=10)]
+
+@pytest.mark.parametrize('defer', [False, True])
+def test_clearing_the_fraud_label_leaves_the_fraud_index(memory, defer):
+    assert fraud_ids(memory) == [] and memory.get_stats()['fraud_cases'] == 0
+
+    memory.add_case({'id': 1000, 'profile': dict(FRAUDSTER), 'decision': 'approve', 'labels': ['fraud']}, defer=defer)
+    assert fraud_ids(memory) == [1000]
+    assert memory.get_stats()['fraud_cases'] == 1
+
+    memory.add_case({'id': 1000, 'profile': dict(FRAUDSTER), 'decision': 'approve', 'labels': []}, defer=defer)
+    assert fraud_ids(memory) == []
+    assert memory.get_stats()['fraud_cases'] == 0
+    memory.flush()
+    assert memory.get_stats()['by_label'] == {}
+    assert not FRAUD_FILTER.matches(memory.get_case(1000))
+
+def test_fraud_index_is_rebuilt_from_the_backend(memory):
+    memory.add_cases([{'id': i, 'profile': dict(FRAUDSTER, income=9000 + i), 'decision': 'decline',
+                       'labels': ['fraud']} for i in (1000, 1001)])
+    memory.add_case({'id': 1001, 'profile': dict(FRAUDSTER), 'decision': 'decline', 'labels': []})
+    memory.flush()
+
+    reopened = DecisionMemory(backend=memory.backend, write_behind=False)
+    assert fraud_ids(reopened) == [1000]
+    assert reopened.get_stats()['fraud_cases'] == 1
+
+@pytest.fixture
+def engine():
+    engine = DecisionEngine(memory_backend='numpy')
+    engine.memory.add_cases(history())
+    # Hold learned cases in the buffer until an explicit flush
+    engine.memory.write_buffer.max_age = 60.0
+    yield engine
+    engine.close()
+
+def test_learned_case_is_visible_before_the_flush(engine):
+    memory = engine.memory
+    case_id = engine.learn(dict(FRAUDSTER), 'decline', 'default', labels=['fraud'])
+    assert memory.get_stats()['pending_writes'] == 1
+    assert memory.aggregates.total == 200
+    assert not memory.backend.has_case(case_id)
+
+    result = engine.evaluate_application(dict(FRAUDSTER))
+    assert result['similar_cases'][0]['id'] == case_id
+    assert result['anomalies']
+    assert [r['similar_cases'][0]['id'] for r in engine.evaluate_batch([dict(FRAUDSTER)])] == [case_id]
+    assert engine.find_similar(0)['case']['id'] == 0
+
+    assert memory.flush(timeout=10)
+    stats = memory.get_stats()
+    assert stats['pending_writes'] == 0
+    assert stats['total_cases'] == memory.backend.get_count() == 201
+    assert stats['fraud_cases'] == 1
+    assert engine.evaluate_application(dict(FRAUDSTER))['similar_cases'][0]['id'] == case_id
+
+def test_close_stores_every_learned_case(engine):
+    memory = engine.memory
+    ids = [engine.learn(dict(FRAUDSTER, income=5000 + i), 'approve', 'repaid') for i in range(50)]
+    assert memory.get_stats()['pending_writes'] == 50
+
+    assert engine.close(timeout=10)
+    stats = memory.get_stats()
+    assert stats['pending_writes'] == 0
+    assert stats['total_cases'] == memory.backend.get_count() == 250
+    assert all(memory.backend.has_case(case_id) for case_id in ids)
+    with pytest.raises(RuntimeError):
+        engine.learn(dict(FRAUDSTER), 'approve')
+
+def test_get_cases_keeps_input_order(memory):
+    cases = memory.get_cases([5, 999_999, 0, 5])
+    assert [c and c['id'] for c in cases] == [5, None, 0, 5]
+    assert memory.get_case(3)['profile'] == history()[3]['profile']
+    assert memory.get_case(999_999) is None
+
+def test_pending_case_can_be_looked_up(engine):
+    case_id = engine.learn(dict(FRAUDSTER), 'decline', 'default')
+    assert engine.memory.get_stats()['pending_writes'] == 1
+    assert engine.memory.get_case(case_id)['decision'] == 'decline'
+    found = engine.find_similar(case_id)
+    assert found['case']['id'] == case_id
+    assert case_id not in [c['id'] for c in found['similar_cases']]
+
+def test_find_similar_leaves_the_case_out(engine):
+    found = engine.find_similar(7, k=5)
+    ids = [c['id'] for c in found['similar_cases']]
+    assert found['case']['id'] == 7
+    assert len(ids) == 5 and 7 not in ids
+    assert engine.find_similar(999_999) is None
+
+def test_engine_is_freed_without_the_garbage_collector():
+    # No reference cycles (metrics collectors, write-behind store): a path-mode Qdrant client
+    # is then closed when the engine goes, not by the GC at interpreter shutdown
+    import gc
+    import weakref
+    engine = DecisionEngine(memory_backend='numpy')
+    engine.learn(dict(FRAUDSTER), 'approve')
+    engine.memory.flush(timeout=10)
+    engine.metrics.snapshot()
+    refs = [weakref.ref(engine), weakref.ref(engine.memory), weakref.ref(engine.memory.write_buffer)]
+    gc.disable()
+    try:
+        del engine
+        assert [ref() for ref in refs] == [None, None, None]
+    finally:
+        gc.enable()
+
+def test_evaluate_backend_calls_leave_out_other_threads(engine):
+    import threading
+    analyze = engine.anomaly_detector.analyze
+
+    def analyze_while_storing(*args):
+        # A write on another thread (like a write-behind flush) in the middle of the evaluation
+        writer = threading.Thread(target=engine.memory.add_cases, args=([{'profile': dict(FRAUDSTER), 'decision': 'approve'}],))
+        writer.start()
+        writer.join()
+        return analyze(*args)
+
+    engine.anomaly_detector.analyze = analyze_while_storing
+    for _ in range(5):
+        engine.evaluate_application(dict(FRAUDSTER))
+    assert engine.metrics.snapshot()['gauges']['evaluate.backend_calls_per_evaluation'] == 1.0
+
+def test_moved_pending_case_hides_its_stored_copy(engine):
+    memory = engine.memory
+    vector = memory.similarity_engine.vectorize(history()[5]['profile'])
+    assert 5 in [case['id'] for case, _ in memory.retrieve_neighbors(vector, k=5)]
+
+    # The buffered update moves case 5 far from the query: its stale stored copy must not come back
+    memory.add_case({'id': 5, 'profile': dict(FRAUDSTER), 'decision': 'decline'}, defer=True)
+    assert memory.get_stats()['pending_writes'] == 1
+    for neighbors in (memory.retrieve_neighbors(vector, k=5), memory.retrieve_neighbors_batch([vector], k=5)[0]):
+        ids = [case['id'] for case, _ in neighbors]
+        assert len(ids) == 5 and 5 not in ids
+
+def test_flush_gives_up_after_its_timeout_when_the_backend_keeps_failing(engine):
+    memory = engine.memory
+
+    def failing(*args, **kwargs):
+        raise ConnectionError("backend down")
+
+    memory.backend.add_batch = failing
+    engine.learn(dict(FRAUDSTER), 'approve')
+    assert not engine.close(timeout=0.5)
+    assert memory.write_buffer.depth() == 1
+    assert 'backend down' in memory.write_buffer.last_error
+
+    del memory.backend.add_batch  # back up: the fixture's close() can store the case
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from src.memory import DecisionMemory
+from src.memory_stats import MemoryAggregates
+from src.numpy_backend import NumpyMemoryBackend
+from data.history_generator import generate_block, records
+
+class CountingBackend(NumpyMemoryBackend):
+    """Numpy backend that pretends to persist, counting lookups and metadata writes."""
+    is_persistent = True
+
+    def __init__(self):
+        super().__init__()
+        self.retrieved = []
+        self.metadata_writes = 0
+
+    def retrieve(self, case_ids, with_vectors=False):
+        self.retrieved.extend(case_ids)
+        return super().retrieve(case_ids, with_vectors)
+
+    def update_metadata(self, values):
+        self.metadata_writes += 1
+        super().update_metadata(values)
+
+def cases(n, seed=0):
+    """n generated cases without ids (the memory assigns them)."""
+    return [{k: v for k, v in case.items() if k != 'id'}
+            for case in records(generate_block(np.random.default_rng(seed), 0, n))]
+
+def recount(memory):
+    aggregates = MemoryAggregates()
+    for page in memory.backend.scroll():
+        aggregates.add([payload for _, payload, _ in page])
+    return aggregates.to_dict()
+
+def test_single_payload_path_matches_batched():
+    payloads = cases(300) + [{'profile': {'income': 2000, 'loan_term': float('nan')}, 'labels': ['fraud']},
+                             {'profile': {'expenses': None}}, {}]
+    one_by_one, batched = MemoryAggregates(), MemoryAggregates()
+    for payload in payloads:
+        one_by_one.add([payload])
+    batched.add(payloads)
+    assert one_by_one.to_dict() == batched.to_dict()
+
+    for payload in payloads[:50]:
+        one_by_one.add([payload], sign=-1)
+    batched.add(payloads[:50], sign=-1)
+    assert one_by_one.to_dict() == batched.to_dict()
+
+def test_replaced_and_repeated_ids_are_counted_once():
+    memory = DecisionMemory(backend='numpy', write_behind=False)
+    memory.add_cases([dict(case, id=i) for i, case in enumerate(cases(50))])
+    replacement = dict(cases(1, seed=1)[0], id=7, decision='decline', outcome='default')
+    memory.add_case(dict(replacement))
+    memory.add_cases([dict(replacement, decision='approve'), dict(replacement, decision='decline')])
+
+    assert memory.aggregates.total == memory.backend.get_count() == 50
+    assert memory.aggregates.to_dict() == recount(memory)
+    assert memory.get_case(7)['decision'] == 'decline'
+
+def test_new_ids_are_not_looked_up():
+    backend = CountingBackend()
+    memory = DecisionMemory(backend=backend, write_behind=False)
+    memory.add_cases(cases(20))
+    memory.add_case(cases(1, seed=1)[0])
+    assert backend.retrieved == []
+
+    memory.add_case(dict(cases(1, seed=2)[0], id=3))
+    assert backend.retrieved == [3]
+
+def test_aggregates_persisted_per_batch_and_on_flush():
+    backend = CountingBackend()
+    memory = DecisionMemory(backend=backend, write_behind=False)
+    writes = backend.metadata_writes
+    memory.add_cases(cases(20))
+    assert backend.metadata_writes == writes + 1
+
+    for case in cases(5, seed=1):
+        memory.add_case(case)
+    assert backend.metadata_writes == writes + 1
+    memory.flush()
+    assert backend.metadata_writes == writes + 2
+    assert MemoryAggregates.from_dict(backend.get_metadata()['aggregates']).to_dict() == recount(memory)
+
+    memory.close()
+    assert backend.metadata_writes == writes + 2  # nothing new to save
+
+@pytest.mark.parametrize('write_behind', [True, False])
+def test_totals_survive_a_reload(write_behind):
+    backend = CountingBackend()
+    memory = DecisionMemory(backend=backend, write_behind=write_behind)
+    memory.add_cases(cases(30))
+    for case in cases(10, seed=1):
+        memory.add_case(case, defer=True)
+    memory.close()
+
+    reopened = DecisionMemory(backend=backend, write_behind=False)
+    assert reopened.aggregates.total == 40
+    assert reopened.aggregates.to_dict() == recount(reopened)
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import numpy as np
+import pytest
+from src.decision_engine import DecisionEngine
+from src.service import DecisionService, MicroBatcher, InvalidProfileError, validate_profile
+from data.history_generator import generate_block, records
+
+GOOD = {'income': 9000, 'expenses': 1500, 'employment_length': 5, 'loan_amount': 10000,
+        'loan_term': 24, 'credit_history': 'good'}
+
+@pytest.fixture(scope='module')
+def engine():
+    engine = DecisionEngine(memory_backend='numpy')
+    engine.memory.add_cases(records(generate_block(np.random.default_rng(0), 0, 500)))
+    return engine
+
+def run(service, *requests):
+    """Dispatches requests concurrently (so they share micro-batches) -> [(status, payload)]."""
+    async def go():
+        service.batcher = MicroBatcher(service.engine, service.executor, max_batch=64, max_wait_ms=20)
+        service.batcher.start()
+        try:
+            return await asyncio.gather(*(service.dispatch(*r) for r in requests))
+        finally:
+            await service.batcher.stop()
+    return asyncio.run(go())
+
+def evaluate(profile):
+    return ('POST', '/evaluate', json.dumps(profile).encode())
+
+def test_concurrent_requests_are_batched_and_match_single_evaluation(engine):
+    service = DecisionService(engine)
+    responses = run(service, *[evaluate(GOOD)] * 8)
+    expected = engine.evaluate_application(GOOD)
+    assert all(status == 200 and payload == expected for status, payload in responses)
+    assert service.batcher.batches < 8
+
+@pytest.mark.parametrize('bad', [{'income': 'abc'}, {'income': None}, {'income': [1]},
+                                 {'income': float('nan')}, {'credit_history': 3}])
+def test_invalid_profile_fails_alone(engine, bad):
+    service = DecisionService(engine)
+    responses = run(service, evaluate(GOOD), evaluate({**GOOD, **bad}), evaluate(GOOD), evaluate(GOOD))
+    assert [status for status, _ in responses] == [200, 400, 200, 200]
+
+def test_engine_error_in_batch_only_fails_that_request(engine):
+    # Passes validation but makes vectorize_many raise: the batch is re-scored one by one
+    service = DecisionService(engine)
+    broken = {**GOOD, 'document_embedding': 'not a vector'}
+    responses = run(service, evaluate(GOOD), evaluate(broken), evaluate(GOOD))
+    assert [status for status, _ in responses] == [200, 500, 200]
+    assert responses[0][1] == engine.evaluate_application(GOOD)
+
+def test_validate_profile_converts_numeric_strings():
+    assert validate_profile({'income': '5000', 'loan_term': 12})['income'] == 5000.0
+    with pytest.raises(InvalidProfileError):
+        validate_profile({'loan_amount': True})
+
+@pytest.mark.parametrize('k, status', [('x', 400), ('0', 400), ('-1', 400), ('101', 400), ('3', 200)])
+def test_similar_cases_k_is_validated(engine, k, status):
+    service = DecisionService(engine)
+    got, payload = run(service, ('GET', f'/cases/1?k={k}', b''))[0]
+    assert got == status
+    if status == 200:
+        assert len(payload['similar_cases']) == 3
+
+def test_batch_case_lookup(engine):
+    service = DecisionService(engine)
+    status, payload = run(service, ('POST', '/cases', json.dumps({'ids': [1, 123456789]}).encode()))[0]
+    assert status == 200 and payload['cases'][0]['id'] == 1 and payload['cases'][1] is None
+
+def learn(body):
+    return ('POST', '/learn', json.dumps(body).encode())
+
+@pytest.mark.parametrize('bad', [{'decision': 'approve'}, {'profile': 'x', 'decision': 'approve'},
+                                 {'profile': {'income': 'abc'}, 'decision': 'approve'},
+                                 {'profile': GOOD, 'decision': 'approve', 'labels': 'fraud'},
+                                 {'profile': GOOD, 'decision': 'approve', 'labels': [1]},
+                                 {'profile': GOOD, 'decision': ['approve']}])
+def test_invalid_learn_body_is_rejected(bad):
+    engine = DecisionEngine(memory_backend='numpy')
+    status, _ = run(DecisionService(engine), learn(bad))[0]
+    assert status == 400
+    assert engine.memory.get_stats()['pending_writes'] == 0
+    engine.close()
+
+def test_learn_validates_and_registers_fraud():
+    engine = DecisionEngine(memory_backend='numpy')
+    status, payload = run(DecisionService(engine), learn({'profile': {**GOOD, 'income': '9000'},
+                                                         'decision': 'decline', 'labels': ['fraud']}))[0]
+    assert status == 200
+    case = engine.memory.get_case(payload['id'])
+    assert case['profile']['income'] == 9000.0 and case['labels'] == ['fraud']
+    assert engine.memory.get_stats()['fraud_cases'] == 1
+    with pytest.raises(TypeError):
+        engine.learn(GOOD, 'decline', labels='fraud')
+    engine.close()
+
+class FakeWriter:
+    def __init__(self):
+        self.data = b''
+        self.closed = False
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+@pytest.mark.parametrize('length', ['abc', '-5', '1e3'])
+def test_invalid_content_length_is_rejected(engine, length):
+    async def go():
+        reader = asyncio.StreamReader()
+        reader.feed_data(f"POST /evaluate HTTP/1.1\r\nContent-Length: {length}\r\n\r\n{{}}".encode())
+        reader.feed_eof()
+        writer = FakeWriter()
+        await DecisionService(engine)._handle_connection(reader, writer)
+        return writer
+    writer = asyncio.run(go())
+    assert writer.data.startswith(b"HTTP/1.1 400 Bad Request\r\n")
+    assert b"Connection: close" in writer.data and writer.closed
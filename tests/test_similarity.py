@@ -0,0 +1,26 @@
+import numpy as np
+from src.similarity import SimilarityEngine
+from data.history_generator import generate_block, records
+
+def test_vectorize_matches_vectorize_many_bit_for_bit():
+    engine = SimilarityEngine(cache_size=0)
+    rng = np.random.default_rng(0)
+    profiles = [case['profile'] for case in records(generate_block(rng, 0, 2000))]
+    # Floats, unknown credit labels and missing fields take the same code paths as real traffic
+    profiles += [
+        {'income': float(income), 'expenses': float(expenses), 'credit_history': credit}
+        for income, expenses, credit in zip(
+            rng.normal(5000, 3000, 500), rng.random(500) * 1e4,
+            rng.choice(['bad', 'poor', 'fair', 'good', 'excellent', 'unknown'], 500))
+    ]
+    profiles += [{}, {'income': -0.0}, {'income': 1e300, 'loan_term': 7}]
+
+    many = engine.vectorize_many(profiles)
+    one = np.stack([engine.vectorize(p) for p in profiles])
+    assert many.dtype == one.dtype == np.float32
+    assert np.array_equal(many.view(np.uint32), one.view(np.uint32))
+
+def test_supplied_document_embedding_is_kept():
+    engine = SimilarityEngine()
+    vector = engine.vectorize({'income': 5000, 'document_embedding': [0.1, 0.2, 0.3]})
+    assert np.allclose(vector[6:], [0.1, 0.2, 0.3])